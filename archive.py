@@ -0,0 +1,194 @@
+"""Compressed archival tier for inactive conversations.
+
+An archived conversation is a JSON Lines stream (one message per line)
+compressed with ``lzma`` (``.jsonl.xz``) or ``gzip`` (``.jsonl.gz``). Writing
+and reading are both streaming, so neither side holds the compressed and the
+decompressed copy in memory at once. Archive metadata lives in the
+conversation index, which lets the UI list archived sessions without opening
+the archives.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import lzma
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, Final, IO, Iterable, Iterator, List, Optional, Set
+
+from attachment_utils import format_byte_count
+
+
+DEFAULT_ARCHIVE_FORMAT: Final[str] = "xz"
+DEFAULT_ARCHIVE_AFTER_DAYS: Final[int] = 30
+
+_OPENERS: Final[Dict[str, Callable[..., IO[Any]]]] = {
+    "xz": lzma.open,
+    "gz": gzip.open,
+}
+ARCHIVE_FORMATS: Final[tuple[str, ...]] = tuple(_OPENERS)
+
+
+def normalize_archive_format(value: object) -> str:
+    fmt = str(value or "").strip().lower().lstrip(".")
+    return fmt if fmt in _OPENERS else DEFAULT_ARCHIVE_FORMAT
+
+
+def archive_file_name(cid: int, fmt: str = DEFAULT_ARCHIVE_FORMAT) -> str:
+    return f"conversation-{int(cid)}.jsonl.{normalize_archive_format(fmt)}"
+
+
+def _format_from_path(path: str) -> str:
+    return normalize_archive_format(os.path.splitext(path)[1])
+
+
+def write_archive(messages: Iterable[Dict[str, Any]], path: str, fmt: str = DEFAULT_ARCHIVE_FORMAT) -> Dict[str, int]:
+    """Stream ``messages`` into a compressed archive at ``path`` (atomic replace).
+
+    Returns ``{"messages", "original_bytes", "archived_bytes"}``.
+    """
+
+    fmt = normalize_archive_format(fmt)
+    directory = os.path.dirname(os.path.abspath(path)) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=os.path.basename(path), dir=directory)
+    count = 0
+    original = 0
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            with _OPENERS[fmt](raw, "wb") as packed:
+                for message in messages:
+                    line = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+                    packed.write(line)
+                    original += len(line)
+                    count += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return {"messages": count, "original_bytes": original, "archived_bytes": os.path.getsize(path)}
+
+
+def iter_archive(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield messages from an archive, decompressing line by line."""
+
+    with _OPENERS[_format_from_path(path)](path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def list_archives(directory: str) -> List[str]:
+    """Paths of every conversation archive in ``directory``."""
+
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    suffixes = tuple(f".jsonl.{fmt}" for fmt in ARCHIVE_FORMATS)
+    return [os.path.join(directory, name) for name in sorted(names) if name.startswith("conversation-") and name.endswith(suffixes)]
+
+
+def archive_store(store: Any, path: str, fmt: str = DEFAULT_ARCHIVE_FORMAT, now: Optional[float] = None) -> Dict[str, Any]:
+    """Copy the history in ``store`` into an archive; returns index metadata.
+
+    The store is left untouched: the caller discards it only after the
+    conversation index records the archive, so a crash in between leaves the
+    live copy in place rather than an archive nothing points to.
+    """
+
+    info: Dict[str, Any] = dict(write_archive(store.iter_messages(), path, fmt))
+    info.update(
+        {
+            "file": os.path.basename(path),
+            "format": normalize_archive_format(fmt),
+            "archived_at": time.time() if now is None else now,
+        }
+    )
+    return info
+
+
+def restore_store(path: str, store: Any) -> List[Dict[str, Any]]:
+    """Load an archive back into ``store`` and delete the archive file."""
+
+    history = list(iter_archive(path))
+    store.rewrite(history, reset=True)
+    os.remove(path)
+    return history
+
+
+def idle_conversations(
+    entries: Iterable[Dict[str, Any]],
+    days: float,
+    now: Optional[float] = None,
+    exclude: Optional[Set[int]] = None,
+) -> List[int]:
+    """Ids of non-empty, not yet archived conversations idle for ``days`` days."""
+
+    if days <= 0:
+        return []
+    cutoff = (time.time() if now is None else now) - days * 86400.0
+    skip = exclude or set()
+    return [
+        entry["id"]
+        for entry in entries
+        if entry["id"] not in skip
+        and not entry.get("archived")
+        and int(entry.get("message_count") or 0) > 0
+        and float(entry.get("updated_at") or 0.0) < cutoff
+    ]
+
+
+def summarize_archives(entries: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """Totals over archived index entries (no archive is opened)."""
+
+    summary = {"conversations": 0, "original_bytes": 0, "archived_bytes": 0}
+    for entry in entries:
+        info = entry.get("archived")
+        if not info:
+            continue
+        summary["conversations"] += 1
+        summary["original_bytes"] += int(info.get("original_bytes") or 0)
+        summary["archived_bytes"] += int(info.get("archived_bytes") or 0)
+    summary["saved_bytes"] = max(0, summary["original_bytes"] - summary["archived_bytes"])
+    return summary
+
+
+def format_archive_report(summary: Dict[str, int], newly_archived: int = 0) -> str:
+    original = summary.get("original_bytes", 0)
+    saved = summary.get("saved_bytes", 0)
+    ratio = (saved / original * 100.0) if original else 0.0
+    return "\n".join(
+        [
+            f"Arkistoitu nyt: {newly_archived} keskustelua",
+            f"Arkistossa yhteensä: {summary.get('conversations', 0)} keskustelua",
+            f"Pakkaamaton koko: {format_byte_count(original)}",
+            f"Pakattu koko: {format_byte_count(summary.get('archived_bytes', 0))}",
+            f"Säästö: {format_byte_count(saved)} ({ratio:.0f} %)",
+        ]
+    )
+
+
+__all__ = [
+    "ARCHIVE_FORMATS",
+    "DEFAULT_ARCHIVE_AFTER_DAYS",
+    "DEFAULT_ARCHIVE_FORMAT",
+    "archive_file_name",
+    "archive_store",
+    "format_archive_report",
+    "idle_conversations",
+    "iter_archive",
+    "list_archives",
+    "normalize_archive_format",
+    "restore_store",
+    "summarize_archives",
+    "write_archive",
+]
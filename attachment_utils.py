@@ -0,0 +1,512 @@
+"""Attachment encoding helpers for backend payloads."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+import re
+import tempfile
+import time
+from typing import Any, Callable, Dict, Final, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from request_body import Base64FilePart, StreamPart
+
+
+CHARS_PER_TOKEN: Final[int] = 4
+DEFAULT_TOKEN_BUDGET: Final[int] = 4000
+SNIFF_BYTES: Final[int] = 8192
+ATTACHMENTS_DIR: Final[str] = os.path.join(os.path.dirname(os.path.abspath(__file__)), "attachments")
+REFERENCE_PREVIEW_CHARS: Final[int] = 120
+# Unreferenced blobs younger than this survive a sweep: they may belong to a
+# message that is being composed or has not reached the history store yet.
+BLOB_GC_GRACE_S: Final[float] = 24 * 3600.0
+
+ATTACHMENT_POLICIES: Final[tuple[str, ...]] = ("full", "reference", "drop")
+
+TEXT_MIME_TYPES: Final[frozenset[str]] = frozenset(
+    {
+        "application/json",
+        "application/xml",
+        "application/javascript",
+        "application/x-javascript",
+        "application/x-yaml",
+        "application/yaml",
+        "application/toml",
+        "application/sql",
+        "application/x-sh",
+        "application/x-python",
+        "application/x-python-code",
+        "application/x-httpd-php",
+        "application/ld+json",
+        "image/svg+xml",
+    }
+)
+
+TEXT_EXTENSIONS: Final[frozenset[str]] = frozenset(
+    {
+        ".txt", ".md", ".rst", ".csv", ".tsv", ".log", ".ini", ".cfg", ".conf",
+        ".toml", ".yaml", ".yml", ".json", ".xml", ".html", ".htm", ".css",
+        ".py", ".pyw", ".js", ".ts", ".tsx", ".jsx", ".java", ".kt", ".c",
+        ".h", ".cpp", ".hpp", ".cs", ".go", ".rs", ".rb", ".php", ".sh",
+        ".bat", ".cmd", ".ps1", ".sql", ".lua", ".swift", ".r", ".tex",
+    }
+)
+
+_UNKNOWN_MIMES: Final[frozenset[str]] = frozenset({"", "tuntematon", "application/octet-stream"})
+
+# (attachment, raw bytes) -> should this encoder handle it?
+AttachmentPredicate = Callable[[Dict[str, Any], bytes], bool]
+# (attachment, raw bytes, character budget) -> lines for the backend message
+AttachmentEncoder = Callable[[Dict[str, Any], bytes, int], List[Union[str, StreamPart]]]
+
+
+class AttachmentBlobStore:
+    """Content-addressed attachment files, so history only keeps a reference."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def path_for(self, blob_id: str) -> str:
+        blob_id = str(blob_id or "").lower()
+        if len(blob_id) != 64 or any(ch not in "0123456789abcdef" for ch in blob_id):
+            raise ValueError(f"Virheellinen liitetunniste: {blob_id!r}")
+        return os.path.join(self.root, blob_id[:2], blob_id)
+
+    def exists(self, blob_id: str) -> bool:
+        try:
+            return os.path.isfile(self.path_for(blob_id))
+        except ValueError:
+            return False
+
+    def put_file(self, src_path: str, chunk_size: int = 1024 * 1024) -> Tuple[str, int]:
+        """Copy ``src_path`` into the store in blocks; return (blob id, size)."""
+
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(prefix=".blob-", dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as out, open(src_path, "rb") as src:
+                while True:
+                    block = src.read(chunk_size)
+                    if not block:
+                        break
+                    digest.update(block)
+                    out.write(block)
+                    size += len(block)
+            blob_id = digest.hexdigest()
+            final_path = self.path_for(blob_id)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)
+                os.utime(final_path)  # re-attached: restart its sweep grace period
+            else:
+                os.replace(tmp_path, final_path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        return blob_id, size
+
+    def read(self, blob_id: str, limit: Optional[int] = None) -> bytes:
+        with open(self.path_for(blob_id), "rb") as fh:
+            return fh.read() if limit is None else fh.read(max(0, limit))
+
+    def _files(self) -> Iterator[Tuple[str, str]]:
+        """(name, path) of every blob and leftover temp file in the store."""
+
+        try:
+            shards = os.listdir(self.root)
+        except OSError:
+            return
+        for shard in shards:
+            shard_path = os.path.join(self.root, shard)
+            if shard.startswith(".blob-"):
+                yield shard, shard_path
+                continue
+            if len(shard) != 2 or not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                yield name, os.path.join(shard_path, name)
+
+    def sweep(self, live: Set[str], grace_s: float = BLOB_GC_GRACE_S, now: Optional[float] = None) -> Tuple[int, int]:
+        """Delete blobs not in ``live`` (and stale temp files); returns (files, bytes) removed.
+
+        ``live`` must hold every blob id still referenced anywhere; files
+        modified within ``grace_s`` seconds are always kept.
+        """
+
+        cutoff = (time.time() if now is None else now) - grace_s
+        removed = 0
+        freed = 0
+        for name, path in list(self._files()):
+            if name.lower() in live:
+                continue
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                os.remove(path)
+            except OSError:
+                continue
+            removed += 1
+            freed += stat.st_size
+        return removed, freed
+
+
+def message_blob_ids(messages: Iterable[Dict[str, Any]]) -> Set[str]:
+    """Blob ids referenced by the attachments of ``messages``."""
+
+    ids: Set[str] = set()
+    for message in messages:
+        for att in message.get("attachments") or []:
+            blob_id = att.get("blob") if isinstance(att, dict) else None
+            if blob_id:
+                ids.add(str(blob_id).lower())
+    return ids
+
+
+_BLOB_REF_RE: Final["re.Pattern[bytes]"] = re.compile(rb'"blob"\s*:\s*"([0-9a-fA-F]{64})"')
+
+
+def scan_blob_ids(data: bytes) -> Set[str]:
+    """Blob ids mentioned in raw JSON bytes, for files that no longer parse."""
+
+    return {match.decode("ascii").lower() for match in _BLOB_REF_RE.findall(data)}
+
+
+default_blob_store = AttachmentBlobStore(ATTACHMENTS_DIR)
+
+
+def attachment_bytes(
+    att: Dict[str, Any],
+    limit: Optional[int] = None,
+    store: Optional[AttachmentBlobStore] = None,
+) -> bytes:
+    """Return up to ``limit`` raw bytes of an attachment (blob or inline base64)."""
+
+    blob_id = att.get("blob")
+    if blob_id:
+        try:
+            return (store or default_blob_store).read(blob_id, limit)
+        except (OSError, ValueError):
+            return b""
+    data = att.get("data") or ""
+    if not data:
+        return b""
+    if limit is not None:
+        data = data[: (max(0, limit) + 2) // 3 * 4]
+    try:
+        return base64.b64decode(data)
+    except Exception:
+        return b""
+
+
+def looks_like_text(data: bytes) -> bool:
+    """Sniff the head of ``data`` and decide whether it is UTF-8 text."""
+
+    sample = data[:SNIFF_BYTES]
+    if not sample:
+        return True
+    if b"\x00" in sample:
+        return False
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        # A multibyte sequence may be cut at the sample boundary.
+        if exc.reason != "unexpected end of data" or exc.start < len(sample) - 3:
+            return False
+    control = sum(1 for b in sample if b < 32 and b not in (9, 10, 12, 13))
+    return control <= len(sample) // 100
+
+
+def is_text_attachment(att: Dict[str, Any], data: bytes) -> bool:
+    """Decide by MIME type, file extension and content sniffing."""
+
+    mime = str(att.get("mime") or "").strip().lower()
+    ext = os.path.splitext(str(att.get("name") or ""))[1].lower()
+    declared_text = mime.startswith("text/") or mime in TEXT_MIME_TYPES or ext in TEXT_EXTENSIONS
+    if not declared_text and mime not in _UNKNOWN_MIMES:
+        return False
+    return looks_like_text(data)
+
+
+def split_text_chunks(text: str, chunk_chars: int) -> List[str]:
+    """Split text into chunks of at most ``chunk_chars``, preferring line breaks."""
+
+    if chunk_chars <= 0 or len(text) <= chunk_chars:
+        return [text] if text else []
+    chunks: List[str] = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_chars, length)
+        if end < length:
+            newline = text.rfind("\n", start, end)
+            if newline > start:
+                end = newline + 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def fit_text_to_budget(text: str, max_chars: int) -> Tuple[str, int]:
+    """Keep whole leading chunks of ``text`` within ``max_chars``.
+
+    Returns the kept text and the number of omitted characters.
+    """
+
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text, 0
+    kept: List[str] = []
+    used = 0
+    for chunk in split_text_chunks(text, max(1, max_chars // 8)):
+        if used + len(chunk) > max_chars:
+            break
+        kept.append(chunk)
+        used += len(chunk)
+    if not kept:
+        kept.append(text[:max_chars])
+        used = max_chars
+    return "".join(kept), len(text) - used
+
+
+def describe_attachment(att: Dict[str, Any]) -> str:
+    name = att.get("name", "liite")
+    mime = att.get("mime", "tuntematon")
+    size = att.get("size")
+    size_info = f", {size} tavua" if isinstance(size, int) else ""
+    return f"{name} ({mime}{size_info})"
+
+
+class AttachmentBudget:
+    """Characters of attachment text left for one request, shared by all its attachments.
+
+    ``token_budget <= 0`` means unlimited (:attr:`remaining` is ``None``).
+    Base64-encoded binaries are not counted, as before.
+    """
+
+    def __init__(self, token_budget: int = DEFAULT_TOKEN_BUDGET) -> None:
+        tokens = max(0, int(token_budget))
+        self.remaining: Optional[int] = tokens * CHARS_PER_TOKEN if tokens else None
+
+    @property
+    def exhausted(self) -> bool:
+        return self.remaining is not None and self.remaining <= 0
+
+    def charge(self, chars: int) -> None:
+        if self.remaining is not None:
+            self.remaining = max(0, self.remaining - max(0, int(chars)))
+
+
+def _encode_text(att: Dict[str, Any], data: bytes, budget_chars: int) -> List[Union[str, StreamPart]]:
+    text = data.decode("utf-8", errors="replace").lstrip("\ufeff")
+    kept, omitted = fit_text_to_budget(text, budget_chars)
+    estimated = False
+    size = att.get("size")
+    if isinstance(size, int) and size > len(data):
+        # Only the head of a large file was read; estimate the unread characters
+        # from the bytes-per-character ratio of the part that was read.
+        omitted += round((size - len(data)) * (len(text) / len(data) if data else 1.0))
+        estimated = True
+    lines = [f"{describe_attachment(att)} – tekstinä:", "```", kept.rstrip("\n"), "```"]
+    if omitted:
+        count = f"noin {omitted}" if estimated else str(omitted)
+        lines.append(f"[Liite katkaistu: {count} merkkiä jätettiin pois token-budjetin vuoksi]")
+    return lines
+
+
+def _encode_base64(att: Dict[str, Any], data: bytes, budget_chars: int) -> List[Union[str, StreamPart]]:
+    blob_id = att.get("blob")
+    if blob_id:
+        try:
+            path = default_blob_store.path_for(blob_id)
+        except ValueError:
+            path = ""
+        if path and os.path.isfile(path):
+            return [describe_attachment(att), Base64FilePart(path, prefix="BASE64:")]
+    encoded = att.get("data") or base64.b64encode(data).decode("ascii")
+    return [describe_attachment(att), f"BASE64:{encoded}"]
+
+
+_ENCODERS: List[Tuple[str, AttachmentPredicate, AttachmentEncoder]] = [
+    ("text", is_text_attachment, _encode_text),
+]
+
+
+def register_attachment_encoder(
+    name: str,
+    predicate: AttachmentPredicate,
+    encoder: AttachmentEncoder,
+) -> None:
+    """Register an encoder; later registrations are tried first."""
+
+    _ENCODERS[:] = [entry for entry in _ENCODERS if entry[0] != name]
+    _ENCODERS.insert(0, (name, predicate, encoder))
+
+
+def select_attachment_encoder(att: Dict[str, Any], data: bytes) -> Tuple[str, AttachmentEncoder]:
+    for name, predicate, encoder in _ENCODERS:
+        try:
+            if predicate(att, data):
+                return name, encoder
+        except Exception:
+            continue
+    return "base64", _encode_base64
+
+
+def _budget_cost(lines: List[Union[str, StreamPart]]) -> int:
+    # Text the budget limits; base64 payloads never counted against it.
+    return sum(len(line) for line in lines if isinstance(line, str) and not line.startswith("BASE64:"))
+
+
+def encode_attachment(
+    att: Dict[str, Any],
+    token_budget: Union[int, AttachmentBudget] = DEFAULT_TOKEN_BUDGET,
+    data: Optional[bytes] = None,
+) -> List[Union[str, StreamPart]]:
+    """Return the backend lines for a single attachment.
+
+    Binary blobs come back as a :class:`Base64FilePart`, so their content is
+    only read and encoded while the request body is being written. Pass an
+    :class:`AttachmentBudget` to share one budget between attachments; the
+    text this attachment adds is charged to it.
+    """
+
+    budget = token_budget if isinstance(token_budget, AttachmentBudget) else AttachmentBudget(token_budget)
+    budget_chars = budget.remaining or 0
+    if data is None:
+        # UTF-8 needs at most 4 bytes per character; never read more than the budget can use.
+        limit = budget_chars * 4 + 4 if budget.remaining is not None else None
+        raw = attachment_bytes(att, limit=max(limit, SNIFF_BYTES) if limit is not None else None)
+    else:
+        raw = data
+    name, encoder = select_attachment_encoder(att, raw)
+    if name == "text" and budget.exhausted:
+        return [f"{describe_attachment(att)} – sisältö jätettiin pois: pyynnön token-budjetti on käytetty"]
+    try:
+        lines = encoder(att, raw, budget_chars)
+    except Exception:
+        lines = _encode_base64(att, raw, budget_chars)
+    budget.charge(_budget_cost(lines))
+    return lines
+
+
+def reference_attachment_lines(att: Dict[str, Any], preview_chars: int = REFERENCE_PREVIEW_CHARS) -> List[str]:
+    """Describe an earlier attachment without resending its content."""
+
+    line = f"- {describe_attachment(att)}"
+    if preview_chars > 0:
+        head = attachment_bytes(att, limit=preview_chars + 4)
+        if head and is_text_attachment(att, head):
+            preview = head.decode("utf-8", errors="ignore").strip().replace("\n", " ")
+            if preview:
+                line += f": \"{preview[:preview_chars]}…\""
+    return [line]
+
+
+def compose_attachment_lines(
+    attachments: List[Dict[str, Any]],
+    token_budget: Union[int, AttachmentBudget] = DEFAULT_TOKEN_BUDGET,
+    mode: str = "full",
+) -> List[Union[str, StreamPart]]:
+    if mode == "drop" or not attachments:
+        return []
+    if mode == "reference":
+        lines = ["Liitteet (lähetetty aiemmin, sisältöä ei toisteta):"]
+        for att in attachments:
+            lines.extend(reference_attachment_lines(att))
+        return lines
+    budget = token_budget if isinstance(token_budget, AttachmentBudget) else AttachmentBudget(token_budget)
+    lines: List[Union[str, StreamPart]] = ["Liitteet:"]
+    for att in attachments:
+        lines.extend(encode_attachment(att, budget))
+    return lines
+
+
+def normalize_attachment_policy(policy: Any) -> str:
+    value = str(policy or "").strip().lower()
+    return value if value in ATTACHMENT_POLICIES else "full"
+
+
+def resolve_attachment_mode(policy: Any, age: int, keep_turns: int) -> str:
+    """Return "full", "reference" or "drop" for a message ``age`` user turns old."""
+
+    policy = normalize_attachment_policy(policy)
+    if policy == "full" or age < max(0, int(keep_turns)):
+        return "full"
+    return policy
+
+
+def user_turn_ages(history: List[Dict[str, Any]]) -> List[int]:
+    """Count for each entry how many user messages follow it."""
+
+    ages = [0] * len(history)
+    later_user_turns = 0
+    for idx in range(len(history) - 1, -1, -1):
+        ages[idx] = later_user_turns
+        if history[idx].get("role") == "user":
+            later_user_turns += 1
+    return ages
+
+
+def estimate_encoded_size(att: Dict[str, Any], token_budget: int = DEFAULT_TOKEN_BUDGET) -> int:
+    """Cheap estimate of how many characters a full encoding would add."""
+
+    data_len = len(att.get("data") or "")
+    if not data_len and isinstance(att.get("size"), int):
+        data_len = (att["size"] + 2) // 3 * 4
+    mime = str(att.get("mime") or "").strip().lower()
+    ext = os.path.splitext(str(att.get("name") or ""))[1].lower()
+    if mime.startswith("text/") or mime in TEXT_MIME_TYPES or ext in TEXT_EXTENSIONS:
+        size = att.get("size")
+        raw = size if isinstance(size, int) else data_len * 3 // 4
+        return min(raw, max(0, int(token_budget)) * CHARS_PER_TOKEN)
+    return data_len
+
+
+def format_byte_count(count: int) -> str:
+    value = float(max(0, count))
+    for unit in ("B", "kt", "Mt"):
+        if value < 1024 or unit == "Mt":
+            return f"{int(value)} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} Mt"
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+__all__ = [
+    "ATTACHMENTS_DIR",
+    "ATTACHMENT_POLICIES",
+    "AttachmentBlobStore",
+    "AttachmentBudget",
+    "BLOB_GC_GRACE_S",
+    "CHARS_PER_TOKEN",
+    "DEFAULT_TOKEN_BUDGET",
+    "attachment_bytes",
+    "compose_attachment_lines",
+    "default_blob_store",
+    "describe_attachment",
+    "encode_attachment",
+    "estimate_encoded_size",
+    "estimate_tokens",
+    "fit_text_to_budget",
+    "format_byte_count",
+    "is_text_attachment",
+    "looks_like_text",
+    "message_blob_ids",
+    "normalize_attachment_policy",
+    "reference_attachment_lines",
+    "register_attachment_encoder",
+    "resolve_attachment_mode",
+    "scan_blob_ids",
+    "select_attachment_encoder",
+    "split_text_chunks",
+    "user_turn_ages",
+]
@@ -0,0 +1,235 @@
+"""Adaptive API connection monitor.
+
+One long-lived thread probes the API, records round-trip times into a
+:class:`~perf_metrics.LatencyRecorder` ring buffer and reports each result.
+The probe is a single small ``GET`` over a kept-alive ``http.client``
+connection, so after the first handshake it measures the request itself and
+not TCP/TLS setup. The interval adapts: failures are retried at the base
+interval, consecutive healthy probes back off exponentially, and an idle user
+or a minimised window stretches it further (:func:`next_interval`).
+"""
+
+from __future__ import annotations
+
+import http.client
+import threading
+import time
+from typing import Callable, Dict, Final, Optional, Tuple
+
+from perf_metrics import LatencyRecorder
+
+
+BASE_INTERVAL_S: Final[float] = 8.0
+MAX_INTERVAL_S: Final[float] = 300.0
+MAX_HEALTHY_DOUBLINGS: Final[int] = 3  # healthy: 8 s -> 16 -> 32 -> 64 s
+IDLE_AFTER_S: Final[float] = 120.0
+IDLE_FACTOR: Final[float] = 2.0
+HIDDEN_FACTOR: Final[float] = 4.0
+RTT_SAMPLES: Final[int] = 64
+PROBE_TIMEOUT_S: Final[float] = 5.0
+
+ProbeResult = Tuple[Optional[float], str]  # (rtt_ms, "ok" | "warn" | "error")
+Reporter = Callable[[Optional[float], str], None]
+
+
+def classify_status(status: int, has_key: bool) -> str:
+    """State for an HTTP status: any answer means the API is reachable."""
+
+    if 200 <= status < 300 or status == 404:  # 404: unknown model id, server fine
+        return "ok"
+    if status in (401, 403):
+        return "ok" if has_key else "warn"
+    return "warn"
+
+
+def next_interval(
+    state: str,
+    healthy_streak: int,
+    idle: bool = False,
+    hidden: bool = False,
+    base: float = BASE_INTERVAL_S,
+    maximum: float = MAX_INTERVAL_S,
+) -> float:
+    """Seconds until the next probe."""
+
+    interval = base
+    if state == "ok":
+        interval *= 2 ** min(max(0, healthy_streak - 1), MAX_HEALTHY_DOUBLINGS)
+    if idle:
+        interval *= IDLE_FACTOR
+    if hidden:
+        interval *= HIDDEN_FACTOR
+    return min(maximum, interval)
+
+
+def format_ping(rtt: LatencyRecorder, state: str) -> str:
+    """Status bar text: median and p95 of the recent RTT samples."""
+
+    if state == "error":
+        return "PING: -- ms (ei yhteyttä)"
+    samples = rtt.samples()
+    if not samples:
+        return "PING: -- ms" if state == "ok" else "PING: -- ms (varoitus)"
+    summary = rtt.summary()
+    text = f"PING: p50 {summary['p50']:.0f} · p95 {summary['p95']:.0f} ms"
+    return text if state == "ok" else f"{text} (varoitus)"
+
+
+class HttpProbe:
+    """``GET path`` over one reused connection; reconnects after any failure.
+
+    Servers drop idle keep-alive connections well within the longer probe
+    intervals, so a failure on a reused connection is retried once on a
+    fresh one; only a failing fresh connection counts as ``"error"``.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        path: Callable[[], str],
+        headers: Callable[[], Dict[str, str]],
+        https: bool = True,
+        port: Optional[int] = None,
+        timeout: float = PROBE_TIMEOUT_S,
+    ) -> None:
+        self.host = host
+        self.path = path
+        self.headers = headers
+        self.https = https
+        self.port = port
+        self.timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self.connects = 0
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = cls(self.host, self.port, timeout=self.timeout)
+            conn.connect()  # handshake outside the measured round trip
+            self._conn = conn
+            self.connects += 1
+        return self._conn
+
+    def __call__(self) -> ProbeResult:
+        headers = dict(self.headers())
+        has_key = "Authorization" in headers
+        for _attempt in range(2):
+            reused = self._conn is not None
+            try:
+                conn = self._connection()
+                started = time.perf_counter()
+                conn.request("GET", self.path(), headers=headers)
+                resp = conn.getresponse()
+                rtt_ms = (time.perf_counter() - started) * 1000.0
+                resp.read()  # drain the (small) body so the connection can be reused
+                if resp.will_close:
+                    self.close()
+            except Exception:
+                self.close()
+                if reused:
+                    continue  # most likely closed by the server while idle
+                return None, "error"
+            return rtt_ms, classify_status(resp.status, has_key)
+        return None, "error"
+
+    def close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+class ConnectionMonitor:
+    """Single probing thread with an adaptive interval and an RTT ring buffer.
+
+    ``report(rtt_ms, state)`` is called from the monitor thread — pass
+    something that hands over to the UI thread. :meth:`set_hidden` and
+    :meth:`touch` feed the window state and user activity; :meth:`wake`
+    probes right away (e.g. when the window is restored).
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[], ProbeResult],
+        report: Reporter,
+        clock: Callable[[], float] = time.monotonic,
+        samples: int = RTT_SAMPLES,
+    ) -> None:
+        self.probe = probe
+        self.report = report
+        self._clock = clock
+        self.rtt = LatencyRecorder(samples)
+        self.state = "unknown"
+        self.healthy_streak = 0
+        self.hidden = False
+        self.probes = 0
+        self._last_activity = clock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, delay: float = 0.0) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(delay,), name="connection-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def touch(self) -> None:
+        self._last_activity = self._clock()
+
+    def set_hidden(self, hidden: bool) -> None:
+        was_hidden, self.hidden = self.hidden, bool(hidden)
+        if was_hidden and not self.hidden:
+            self.wake()
+
+    @property
+    def idle(self) -> bool:
+        return self._clock() - self._last_activity >= IDLE_AFTER_S
+
+    def run_once(self) -> float:
+        """Probe, record and report once; returns the seconds until the next probe."""
+
+        try:
+            rtt_ms, state = self.probe()
+        except Exception:
+            rtt_ms, state = None, "error"
+        self.probes += 1
+        if rtt_ms is not None:
+            self.rtt.record(rtt_ms)
+        self.healthy_streak = self.healthy_streak + 1 if state == "ok" else 0
+        self.state = state
+        try:
+            self.report(rtt_ms, state)
+        except Exception:
+            pass
+        return next_interval(state, self.healthy_streak, idle=self.idle, hidden=self.hidden)
+
+    def _run(self, delay: float) -> None:
+        wait = delay
+        while not self._stopped.is_set():
+            if wait > 0:
+                self._wake.wait(wait)
+                self._wake.clear()
+                if self._stopped.is_set():
+                    return
+            wait = self.run_once()
+
+
+__all__ = [
+    "BASE_INTERVAL_S",
+    "ConnectionMonitor",
+    "HttpProbe",
+    "MAX_INTERVAL_S",
+    "classify_status",
+    "format_ping",
+    "next_interval",
+]
@@ -0,0 +1,154 @@
+"""Lightweight index of conversations (one entry per chat session).
+
+The index is a small JSON file holding only metadata — id, title, last
+timestamp, message count and content size — so the sidebar can list every
+conversation without opening any of them. Message storage lives in one
+history store per conversation and is loaded only when that conversation is
+opened.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import time
+from typing import Any, Dict, Final, List, Optional
+
+
+DEFAULT_CONVERSATION_ID: Final[int] = 1
+TITLE_MAX_CHARS: Final[int] = 40
+
+_ENTRY_DEFAULTS: Final[Dict[str, Any]] = {
+    "title": "",
+    "last_timestamp": None,
+    "message_count": 0,
+    "size_bytes": 0,
+    "updated_at": 0.0,
+}
+
+
+def _content_size(message: Dict[str, Any]) -> int:
+    return len(str(message.get("content") or "").encode("utf-8"))
+
+
+def derive_title(history: List[Dict[str, Any]]) -> str:
+    """Title from the first user message, shortened to one line."""
+
+    for message in history:
+        if message.get("role") == "user":
+            text = " ".join(str(message.get("content") or "").split())
+            if text:
+                return text if len(text) <= TITLE_MAX_CHARS else text[: TITLE_MAX_CHARS - 1] + "…"
+    return ""
+
+
+def display_title(entry: Dict[str, Any]) -> str:
+    return entry.get("title") or f"Keskustelu {entry.get('id')}"
+
+
+class ConversationIndex:
+    """In-memory conversation index backed by ``index.json``."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.active_id = DEFAULT_CONVERSATION_ID
+        self._entries: Dict[int, Dict[str, Any]] = {}
+
+    # --- Persistence ---
+    def load(self) -> "ConversationIndex":
+        data: Dict[str, Any] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as fh:
+                    loaded = json.load(fh)
+                if isinstance(loaded, dict):
+                    data = loaded
+            except Exception:
+                data = {}
+        self._entries = {}
+        for raw in data.get("conversations") or []:
+            try:
+                cid = int(raw["id"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            self._entries[cid] = {**_ENTRY_DEFAULTS, **raw, "id": cid}
+        if not self._entries:
+            # First run (or legacy single history.json): conversation 1.
+            self._entries[DEFAULT_CONVERSATION_ID] = {**_ENTRY_DEFAULTS, "id": DEFAULT_CONVERSATION_ID}
+        try:
+            active = int(data.get("active", DEFAULT_CONVERSATION_ID))
+        except (TypeError, ValueError):
+            active = DEFAULT_CONVERSATION_ID
+        self.active_id = active if active in self._entries else self.entries()[0]["id"]
+        return self
+
+    def to_bytes(self) -> bytes:
+        payload = {"active": self.active_id, "conversations": self.entries()}
+        return json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+
+    # --- Queries ---
+    def entries(self) -> List[Dict[str, Any]]:
+        """Entries, most recently updated first."""
+
+        return sorted(
+            (dict(entry) for entry in self._entries.values()),
+            key=lambda entry: (-float(entry.get("updated_at") or 0.0), -entry["id"]),
+        )
+
+    def get(self, cid: int) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(int(cid))
+        return dict(entry) if entry else None
+
+    def __contains__(self, cid: object) -> bool:
+        return cid in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- Mutations ---
+    def create(self, title: str = "") -> Dict[str, Any]:
+        cid = max(self._entries, default=0) + 1
+        entry = {**_ENTRY_DEFAULTS, "id": cid, "title": title, "updated_at": time.time()}
+        self._entries[cid] = entry
+        return dict(entry)
+
+    def remove(self, cid: int) -> None:
+        self._entries.pop(int(cid), None)
+        if self.active_id == cid and self._entries:
+            self.active_id = self.entries()[0]["id"]
+
+    def update(self, cid: int, **fields: Any) -> None:
+        entry = self._entries.get(int(cid))
+        if entry is not None:
+            entry.update(fields)
+
+    def update_from_history(self, cid: int, history: List[Dict[str, Any]], reset: bool = False) -> None:
+        """Refresh counters for ``cid``; only messages past the stored count are measured."""
+
+        entry = self._entries.get(int(cid))
+        if entry is None:
+            return
+        known = int(entry.get("message_count") or 0)
+        if reset or known > len(history):
+            entry["size_bytes"] = sum(_content_size(m) for m in history)
+        else:
+            entry["size_bytes"] = int(entry.get("size_bytes") or 0) + sum(
+                _content_size(m) for m in history[known:]
+            )
+        if len(history) != known or reset:
+            entry["updated_at"] = time.time()
+        entry["message_count"] = len(history)
+        entry["last_timestamp"] = next(
+            (m.get("timestamp") for m in reversed(history) if m.get("timestamp")), None
+        )
+        if not entry.get("title"):
+            entry["title"] = derive_title(history)
+
+
+__all__ = [
+    "DEFAULT_CONVERSATION_ID",
+    "TITLE_MAX_CHARS",
+    "ConversationIndex",
+    "derive_title",
+    "display_title",
+]
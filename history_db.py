@@ -0,0 +1,479 @@
+"""Optional SQLite conversation store (stdlib ``sqlite3``) with FTS5 search.
+
+Implements the same ``load`` / ``append`` / ``rewrite`` interface as
+:class:`history_journal.HistoryJournal`, plus cheap queries for counters,
+viewer rows and full-text search so the UI does not have to walk Python lists.
+:class:`LazyHistory` keeps only the newest messages of a conversation in
+memory and reads older ones with range queries when they are needed.
+The database runs in WAL mode; all statements are parameterized constants and
+are reused from the connection's statement cache.
+"""
+
+from __future__ import annotations
+
+import json
+import pathlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Final, Iterator, List, Optional, Set, Tuple
+
+
+DEFAULT_CONVERSATION_ID: Final[int] = 1
+
+_CORE_KEYS: Final[frozenset[str]] = frozenset({"role", "content", "timestamp", "attachments"})
+_ATTACHMENT_KEYS: Final[Tuple[str, ...]] = ("name", "mime", "size", "blob", "data")
+
+_SCHEMA: Final[str] = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    last_timestamp TEXT,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    size_bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL DEFAULT '',
+    timestamp TEXT,
+    extra TEXT,
+    UNIQUE (conversation_id, position)
+);
+CREATE TABLE IF NOT EXISTS attachments (
+    id INTEGER PRIMARY KEY,
+    message_id INTEGER NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
+    name TEXT,
+    mime TEXT,
+    size INTEGER,
+    blob TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS attachments_message ON attachments(message_id);
+"""
+
+_FTS_SCHEMA: Final[str] = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, content='messages', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 0'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+_SQL_ENSURE_CONVERSATION: Final[str] = "INSERT OR IGNORE INTO conversations (id, title) VALUES (?, ?)"
+_SQL_DELETE_POSITION: Final[str] = "DELETE FROM messages WHERE conversation_id = ? AND position = ?"
+_SQL_INSERT_MESSAGE: Final[str] = (
+    "INSERT INTO messages (conversation_id, position, role, content, timestamp, extra) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+_SQL_INSERT_ATTACHMENT: Final[str] = (
+    "INSERT INTO attachments (message_id, name, mime, size, blob, data) VALUES (?, ?, ?, ?, ?, ?)"
+)
+_SQL_BUMP_CONVERSATION: Final[str] = (
+    "UPDATE conversations SET message_count = ?, "
+    "last_timestamp = COALESCE(?, last_timestamp), size_bytes = size_bytes + ? WHERE id = ?"
+)
+_SQL_RESET_CONVERSATION: Final[str] = (
+    "UPDATE conversations SET message_count = 0, last_timestamp = NULL, size_bytes = 0 WHERE id = ?"
+)
+_SQL_DELETE_MESSAGES: Final[str] = "DELETE FROM messages WHERE conversation_id = ?"
+_SQL_DELETE_CONVERSATION: Final[str] = "DELETE FROM conversations WHERE id = ?"
+_SQL_SELECT_MESSAGES: Final[str] = (
+    "SELECT id, role, content, timestamp, extra FROM messages WHERE conversation_id = ? ORDER BY position"
+)
+_SQL_SELECT_ATTACHMENTS: Final[str] = (
+    "SELECT a.message_id, a.name, a.mime, a.size, a.blob, a.data FROM attachments a "
+    "JOIN messages m ON m.id = a.message_id WHERE m.conversation_id = ? ORDER BY a.id"
+)
+_SQL_SELECT_MESSAGE_PAGE: Final[str] = (
+    "SELECT id, role, content, timestamp, extra FROM messages "
+    "WHERE conversation_id = ? AND position >= ? ORDER BY position LIMIT ?"
+)
+_SQL_SELECT_MESSAGE_TAIL: Final[str] = (
+    "SELECT position, id, role, content, timestamp, extra FROM messages "
+    "WHERE conversation_id = ? ORDER BY position DESC LIMIT ?"
+)
+_SQL_SELECT_ATTACHMENT_PAGE: Final[str] = (
+    "SELECT a.message_id, a.name, a.mime, a.size, a.blob, a.data FROM attachments a "
+    "JOIN messages m ON m.id = a.message_id "
+    "WHERE m.conversation_id = ? AND m.position >= ? AND m.position < ? ORDER BY a.id"
+)
+_SQL_BLOB_IDS: Final[str] = "SELECT DISTINCT blob FROM attachments WHERE blob IS NOT NULL"
+_SQL_CONVERSATION_IDS: Final[str] = "SELECT DISTINCT conversation_id FROM messages"
+_SQL_TIMING_EXTRAS: Final[str] = "SELECT conversation_id, extra FROM messages WHERE extra LIKE '%\"timing\"%'"
+_SQL_STATS: Final[str] = "SELECT message_count, last_timestamp FROM conversations WHERE id = ?"
+_SQL_ROWS: Final[str] = (
+    "SELECT position, timestamp, role, substr(content, 1, ?) FROM messages "
+    "WHERE conversation_id = ? AND position >= ? ORDER BY position LIMIT ?"
+)
+_SQL_SEARCH_FTS: Final[str] = (
+    "SELECT m.position, m.timestamp, m.role, snippet(messages_fts, 0, '«', '»', '…', 12) "
+    "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+    "WHERE messages_fts MATCH ? AND m.conversation_id = ? ORDER BY bm25(messages_fts) LIMIT ?"
+)
+_SQL_SEARCH_LIKE: Final[str] = (
+    "SELECT position, timestamp, role, substr(content, 1, 120) FROM messages "
+    "WHERE conversation_id = ? AND content LIKE ? ESCAPE '\\' ORDER BY position DESC LIMIT ?"
+)
+
+
+def fts_query(text: str) -> str:
+    """Turn free user input into a safe FTS5 prefix query (all terms must match)."""
+
+    terms = [term for term in str(text or "").split() if term.strip('"')]
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+
+def _connect_read_only(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{pathlib.Path(path).resolve().as_posix()}?mode=ro", uri=True)
+
+
+def referenced_blob_ids(path: str) -> Set[str]:
+    """Attachment blob ids referenced by any conversation in the database at ``path``."""
+
+    conn = _connect_read_only(path)
+    try:
+        return {str(row[0]).lower() for row in conn.execute(_SQL_BLOB_IDS)}
+    finally:
+        conn.close()
+
+
+def stored_conversation_ids(path: str) -> Set[int]:
+    """Ids of the conversations that have messages in the database at ``path``."""
+
+    conn = _connect_read_only(path)
+    try:
+        return {int(row[0]) for row in conn.execute(_SQL_CONVERSATION_IDS)}
+    finally:
+        conn.close()
+
+
+def iter_timing_entries(path: str, skip: Optional[Set[int]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield ``{"timing": ...}`` for every stored reply with a stream trace.
+
+    Reads only the ``extra`` column of matching rows, streamed from the cursor.
+    Conversations in ``skip`` (e.g. archived ones) are left out.
+    """
+
+    skip = skip or set()
+    conn = _connect_read_only(path)
+    try:
+        for cid, extra in conn.execute(_SQL_TIMING_EXTRAS):
+            if cid in skip:
+                continue
+            try:
+                timing = json.loads(extra).get("timing")
+            except (TypeError, ValueError, AttributeError):
+                continue
+            if timing:
+                yield {"timing": timing}
+    finally:
+        conn.close()
+
+
+class SQLiteHistoryStore:
+    """Conversation history in SQLite; one conversation is active at a time."""
+
+    def __init__(self, path: str, conversation_id: int = DEFAULT_CONVERSATION_ID) -> None:
+        self.path = path
+        self.conversation_id = conversation_id
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, cached_statements=64)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SCHEMA)
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self.fts_enabled = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: fall back to LIKE search.
+            self.fts_enabled = False
+        with self._conn:
+            self._conn.execute(_SQL_ENSURE_CONVERSATION, (conversation_id, ""))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # --- HistoryJournal-compatible interface ---
+    def load(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(_SQL_SELECT_MESSAGES, (self.conversation_id,)).fetchall()
+            att_rows = self._conn.execute(_SQL_SELECT_ATTACHMENTS, (self.conversation_id,)).fetchall()
+        return self._entries(rows, att_rows)
+
+    def iter_messages(self, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Yield the history page by page instead of loading it all at once."""
+
+        start = 0
+        while True:
+            page = self.load_range(start, start + int(page_size))
+            yield from page
+            if len(page) < page_size:
+                return
+            start += len(page)
+
+    def load_range(self, start: int, end: int) -> List[Dict[str, Any]]:
+        """Messages at positions ``start`` .. ``end - 1``."""
+
+        start = max(0, int(start))
+        if end <= start:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                _SQL_SELECT_MESSAGE_PAGE, (self.conversation_id, start, int(end) - start)
+            ).fetchall()
+            att_rows = self._conn.execute(
+                _SQL_SELECT_ATTACHMENT_PAGE, (self.conversation_id, start, start + len(rows))
+            ).fetchall()
+        return self._entries(rows, att_rows)
+
+    def load_tail(self, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """The newest ``limit`` messages and the position of the first of them."""
+
+        with self._lock:
+            rows = self._conn.execute(_SQL_SELECT_MESSAGE_TAIL, (self.conversation_id, max(0, int(limit)))).fetchall()
+            rows.reverse()
+            base = int(rows[0][0]) if rows else 0
+            att_rows = self._conn.execute(
+                _SQL_SELECT_ATTACHMENT_PAGE, (self.conversation_id, base, base + len(rows))
+            ).fetchall()
+        return base, self._entries([row[1:] for row in rows], att_rows)
+
+    @staticmethod
+    def _entries(rows: List[Tuple[Any, ...]], att_rows: List[Tuple[Any, ...]]) -> List[Dict[str, Any]]:
+        attachments: Dict[int, List[Dict[str, Any]]] = {}
+        for message_id, *values in att_rows:
+            att = {key: value for key, value in zip(_ATTACHMENT_KEYS, values) if value is not None}
+            attachments.setdefault(message_id, []).append(att)
+        history: List[Dict[str, Any]] = []
+        for message_id, role, content, timestamp, extra in rows:
+            entry: Dict[str, Any] = {}
+            if extra:
+                try:
+                    entry.update(json.loads(extra))
+                except ValueError:
+                    pass
+            entry.update(
+                {
+                    "role": role,
+                    "content": content,
+                    "attachments": attachments.get(message_id, []),
+                    "timestamp": timestamp,
+                }
+            )
+            history.append(entry)
+        return history
+
+    def _insert_locked(self, index: int, message: Dict[str, Any]) -> int:
+        content = str(message.get("content") or "")
+        extra = {key: value for key, value in message.items() if key not in _CORE_KEYS}
+        # Plain DELETE (not INSERT OR REPLACE) so the FTS and cascade triggers fire.
+        self._conn.execute(_SQL_DELETE_POSITION, (self.conversation_id, int(index)))
+        cur = self._conn.execute(
+            _SQL_INSERT_MESSAGE,
+            (
+                self.conversation_id,
+                int(index),
+                str(message.get("role") or "user"),
+                content,
+                message.get("timestamp"),
+                json.dumps(extra, ensure_ascii=False) if extra else None,
+            ),
+        )
+        message_id = cur.lastrowid
+        for att in message.get("attachments") or []:
+            self._conn.execute(
+                _SQL_INSERT_ATTACHMENT,
+                (message_id, *(att.get(key) for key in _ATTACHMENT_KEYS)),
+            )
+        return len(content.encode("utf-8"))
+
+    def append(self, index: int, message: Dict[str, Any]) -> None:
+        with self._lock, self._conn:
+            size = self._insert_locked(index, message)
+            self._conn.execute(
+                _SQL_BUMP_CONVERSATION,
+                (int(index) + 1, message.get("timestamp"), size, self.conversation_id),
+            )
+
+    def extend(self, start: int, messages: List[Dict[str, Any]]) -> None:
+        """Append a batch of messages at positions ``start..`` in one transaction."""
+
+        if not messages:
+            return
+        with self._lock, self._conn:
+            total = 0
+            last_ts = None
+            for offset, message in enumerate(messages):
+                total += self._insert_locked(start + offset, message)
+                last_ts = message.get("timestamp") or last_ts
+            self._conn.execute(
+                _SQL_BUMP_CONVERSATION, (start + len(messages), last_ts, total, self.conversation_id)
+            )
+
+    def rewrite(self, history: List[Dict[str, Any]], reset: bool = False) -> None:
+        # Materialize first: ``history`` may be a LazyHistory reading this very table.
+        history = list(history)
+        with self._lock, self._conn:
+            self._conn.execute(_SQL_DELETE_MESSAGES, (self.conversation_id,))
+            self._conn.execute(_SQL_RESET_CONVERSATION, (self.conversation_id,))
+            total = 0
+            last_ts = None
+            for index, message in enumerate(history):
+                total += self._insert_locked(index, message)
+                last_ts = message.get("timestamp") or last_ts
+            self._conn.execute(
+                _SQL_BUMP_CONVERSATION, (len(history), last_ts, total, self.conversation_id)
+            )
+
+    def discard(self) -> None:
+        """Delete this conversation and its messages, then close the connection."""
+
+        with self._lock:
+            with self._conn:
+                self._conn.execute(_SQL_DELETE_MESSAGES, (self.conversation_id,))
+                self._conn.execute(_SQL_DELETE_CONVERSATION, (self.conversation_id,))
+            self._conn.close()
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    # --- Queries ---
+    def stats(self) -> Tuple[int, Optional[str]]:
+        """Return (message count, last timestamp) without touching the messages table."""
+
+        with self._lock:
+            row = self._conn.execute(_SQL_STATS, (self.conversation_id,)).fetchone()
+        if not row:
+            return 0, None
+        return int(row[0] or 0), row[1]
+
+    def rows(self, start: int = 0, limit: int = -1, snippet_chars: int = 60) -> List[Tuple[int, Optional[str], str, str]]:
+        """Return (position, timestamp, role, content prefix) rows for list views."""
+
+        with self._lock:
+            return self._conn.execute(
+                _SQL_ROWS, (int(snippet_chars), self.conversation_id, int(start), int(limit))
+            ).fetchall()
+
+    def search(self, text: str, limit: int = 100) -> List[Tuple[int, Optional[str], str, str]]:
+        """Full-text search; returns (position, timestamp, role, snippet), best first."""
+
+        if not str(text or "").strip():
+            return []
+        with self._lock:
+            if self.fts_enabled:
+                query = fts_query(text)
+                if not query:
+                    return []
+                try:
+                    return self._conn.execute(
+                        _SQL_SEARCH_FTS, (query, self.conversation_id, int(limit))
+                    ).fetchall()
+                except sqlite3.OperationalError:
+                    pass
+            pattern = "%" + text.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            return self._conn.execute(
+                _SQL_SEARCH_LIKE, (self.conversation_id, pattern, int(limit))
+            ).fetchall()
+
+
+class LazyHistory:
+    """List-like conversation history whose older part stays in SQLite.
+
+    Only the newest ``page_size`` messages are read when it is created;
+    positions before :attr:`base` are fetched with range queries and kept in
+    a small LRU page cache, new messages are appended to the in-memory
+    :attr:`tail`. Supports what the app does with a history list: ``len``,
+    indexing and slicing, iteration in both directions and ``append``.
+    """
+
+    def __init__(self, store: SQLiteHistoryStore, page_size: int = 50, cache_pages: int = 8) -> None:
+        self.store = store
+        self.page_size = max(1, int(page_size))
+        self.cache_pages = max(1, int(cache_pages))
+        self.base, self.tail = store.load_tail(self.page_size)
+        self._pages: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()  # the payload builder reads from a worker thread
+
+    def snapshot(self) -> "LazyHistory":
+        """Copy sharing the store, with its own tail list (for the writer thread)."""
+
+        copy = LazyHistory.__new__(LazyHistory)
+        copy.store = self.store
+        copy.page_size = self.page_size
+        copy.cache_pages = self.cache_pages
+        copy.base = self.base
+        copy.tail = list(self.tail)
+        copy._pages = OrderedDict()
+        copy._lock = threading.Lock()
+        return copy
+
+    def __len__(self) -> int:
+        return self.base + len(self.tail)
+
+    def append(self, message: Dict[str, Any]) -> None:
+        self.tail.append(message)
+
+    def _page(self, number: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            page = self._pages.get(number)
+            if page is not None:
+                self._pages.move_to_end(number)
+                return page
+        start = number * self.page_size
+        page = self.store.load_range(start, min(self.base, start + self.page_size))
+        with self._lock:
+            self._pages[number] = page
+            while len(self._pages) > self.cache_pages:
+                self._pages.popitem(last=False)
+        return page
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if stop <= start:
+                return []
+            older = self.store.load_range(start, min(stop, self.base)) if start < self.base else []
+            return older + self.tail[max(0, start - self.base) : max(0, stop - self.base)]
+        index = int(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        if index >= self.base:
+            return self.tail[index - self.base]
+        number, offset = divmod(index, self.page_size)
+        return self._page(number)[offset]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for number in range((self.base + self.page_size - 1) // self.page_size):
+            yield from self._page(number)
+        yield from list(self.tail)
+
+    def __reversed__(self) -> Iterator[Dict[str, Any]]:
+        yield from reversed(list(self.tail))
+        for number in range((self.base + self.page_size - 1) // self.page_size - 1, -1, -1):
+            yield from reversed(self._page(number))
+
+
+__all__ = [
+    "DEFAULT_CONVERSATION_ID",
+    "LazyHistory",
+    "SQLiteHistoryStore",
+    "fts_query",
+    "iter_timing_entries",
+    "referenced_blob_ids",
+    "stored_conversation_ids",
+]
@@ -0,0 +1,260 @@
+"""Append-only history journal with snapshot compaction.
+
+``history.json`` stays a plain JSON list (the snapshot). Every new message is
+appended to ``history.jsonl`` as one line ``{"i": index, "m": message}`` with
+a single ``write`` + ``fsync``. Loading reads the snapshot and replays the
+journal; records whose index is already covered by the snapshot are skipped,
+so a crash between writing the snapshot and trimming the journal is harmless.
+A torn last line from a crash mid-append is dropped and cut off the file.
+A snapshot that does not parse is never compacted over: :meth:`load` moves it
+and its journal aside (``history.json.corrupt``) and reports them in
+:attr:`HistoryJournal.quarantined`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Final, Iterator, List, Optional
+
+from history_transfer import iter_json_array
+
+
+DEFAULT_COMPACT_RECORDS: Final[int] = 200
+DEFAULT_COMPACT_BYTES: Final[int] = 4 * 1024 * 1024
+CORRUPT_SUFFIX: Final[str] = ".corrupt"
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """Write ``data`` to a temp file, fsync it and atomically replace ``path``."""
+
+    directory = os.path.dirname(os.path.abspath(path)) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=os.path.basename(path), dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class HistoryJournal:
+    """Snapshot + append-only journal for the chat history list."""
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        journal_path: Optional[str] = None,
+        compact_records: int = DEFAULT_COMPACT_RECORDS,
+        compact_bytes: int = DEFAULT_COMPACT_BYTES,
+    ) -> None:
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".jsonl"
+        self.compact_records = compact_records
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        # Serializes snapshot rewrites (compaction runs on the writer thread via HistorySync).
+        self._snapshot_lock = threading.Lock()
+        self._journal_records = 0
+        self._journal_bytes = 0
+        self.quarantined: List[str] = []  # files moved aside by the last load()
+
+    # --- Loading ---
+    def _read_snapshot(self) -> Optional[List[Dict[str, Any]]]:
+        """The snapshot list; ``None`` if the file exists but does not parse."""
+
+        if not os.path.exists(self.snapshot_path):
+            return []
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except OSError:
+            return []
+        except ValueError:
+            return None
+        return data if isinstance(data, list) else None
+
+    def _quarantine(self) -> List[str]:
+        """Move the snapshot and journal aside under one free ``.corrupt`` suffix."""
+
+        paths = [path for path in (self.snapshot_path, self.journal_path) if os.path.exists(path)]
+        suffix, n = CORRUPT_SUFFIX, 0
+        while any(os.path.exists(path + suffix) for path in paths):
+            n += 1
+            suffix = f"{CORRUPT_SUFFIX}.{n}"
+        moved = []
+        for path in paths:
+            os.replace(path, path + suffix)
+            moved.append(path + suffix)
+        return moved
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Return the full history; repairs a torn trailing journal line.
+
+        An unparsable snapshot is moved aside together with the journal (whose
+        indices continue it) and the history starts empty; the moved files are
+        listed in :attr:`quarantined`. Compacting over them would lose them.
+        """
+
+        history = self._read_snapshot()
+        with self._lock:
+            self.quarantined = []
+            if history is None:
+                self.quarantined = self._quarantine()
+                history = []
+            self._journal_records = 0
+            self._journal_bytes = 0
+            if not os.path.exists(self.journal_path):
+                return history
+            valid_end = 0
+            with open(self.journal_path, "rb") as fh:
+                for raw in fh:
+                    if not raw.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(raw.decode("utf-8"))
+                        index = int(record["i"])
+                        message = record["m"]
+                    except Exception:
+                        break
+                    valid_end += len(raw)
+                    self._journal_records += 1
+                    if index < len(history):
+                        continue
+                    if index == len(history) and isinstance(message, dict):
+                        history.append(message)
+            self._journal_bytes = valid_end
+            if valid_end < os.path.getsize(self.journal_path):
+                with open(self.journal_path, "r+b") as fh:
+                    fh.truncate(valid_end)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+        return history
+
+    def iter_messages(self, strict: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield the history like :meth:`load` without holding it in memory.
+
+        The snapshot array is parsed element by element and the journal is
+        replayed line by line. Read-only: a torn last line is skipped, not
+        repaired. Meant for conversations nobody is writing to (exports).
+        With ``strict`` an unreadable snapshot raises instead of being skipped.
+        """
+
+        count = 0
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "rb") as fh:
+                    for message in iter_json_array(fh):
+                        count += 1
+                        yield message
+            except (OSError, ValueError):
+                if strict:
+                    raise
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "rb") as fh:
+            for raw in fh:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(raw.decode("utf-8"))
+                    index = int(record["i"])
+                    message = record["m"]
+                except Exception:
+                    break
+                if index == count and isinstance(message, dict):
+                    count += 1
+                    yield message
+
+    # --- Writing ---
+    def append(self, index: int, message: Dict[str, Any]) -> None:
+        """Durably append one message that sits at position ``index``."""
+
+        self.extend(index, [message])
+
+    def extend(self, start: int, messages: List[Dict[str, Any]]) -> None:
+        """Append a batch of messages at positions ``start..`` with one write + fsync."""
+
+        if not messages:
+            return
+        data = "".join(
+            json.dumps({"i": int(start) + offset, "m": message}, ensure_ascii=False) + "\n"
+            for offset, message in enumerate(messages)
+        ).encode("utf-8")
+        with self._lock:
+            fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view) :]
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            self._journal_records += len(messages)
+            self._journal_bytes += len(data)
+
+    def needs_compaction(self) -> bool:
+        return self._journal_records >= self.compact_records or self._journal_bytes >= self.compact_bytes
+
+    def rewrite(self, history: List[Dict[str, Any]], reset: bool = False) -> None:
+        """Write ``history`` as the new snapshot.
+
+        Journal records covered by the snapshot are dropped; with ``reset``
+        (history was cleared or replaced) the whole journal is discarded.
+        """
+
+        with self._snapshot_lock:
+            self._write_snapshot_locked(history, reset)
+
+    def _write_snapshot_locked(self, history: List[Dict[str, Any]], reset: bool) -> None:
+        data = json.dumps(history, ensure_ascii=False).encode("utf-8")
+        if reset:
+            # Drop the journal first: a crash in between leaves the old
+            # snapshot intact instead of replaying old records onto the new one.
+            with self._lock:
+                if os.path.exists(self.journal_path):
+                    os.remove(self.journal_path)
+                self._journal_records = 0
+                self._journal_bytes = 0
+            atomic_write_bytes(self.snapshot_path, data)
+            return
+        atomic_write_bytes(self.snapshot_path, data)
+        covered = len(history)
+        with self._lock:
+            kept: List[bytes] = []
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "rb") as fh:
+                    for raw in fh:
+                        try:
+                            if raw.endswith(b"\n") and int(json.loads(raw)["i"]) >= covered:
+                                kept.append(raw)
+                        except Exception:
+                            continue
+            if kept:
+                atomic_write_bytes(self.journal_path, b"".join(kept))
+            elif os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._journal_records = len(kept)
+            self._journal_bytes = sum(len(raw) for raw in kept)
+
+    def discard(self) -> None:
+        """Delete the snapshot and journal files (conversation removed)."""
+
+        with self._snapshot_lock:
+            with self._lock:
+                for path in (self.journal_path, self.snapshot_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._journal_records = 0
+                self._journal_bytes = 0
+
+
+__all__ = ["CORRUPT_SUFFIX", "HistoryJournal", "atomic_write_bytes", "DEFAULT_COMPACT_BYTES", "DEFAULT_COMPACT_RECORDS"]
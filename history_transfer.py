@@ -0,0 +1,383 @@
+"""Streaming export and import of conversation histories.
+
+Exporters are generators of text chunks over any iterable of messages (a
+history store's :meth:`iter_messages`, an archive's :func:`archive.iter_archive`),
+so the whole conversation is never formatted into one string. The importer
+reads JSON arrays incrementally with :meth:`json.JSONDecoder.raw_decode` over
+a bounded buffer, which handles multi-hundred-megabyte third-party exports
+(for example ChatGPT's ``conversations.json``) as well as JSON Lines written
+by :func:`write_export`. Messages are yielded in batches for the caller to
+write.
+"""
+
+from __future__ import annotations
+
+import codecs
+import html
+import json
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, Final, Iterable, Iterator, List, Optional, Tuple
+
+from attachment_utils import format_byte_count
+
+
+EXPORT_FORMATS: Final[Tuple[str, ...]] = ("jsonl", "md", "html")
+TIMESTAMP_FORMAT: Final[str] = "%d.%m.%Y %H:%M:%S"
+READ_CHUNK_BYTES: Final[int] = 1 << 20
+IMPORT_BATCH_MESSAGES: Final[int] = 500
+
+_EXTENSIONS: Final[Dict[str, str]] = {
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".md": "md",
+    ".markdown": "md",
+    ".html": "html",
+    ".htm": "html",
+}
+_ROLE_LABELS: Final[Dict[str, str]] = {"user": "Sinä", "assistant": "JugiAI", "system": "Järjestelmä"}
+_WS_RE: Final = re.compile(r"[ \t\r\n]*")
+
+# (conversation ordinal, title, messages) — consecutive batches with the same
+# ordinal belong to the same conversation.
+ImportBatch = Tuple[int, str, List[Dict[str, Any]]]
+
+
+def export_format_for_path(path: str) -> str:
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), "jsonl")
+
+
+def _role_label(role: str) -> str:
+    return _ROLE_LABELS.get(role, role or "?")
+
+
+def _attachment_names(message: Dict[str, Any]) -> List[str]:
+    return [str(att.get("name") or "liite") for att in message.get("attachments") or [] if isinstance(att, dict)]
+
+
+# --- Exporters ---
+def iter_jsonl(messages: Iterable[Dict[str, Any]], title: str = "") -> Iterator[str]:
+    for message in messages:
+        yield json.dumps(message, ensure_ascii=False) + "\n"
+
+
+def iter_markdown(messages: Iterable[Dict[str, Any]], title: str = "") -> Iterator[str]:
+    if title:
+        yield f"# {title}\n\n"
+    for message in messages:
+        stamp = message.get("timestamp")
+        yield f"### {_role_label(str(message.get('role') or ''))}" + (f" · {stamp}" if stamp else "") + "\n\n"
+        yield str(message.get("content") or "").rstrip() + "\n\n"
+        names = _attachment_names(message)
+        if names:
+            yield "".join(f"- 📎 {name}\n" for name in names) + "\n"
+
+
+_HTML_HEAD: Final[str] = (
+    "<!DOCTYPE html>\n<html lang=\"fi\">\n<head>\n<meta charset=\"utf-8\">\n<title>{title}</title>\n"
+    "<style>body{{font-family:sans-serif;max-width:52em;margin:2em auto;background:#030b1f;color:#e2f7ff}}"
+    "section{{margin:1em 0;padding:.8em 1em;border-radius:8px;background:#0b1730}}"
+    "section.user{{background:#10264a}}h3{{margin:0 0 .4em;font-size:.9em;color:#7dd3fc}}"
+    "pre{{white-space:pre-wrap;font-family:inherit;margin:0}}</style>\n</head>\n<body>\n"
+)
+
+
+def iter_html(messages: Iterable[Dict[str, Any]], title: str = "") -> Iterator[str]:
+    yield _HTML_HEAD.format(title=html.escape(title or "JugiAI"))
+    if title:
+        yield f"<h1>{html.escape(title)}</h1>\n"
+    for message in messages:
+        role = str(message.get("role") or "")
+        stamp = message.get("timestamp")
+        heading = html.escape(_role_label(role) + (f" · {stamp}" if stamp else ""))
+        parts = [
+            f"<section class=\"{html.escape(role)}\">\n<h3>{heading}</h3>\n",
+            f"<pre>{html.escape(str(message.get('content') or ''))}</pre>\n",
+        ]
+        parts.extend(f"<p>📎 {html.escape(name)}</p>\n" for name in _attachment_names(message))
+        parts.append("</section>\n")
+        yield "".join(parts)
+    yield "</body>\n</html>\n"
+
+
+_EXPORTERS: Final[Dict[str, Callable[[Iterable[Dict[str, Any]], str], Iterator[str]]]] = {
+    "jsonl": iter_jsonl,
+    "md": iter_markdown,
+    "html": iter_html,
+}
+
+
+def write_export(
+    messages: Iterable[Dict[str, Any]],
+    path: str,
+    fmt: Optional[str] = None,
+    title: str = "",
+) -> Dict[str, Any]:
+    """Stream ``messages`` into ``path`` (atomic replace).
+
+    Returns ``{"messages", "bytes", "seconds"}``.
+    """
+
+    fmt = fmt if fmt in _EXPORTERS else export_format_for_path(path)
+    started = time.perf_counter()
+    count = 0
+
+    def _counted() -> Iterator[Dict[str, Any]]:
+        nonlocal count
+        for message in messages:
+            count += 1
+            yield message
+
+    directory = os.path.dirname(os.path.abspath(path)) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=os.path.basename(path), dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as fh:
+            for chunk in _EXPORTERS[fmt](_counted(), title):
+                fh.write(chunk)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return {"messages": count, "bytes": os.path.getsize(path), "seconds": time.perf_counter() - started}
+
+
+# --- Incremental JSON reading ---
+class _JsonStream:
+    """Character buffer over a binary file that only keeps unparsed text."""
+
+    def __init__(self, fh: BinaryIO, chunk_size: int, on_read: Optional[Callable[[int], None]]) -> None:
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.on_read = on_read
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size: Optional[int] = None) -> bool:
+        """Read more input; ``False`` at end of file."""
+
+        if self.eof:
+            return False
+        raw = self.fh.read(size or self.chunk_size)
+        if self.on_read is not None:
+            self.on_read(len(raw))
+        self.eof = not raw
+        self.buf = self.buf[self.pos :] + self.decoder.decode(raw, final=self.eof)
+        self.pos = 0
+        return not self.eof
+
+    def peek(self) -> str:
+        """Next non-whitespace character ("" at end of input)."""
+
+        while True:
+            self.pos = _WS_RE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+
+def iter_json_array(
+    fh: BinaryIO,
+    chunk_size: int = READ_CHUNK_BYTES,
+    on_read: Optional[Callable[[int], None]] = None,
+) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array without loading the file."""
+
+    stream = _JsonStream(fh, chunk_size, on_read)
+    decoder = json.JSONDecoder()
+    if stream.peek() != "[":
+        raise ValueError("JSON-taulukkoa ei löytynyt")
+    stream.pos += 1
+    if stream.peek() == "]":
+        return
+    while True:
+        stream.peek()
+        read_size = chunk_size
+        while True:
+            try:
+                value, end = decoder.raw_decode(stream.buf, stream.pos)
+                # A value ending exactly at the buffer edge may be cut short.
+                if end < len(stream.buf) or stream.eof:
+                    break
+            except ValueError:
+                if stream.eof:
+                    raise
+            # Grow the read size so one huge element is not re-parsed per chunk.
+            stream.fill(read_size)
+            read_size *= 2
+        stream.pos = end
+        yield value
+        separator = stream.peek()
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Odottamaton merkki JSON-taulukossa: {separator!r}")
+        stream.pos += 1
+
+
+def iter_json_lines(fh: BinaryIO, on_read: Optional[Callable[[int], None]] = None) -> Iterator[Any]:
+    for number, raw in enumerate(fh, 1):
+        if on_read is not None:
+            on_read(len(raw))
+        line = raw.decode("utf-8-sig" if number == 1 else "utf-8").strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Rivi {number}: virheellinen JSON ({e})") from None
+
+
+# --- Import normalisation ---
+def _format_epoch(value: Any) -> Optional[str]:
+    try:
+        return datetime.fromtimestamp(float(value)).strftime(TIMESTAMP_FORMAT)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def _message_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict):
+        if isinstance(content.get("parts"), list):
+            return "\n".join(part for part in content["parts"] if isinstance(part, str))
+        return str(content.get("text") or "")
+    if isinstance(content, list):
+        # OpenAI-style content blocks.
+        return "\n".join(
+            str(block.get("text") or "") if isinstance(block, dict) else str(block) for block in content
+        )
+    return ""
+
+
+def normalize_message(raw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return a history entry for a message dict, or ``None`` to skip it."""
+
+    role = raw.get("role")
+    if role is None and isinstance(raw.get("author"), dict):
+        role = raw["author"].get("role")
+    if role not in ("user", "assistant", "system"):
+        return None
+    text = _message_text(raw.get("content"))
+    if not text.strip():
+        return None
+    timestamp = raw.get("timestamp")
+    if not isinstance(timestamp, str):
+        timestamp = _format_epoch(raw.get("create_time") if timestamp is None else timestamp)
+    attachments = raw.get("attachments") if isinstance(raw.get("attachments"), list) else []
+    return {"role": role, "content": text, "attachments": attachments, "timestamp": timestamp}
+
+
+def chatgpt_messages(conversation: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Messages of one ChatGPT export conversation along its current branch."""
+
+    mapping = conversation.get("mapping") or {}
+    node_id = conversation.get("current_node")
+    if node_id not in mapping:
+        # No current node: follow the last leaf of the tree.
+        leaves = [key for key, node in mapping.items() if not (node or {}).get("children")]
+        node_id = leaves[-1] if leaves else None
+    chain: List[Dict[str, Any]] = []
+    seen = set()
+    while node_id in mapping and node_id not in seen:
+        seen.add(node_id)
+        node = mapping[node_id] or {}
+        if isinstance(node.get("message"), dict):
+            chain.append(node["message"])
+        node_id = node.get("parent")
+    chain.reverse()
+    return [entry for entry in (normalize_message(message) for message in chain) if entry is not None]
+
+
+def _conversation_parts(item: Any) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    if not isinstance(item, dict):
+        return None
+    if isinstance(item.get("mapping"), dict):
+        return str(item.get("title") or ""), chatgpt_messages(item)
+    if isinstance(item.get("messages"), list):
+        messages = [normalize_message(m) for m in item["messages"] if isinstance(m, dict)]
+        return str(item.get("title") or ""), [m for m in messages if m is not None]
+    return None
+
+
+def iter_import(
+    path: str,
+    batch_size: int = IMPORT_BATCH_MESSAGES,
+    on_read: Optional[Callable[[int], None]] = None,
+) -> Iterator[ImportBatch]:
+    """Yield ``(ordinal, title, messages)`` batches from an export file.
+
+    Accepts a JSON array of conversations (ChatGPT ``conversations.json`` or
+    ``{"title", "messages"}`` objects), a JSON array of messages, or JSON Lines
+    of either. Loose messages are collected into one conversation named after
+    the file.
+    """
+
+    default_title = os.path.splitext(os.path.basename(path))[0]
+    if default_title.endswith(".jsonl"):
+        default_title = default_title[: -len(".jsonl")]
+    with open(path, "rb") as fh:
+        head = fh.read(4).lstrip(codecs.BOM_UTF8).lstrip()
+        fh.seek(0)
+        items = iter_json_array(fh, on_read=on_read) if head.startswith(b"[") else iter_json_lines(fh, on_read)
+        ordinal = -1
+        loose_ordinal: Optional[int] = None
+        loose: List[Dict[str, Any]] = []
+        for item in items:
+            parts = _conversation_parts(item)
+            if parts is not None:
+                title, messages = parts
+                if not messages:
+                    continue
+                ordinal += 1
+                for offset in range(0, len(messages), batch_size):
+                    yield ordinal, title or default_title, messages[offset : offset + batch_size]
+                continue
+            message = normalize_message(item) if isinstance(item, dict) else None
+            if message is None:
+                continue
+            if loose_ordinal is None:
+                ordinal += 1
+                loose_ordinal = ordinal
+            loose.append(message)
+            if len(loose) >= batch_size:
+                yield loose_ordinal, default_title, loose
+                loose = []
+        if loose and loose_ordinal is not None:
+            yield loose_ordinal, default_title, loose
+
+
+def format_throughput(messages: int, byte_count: int, seconds: float) -> str:
+    seconds = max(seconds, 1e-6)
+    return (
+        f"{messages} viestiä · {format_byte_count(byte_count)} · "
+        f"{format_byte_count(int(byte_count / seconds))}/s · {messages / seconds:.0f} viestiä/s"
+    )
+
+
+__all__ = [
+    "EXPORT_FORMATS",
+    "IMPORT_BATCH_MESSAGES",
+    "ImportBatch",
+    "chatgpt_messages",
+    "export_format_for_path",
+    "format_throughput",
+    "iter_html",
+    "iter_import",
+    "iter_json_array",
+    "iter_json_lines",
+    "iter_jsonl",
+    "iter_markdown",
+    "normalize_message",
+    "write_export",
+]
@@ -0,0 +1,113 @@
+"""Windowed rendering bookkeeping for the chat transcript."""
+
+from __future__ import annotations
+
+from typing import Final, Tuple
+
+
+DEFAULT_RENDER_WINDOW: Final[int] = 50
+MIN_RENDER_WINDOW: Final[int] = 5
+DEFAULT_SCROLLBACK: Final[int] = 200
+
+
+def normalize_render_window(value: object) -> int:
+    """Return a sane page size from a config value."""
+
+    try:
+        size = int(value)  # type: ignore[arg-type]
+    except Exception:
+        return DEFAULT_RENDER_WINDOW
+    return max(MIN_RENDER_WINDOW, size)
+
+
+def normalize_scrollback(value: object, page_size: int) -> int:
+    """Scrollback capacity in messages; at least two pages so paging never thrashes."""
+
+    try:
+        size = int(value)  # type: ignore[arg-type]
+    except Exception:
+        size = DEFAULT_SCROLLBACK
+    return max(2 * page_size, size)
+
+
+class HistoryRenderWindow:
+    """Tracks which slice of the history is rendered in the chat widget.
+
+    Messages ``start`` .. ``end - 1`` are on screen. Scrolling to the top
+    claims an older page (:meth:`next_older`), scrolling to the bottom a newer
+    one (:meth:`next_newer`); whenever more than ``capacity`` messages are
+    rendered, the far end is paged out again (:meth:`trim_front` /
+    :meth:`trim_back`), so the widget never holds more than the scrollback.
+    """
+
+    def __init__(self, page_size: int = DEFAULT_RENDER_WINDOW, capacity: int = DEFAULT_SCROLLBACK) -> None:
+        self.page_size = normalize_render_window(page_size)
+        self.capacity = normalize_scrollback(capacity, self.page_size)
+        self.start = 0
+        self.end = 0
+
+    def reset(self, total: int) -> Tuple[int, int]:
+        """Start over with ``total`` messages; return the initial (start, end) range."""
+
+        self.end = int(total)
+        self.start = max(0, self.end - self.page_size)
+        return self.start, self.end
+
+    @property
+    def has_older(self) -> bool:
+        return self.start > 0
+
+    def has_newer(self, total: int) -> bool:
+        return self.end < total
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+    def next_older(self) -> Tuple[int, int]:
+        """Claim the next older page; returns an empty range when done."""
+
+        end = self.start
+        self.start = max(0, end - self.page_size)
+        return self.start, end
+
+    def next_newer(self, total: int) -> Tuple[int, int]:
+        """Claim the next newer page; returns an empty range when at the tail."""
+
+        start = self.end
+        self.end = min(int(total), start + self.page_size)
+        return start, self.end
+
+    def appended(self, index: int) -> bool:
+        """Record message ``index`` rendered at the bottom; ``False`` if it is not adjacent."""
+
+        if index != self.end:
+            return False
+        self.end += 1
+        return True
+
+    def trim_front(self) -> Tuple[int, int]:
+        """Range of the oldest rendered messages to page out (empty when within capacity)."""
+
+        drop = max(0, self.size - self.capacity)
+        start = self.start
+        self.start += drop
+        return start, self.start
+
+    def trim_back(self) -> Tuple[int, int]:
+        """Range of the newest rendered messages to page out (empty when within capacity)."""
+
+        drop = max(0, self.size - self.capacity)
+        end = self.end
+        self.end -= drop
+        return self.end, end
+
+
+__all__ = [
+    "DEFAULT_RENDER_WINDOW",
+    "DEFAULT_SCROLLBACK",
+    "HistoryRenderWindow",
+    "MIN_RENDER_WINDOW",
+    "normalize_render_window",
+    "normalize_scrollback",
+]
@@ -0,0 +1,229 @@
+"""Shared, versioned image handles for the Tk UI.
+
+Decoding and scaling a PNG is far more expensive than embedding an existing
+``PhotoImage`` again, so images that appear many times (the logo in front of
+every assistant message) are decoded once and shared. A handle is rebuilt
+only when its key — path, file modification time and target size — changes.
+
+:class:`ImageDecodeService` moves the decoding itself off the Tk thread: one
+worker decodes and resizes with Pillow and hands the finished pixel buffer
+back (through the UI dispatcher), where only the cheap ``PhotoImage``
+creation is left. Decodes are cached by the same key, so the window icon,
+the message logo and the watermark all start from one decode of the logo.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Final, Optional, Tuple
+
+try:  # Optional: Pillow does the off-thread decoding
+    from PIL import Image
+
+    PIL_AVAILABLE = True
+except Exception:  # pragma: no cover - depends on the environment
+    Image = None  # type: ignore[assignment]
+    PIL_AVAILABLE = False
+
+
+ImageKey = Tuple[str, float, int]
+Deliver = Callable[..., None]
+ErrorHandler = Callable[[str, BaseException], None]
+
+DEFAULT_DECODE_CACHE_ENTRIES: Final[int] = 16
+
+_UNSET: Final = object()
+
+
+def image_key(path: str, size: int) -> ImageKey:
+    """Cache key for ``path`` scaled to ``size`` px; a missing file has mtime 0."""
+
+    try:
+        mtime = os.path.getmtime(path) if path else 0.0
+    except OSError:
+        mtime = 0.0
+    return (path, mtime, int(size))
+
+
+class SharedImage:
+    """One image reused everywhere, re-decoded only when its key changes.
+
+    ``decode(path, size)`` returns a decoded image or ``None``;
+    ``install(decoded)`` turns it into the shared handle (for Tk: copies it
+    into a single ``PhotoImage`` so already embedded copies update too) and
+    returns the handle or ``None`` on failure. Failures are remembered per
+    key, so a broken file is not retried for every use.
+
+    With ``deferred=True`` the decode runs elsewhere: ``decode(path, size,
+    done)`` starts it and returns the handle to use until then (e.g. a blank
+    ``PhotoImage`` of the right size), and ``done(decoded)`` — called on the
+    UI thread — installs the result. Results for a superseded key are dropped.
+    """
+
+    def __init__(
+        self,
+        decode: Callable[..., Optional[Any]],
+        install: Callable[[Any], Optional[Any]],
+        deferred: bool = False,
+    ) -> None:
+        self._decode = decode
+        self._install = install
+        self._deferred = deferred
+        self._key: Any = _UNSET
+        self._image: Optional[Any] = None
+        self.decodes = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._key is not _UNSET
+
+    def get(self, path: str, size: int) -> Optional[Any]:
+        key = image_key(path, size)
+        if key != self._key:
+            self._key = key
+            self._image = None
+            if path:
+                self.decodes += 1
+                if self._deferred:
+                    self._image = self._decode(path, key[2], lambda decoded: self._deliver(key, decoded))
+                else:
+                    decoded = self._decode(path, key[2])
+                    if decoded is not None:
+                        self._image = self._install(decoded)
+        return self._image
+
+    def _deliver(self, key: ImageKey, decoded: Optional[Any]) -> None:
+        if key != self._key:
+            return
+        self._image = self._install(decoded) if decoded is not None else None
+
+
+def decode_image(path: str) -> Any:
+    """Decode ``path`` fully into an RGBA Pillow image — needs Pillow."""
+
+    with Image.open(path) as img:
+        return img.convert("RGBA")
+
+
+def fit_image(image: Any, size: int) -> Any:
+    """Copy of ``image`` shrunk to fit ``size`` x ``size`` (never enlarged)."""
+
+    fitted = image.copy()
+    fitted.thumbnail((size, size), Image.Resampling.LANCZOS)
+    return fitted
+
+
+class ImageDecodeService:
+    """Pillow decodes on one worker thread, cached by path, mtime and size.
+
+    ``size`` 0 is the full image; any other size is derived from the cached
+    full decode, so a file is read once however many sizes are needed.
+    :meth:`request` calls ``deliver(callback, image)`` when done — pass the UI
+    dispatcher's ``post`` so callbacks run on the Tk thread. ``image`` is
+    ``None`` if the file could not be decoded (remembered until it changes).
+    :meth:`load` is the same lookup done synchronously on the calling thread.
+    """
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        on_error: Optional[ErrorHandler] = None,
+        max_entries: int = DEFAULT_DECODE_CACHE_ENTRIES,
+        decode: Callable[[str], Any] = decode_image,
+        name: str = "image-decoder",
+    ) -> None:
+        self.deliver = deliver
+        self.on_error = on_error
+        self.max_entries = max(1, int(max_entries))
+        self._decode = decode
+        self._name = name
+        self._cache: "OrderedDict[ImageKey, Optional[Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Tuple[str, int, Callable[..., Any], Optional[Callable[[Any], Any]]]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.decodes = 0
+        self.hits = 0
+
+    def load(self, path: str, size: int = 0) -> Optional[Any]:
+        """Decode (or reuse) ``path`` at ``size`` on the calling thread."""
+
+        key = image_key(path, size)
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        image: Optional[Any] = None
+        try:
+            if key[2] > 0:
+                full = self.load(path, 0)
+                image = fit_image(full, key[2]) if full is not None else None
+            else:
+                self.decodes += 1
+                image = self._decode(path)
+        except Exception as exc:
+            self._report(path, exc)
+        with self._lock:
+            self._cache[key] = image
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return image
+
+    def request(
+        self,
+        path: str,
+        size: int,
+        callback: Callable[[Optional[Any]], Any],
+        prepare: Optional[Callable[[Any], Any]] = None,
+    ) -> None:
+        """Decode on the worker, run ``prepare(image)`` there too, then deliver the result."""
+
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+        self._queue.put((path, size, callback, prepare))
+
+    def close(self) -> None:
+        self._queue.put(None)
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            path, size, callback, prepare = job
+            result = self.load(path, size)
+            if result is not None and prepare is not None:
+                try:
+                    result = prepare(result)
+                except Exception as exc:
+                    self._report(path, exc)
+                    result = None
+            try:
+                self.deliver(callback, result)
+            except Exception as exc:  # e.g. the dispatcher is already stopped
+                self._report(path, exc)
+
+    def _report(self, path: str, exc: BaseException) -> None:
+        if self.on_error is not None:
+            try:
+                self.on_error(path, exc)
+            except Exception:
+                pass
+
+
+__all__ = [
+    "DEFAULT_DECODE_CACHE_ENTRIES",
+    "ImageDecodeService",
+    "ImageKey",
+    "PIL_AVAILABLE",
+    "SharedImage",
+    "decode_image",
+    "fit_image",
+    "image_key",
+]
@@ -13,11 +13,11 @@ Riippuvuudet: Vain Python 3:n standardikirjastot (tkinter, json, urllib). Ei vaa
 # Windows-native AI. Zero friction, full acceleration.
 from __future__ import annotations
 
-import base64
 import json
 import math
 import mimetypes
 import os
+import queue
 import sys
 import subprocess
 import threading
@@ -27,19 +27,82 @@ import traceback
 from datetime import datetime
 from tkinter import filedialog, messagebox, simpledialog, ttk
 from tkinter.scrolledtext import ScrolledText
-from typing import Any, Dict, Generator, List, Optional
+from typing import Any, Callable, Dict, Generator, Iterator, List, Optional, Set, Tuple
 
 import importlib.metadata
 import importlib.util
 import shutil
 import urllib.error
+import urllib.parse
 import urllib.request
 
+from attachment_utils import (
+    ATTACHMENT_POLICIES,
+    DEFAULT_TOKEN_BUDGET,
+    AttachmentBudget,
+    compose_attachment_lines,
+    default_blob_store,
+    estimate_encoded_size,
+    format_byte_count,
+    message_blob_ids,
+    normalize_attachment_policy,
+    resolve_attachment_mode,
+    scan_blob_ids,
+    user_turn_ages,
+)
+from archive import (
+    DEFAULT_ARCHIVE_AFTER_DAYS,
+    DEFAULT_ARCHIVE_FORMAT,
+    archive_file_name,
+    archive_store,
+    format_archive_report,
+    idle_conversations,
+    iter_archive,
+    list_archives,
+    restore_store,
+    summarize_archives,
+)
+from connection_monitor import ConnectionMonitor, HttpProbe, format_ping
+from conversations import DEFAULT_CONVERSATION_ID, TITLE_MAX_CHARS, ConversationIndex, display_title
+from history_db import (
+    LazyHistory,
+    SQLiteHistoryStore,
+    iter_timing_entries,
+    referenced_blob_ids,
+    stored_conversation_ids,
+)
+from history_journal import CORRUPT_SUFFIX, HistoryJournal, atomic_write_bytes
+from history_transfer import format_throughput, iter_import, write_export
+from image_service import ImageDecodeService, SharedImage
+from history_window import DEFAULT_RENDER_WINDOW, DEFAULT_SCROLLBACK, HistoryRenderWindow
+from perf_metrics import format_summary
+from persistence import BackgroundWriter, HistorySync
+from request_body import iter_json_body, join_lines
+from search_index import InvertedIndex, make_snippet, message_texts
+from stream_render import MarkdownStream, Segment, StreamText, render_markdown
+from stream_trace import StreamTrace, format_timing_stats, playback_schedule, timing_stats
+from ui_dispatcher import UIDispatcher
+from ui_watchdog import DEFAULT_STALL_THRESHOLD_MS, StallWatchdog, format_histogram
+from virtual_list import VirtualRows, format_history_row
+from watermark import (
+    DEFAULT_BACKGROUND as DEFAULT_WATERMARK_BACKGROUND,
+    OpacityLadder,
+    WatermarkCache,
+    blend_hex_rows,
+    blend_image,
+    clamp_opacity,
+    clamp_subsample,
+    load_watermark_source,
+    prepare_watermark_source,
+    variant_key,
+)
+from semantic_index import NUMPY_AVAILABLE, EmbeddingIndexer, VectorStore, pool_embedding, prepare_text
 from playback_utils import (
     MAX_FONT_SIZE,
     MIN_FONT_SIZE,
     clamp_font_size,
     resolve_speed_delay,
+    resolve_speed_factor,
 )
 
 # Optional: PIL/Pillow support for improved image handling.
@@ -52,7 +115,18 @@ except ImportError:
 
 CONFIG_FILE = os.path.join(os.path.dirname(__file__), "config.json")
 HISTORY_FILE = os.path.join(os.path.dirname(__file__), "history.json")
+HISTORY_JOURNAL_FILE = os.path.join(os.path.dirname(__file__), "history.jsonl")
+HISTORY_DB_FILE = os.path.join(os.path.dirname(__file__), "history.sqlite3")
+CONVERSATIONS_DIR = os.path.join(os.path.dirname(__file__), "conversations")
+CONVERSATIONS_INDEX_FILE = os.path.join(CONVERSATIONS_DIR, "index.json")
+ARCHIVE_DIR = os.path.join(CONVERSATIONS_DIR, "archive")
+SEARCH_INDEX_SAVE_EVERY = 100  # persist the search index after this many new messages
 ERROR_LOG_FILE = os.path.join(os.path.dirname(__file__), "jugiai_error.log")
+STALL_LOG_FILE = os.path.join(os.path.dirname(__file__), "jugiai_stalls.log")
+WATERMARK_CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache", "watermark")
+WATERMARK_PREVIEW_SETTLE_MS = 120  # exact opacity blend once the slider rests
+APP_ICON_SIZE = 128
+PING_HOST = "api.openai.com"
 
 
 def _should_redirect_windows_store(executable: str, env: Dict[str, str], platform: str) -> bool:
@@ -253,6 +327,25 @@ DEFAULT_CONFIG: Dict[str, Any] = {
     "local_threads": 0,  # 0 = auto
     "use_gpu": "cpu",  # "cpu", "gpu", or "both"
     "n_gpu_layers": 0,  # Number of layers to offload to GPU (0 = CPU only, -1 = all layers, >0 = specific count)
+    # Liitteet: pyynnön tekstiliitteiden yhteinen enimmäiskoko tokeneina ennen katkaisua
+    "attachment_token_budget": DEFAULT_TOKEN_BUDGET,
+    # Aiempien vuorojen liitteet: "full", "reference" tai "drop"
+    "attachment_history_policy": "reference",
+    "attachment_keep_turns": 3,  # montako käyttäjävuoroa liite lähetetään kokonaan
+    # Historian tallennus: "json" (history.json + journal) tai "sqlite" (history.sqlite3, FTS5-haku)
+    "history_backend": "json",
+    # Käynnistyksessä piirrettävien viestien määrä; vanhemmat ladataan vieritettäessä ylös
+    "history_render_window": DEFAULT_RENDER_WINDOW,
+    "history_scrollback": DEFAULT_SCROLLBACK,
+    # Keskustelut, joita ei ole avattu näin moneen päivään, pakataan arkistoon (0 = pois)
+    "archive_after_days": DEFAULT_ARCHIVE_AFTER_DAYS,
+    "archive_format": DEFAULT_ARCHIVE_FORMAT,  # "xz" (lzma) tai "gz" (gzip)
+    # Semanttinen haku: paikallisen GGUF-mallin upotukset (vaatii numpy + llama-cpp-python)
+    "semantic_search": False,
+    "embedding_model_path": "",  # tyhjä = käytä local_model_path-mallia
+    # Käyttöliittymän jumien valvonta: pino lokiin (jugiai_stalls.log), kun UI-säie jumittaa yli rajan
+    "ui_watchdog": False,
+    "ui_stall_threshold_ms": DEFAULT_STALL_THRESHOLD_MS,
     # Taustakuva / ikoni
     "show_background": True,
     "background_path": "",
@@ -353,6 +446,12 @@ class LocalModelManager:
         self.model_path = None
         self.loaded_params = {}
         self._loading = False
+        self.embed_llm = None
+        self.embed_model_path = None
+        self._embed_lock = threading.Lock()
+        # Models load on worker threads; warnings are handed to the UI through this
+        # thread-safe callback (title, message) instead of calling Tk directly.
+        self.notify: Optional[Callable[[str, str], None]] = None
     
     def get_model(self, config: Dict[str, Any], safe_log_fn) -> Any:
         """
@@ -497,7 +596,7 @@ class LocalModelManager:
                     )
                     
                     # Show user-friendly messagebox about GPU failure
-                    messagebox.showwarning(
+                    self._notify(
                         "GPU-kiihdytys ei käytössä",
                         f"GPU-kiihdytyksen käynnistys epäonnistui:\n{exc}\n\n"
                         "Malli on ladattu CPU-tilassa. Jos haluat käyttää GPU:ta, "
@@ -522,12 +621,54 @@ class LocalModelManager:
                     "mallin polku on oikea."
                 ) from exc
     
+    def _notify(self, title: str, message: str) -> None:
+        if self.notify is not None:
+            self.notify(title, message)
+        else:
+            _log_warning(f"{title}: {message}")
+
     def unload(self):
         """Unload the current model."""
         self.llm = None
         self.model_path = None
         self.loaded_params = {}
 
+    def get_embedding_model(self, config: Dict[str, Any], safe_log_fn) -> Any:
+        """Load (once) a separate Llama instance in embedding mode.
+
+        Uses ``embedding_model_path`` if set, otherwise the chat model.
+        """
+        model_path = (config.get("embedding_model_path") or config.get("local_model_path") or "").strip()
+        if not model_path or not os.path.isfile(model_path):
+            raise RuntimeError("Upotusmallia ei löydy. Valitse paikallinen GGUF-malli asetuksista.")
+        if self.embed_llm is not None and self.embed_model_path == model_path:
+            return self.embed_llm
+        try:
+            from llama_cpp import Llama
+        except Exception as exc:
+            raise RuntimeError(_format_llama_import_error(exc)) from exc
+        safe_log_fn(f"Loading embedding model: {os.path.basename(model_path)}")
+        llama_kwargs: Dict[str, Any] = {
+            "model_path": model_path,
+            "embedding": True,
+            "n_ctx": int(config.get("local_n_ctx", 4096)),
+            "n_batch": int(config.get("local_n_batch", 256)),
+            "verbose": False,
+        }
+        n_threads = config.get("local_threads", 0)
+        if n_threads and int(n_threads) > 0:
+            llama_kwargs["n_threads"] = int(n_threads)
+        self.embed_llm = Llama(**llama_kwargs)
+        self.embed_model_path = model_path
+        return self.embed_llm
+
+    def embed(self, texts: List[str], config: Dict[str, Any], safe_log_fn) -> List[Any]:
+        """Return one embedding per text (may be token-level; see semantic_index.pool_embedding)."""
+        with self._embed_lock:
+            llm = self.get_embedding_model(config, safe_log_fn)
+            result = llm.create_embedding(list(texts))
+        return [item["embedding"] for item in result["data"]]
+
 
 # Global model manager instance
 _local_model_manager = LocalModelManager()
@@ -535,6 +676,7 @@ _local_model_manager = LocalModelManager()
 
 class JugiAIApp(tk.Tk):
     def __init__(self) -> None:
+        self._started_at = time.perf_counter()
         super().__init__()
         self.title("JugiAI – AnomFIN · AnomTools")
         self.minsize(780, 520)
@@ -543,15 +685,83 @@ class JugiAIApp(tk.Tk):
         self._ensure_profiles()
         self._apply_active_profile()
         self.history: List[Dict[str, str]] = []  # {role:"user"|"assistant", content:str}
+        # Conversation index; message stores are opened lazily per conversation.
+        self._conversations = ConversationIndex(CONVERSATIONS_INDEX_FILE).load()
+        self._sessions: Dict[int, Dict[str, Any]] = {}
+        self._conversation_rows: List[int] = []
+        self._archiving: set[int] = set()  # ids with a queued archive job
+        self._pending_switch: Optional[int] = None  # opened while it was being archived
+        self._archive_results: Dict[int, Optional[Dict[str, Any]]] = {}  # written by the writer thread
+        self._archive_report = (0, False)  # (archived in this run, show dialog)
+        self._embedding_indexer: Optional[EmbeddingIndexer] = None
+        self._export_results: List[Tuple[str, Any]] = []  # written by the writer thread
+        self._exports_pending = 0
+        self._import_state: Optional[Dict[str, Any]] = None
+        self.transfer_status_var = tk.StringVar(value="")
+        self._history_store: Any = None  # store of the active conversation
+        # Disk writes (config + history) run on one coalescing background thread.
+        self._writer = BackgroundWriter(
+            on_error=self._on_persistence_error,
+            on_slow=lambda key, ms, depth: _log_warning(f"Slow save '{key}': {ms:.0f} ms (queue {depth})"),
+        )
+        # Worker threads never call Tk: they post to this queue, drained once per frame.
+        self._ui = UIDispatcher(self.after, on_error=lambda exc: _log_warning(f"UI callback failed: {exc}"))
+        self._ui.start()
+        # One long-lived probe thread; see connection_monitor for the interval policy.
+        self._ping_probe = HttpProbe(PING_HOST, self._ping_path, self._ping_headers)
+        self._monitor = ConnectionMonitor(
+            self._probe_connection, lambda rtt, state: self._ui.post(self._update_ping_indicator, rtt, state)
+        )
+        self._watchdog: Optional[StallWatchdog] = None
+        if self.config_dict.get("ui_watchdog"):
+            self._watchdog = StallWatchdog(
+                self.after,
+                self._report_ui_stall,
+                threshold_ms=self.config_dict.get("ui_stall_threshold_ms", DEFAULT_STALL_THRESHOLD_MS),
+            )
+            self._watchdog.start()
+        # The dialog is modal: schedule it from the dispatched callback instead of running it
+        # inside the dispatcher frame, which would hold back every other queued event.
+        _local_model_manager.notify = lambda title, message: self._ui.post(
+            self.after_idle, lambda: messagebox.showwarning(title, message)
+        )
+        self._history_sync = HistorySync(None)
+        self._history_epoch = 0  # bumped when history is cleared/replaced
+        self._render_window = HistoryRenderWindow(
+            self.config_dict.get("history_render_window", DEFAULT_RENDER_WINDOW),
+            self.config_dict.get("history_scrollback", DEFAULT_SCROLLBACK),
+        )
+        self._loading_older = False
+        # PNG decoding happens on this worker; Tk only wraps the finished pixels.
+        self._images: Optional[ImageDecodeService] = None
+        if PIL_AVAILABLE:
+            self._images = ImageDecodeService(
+                self._ui.post, on_error=lambda path, exc: _log_warning(f"Image decode failed for {path}: {exc}")
+            )
         self._wm_img = None
         self._wm_raw_img = None
         self._wm_scaled_img = None
+        # Processed watermark variants on disk: a normal start is one PhotoImage read.
+        self._watermark_cache = WatermarkCache(WATERMARK_CACHE_DIR)
+        # Opacity previews precomputed while the settings dialog is open.
+        self._wm_ladder: Optional[OpacityLadder] = None
+        self._wm_ladder_photos: Dict[int, Any] = {}
+        self._wm_ladder_token = 0
+        self._wm_request_token = 0  # bumped by every synchronous load to drop stale async ones
         self._wm_overlay: tk.Label | None = None
         self.watermark_enabled = True  # Flag to track if watermark loading is available
         
         # Logo for messages
         self._msg_logo_img = None
-        self._logo_refs: List[Any] = []  # Keep references to prevent garbage collection
+        # One shared inline logo for every assistant message; rebuilt in place when
+        # the logo file or the font size changes (see _load_message_logo).
+        self._message_logo: Optional[tk.PhotoImage] = None
+        if self._images is not None:
+            self._message_logo_cache = SharedImage(
+                self._request_message_logo, self._install_message_logo, deferred=True
+            )
+        else:
+            self._message_logo_cache = SharedImage(self._decode_message_logo, self._install_message_logo)
 
         self._is_loading_history = False
         self._history_viewer: Dict[str, Any] | None = None
@@ -561,7 +771,9 @@ class JugiAIApp(tk.Tk):
 
         self.pending_attachments: List[Dict[str, Any]] = []
         self.stream_start_index: Optional[str] = None
-        self.current_stream_text: str = ""
+        self._stream_text = StreamText()
+        self._stream_markdown = MarkdownStream()
+        self._stream_trace: Optional[StreamTrace] = None  # timing of the reply being streamed (worker thread)
         self.current_stream_timestamp: Optional[str] = None
         self._is_sending: bool = False
 
@@ -711,15 +923,21 @@ class JugiAIApp(tk.Tk):
         if not self.config_dict.get("api_key"):
             self.after(200, self.open_settings)
 
-        # Lataa historia ja ikonit/tausta
-        self.load_history()
+        # Ikonit/tausta dekoodataan taustalla historian latauksen aikana
         self._apply_icon_from_config()
-        self._load_watermark_image()
-        self._insert_watermark_if_needed()
-        self.after(1500, self._refresh_ping)
+        self._request_watermark_image()
+        self.load_history()
+        self._monitor.start(delay=1.5)
+        self.bind("<Map>", self._on_window_visibility, add="+")
+        self.bind("<Unmap>", self._on_window_visibility, add="+")
+        self.bind("<KeyPress>", lambda _e: self._monitor.touch(), add="+")
+        self.bind("<ButtonPress>", lambda _e: self._monitor.touch(), add="+")
+        self.after(5000, self.archive_idle_conversations)
         
         # Add smooth scroll animation support
         self._add_smooth_scroll_bindings()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.after_idle(self._report_time_to_interactive)
         
         # Add aesthetic enhancements
         self._add_button_hover_effects()
@@ -1004,16 +1222,56 @@ class JugiAIApp(tk.Tk):
         chat_wrapper = ttk.Frame(root, style="Surface.TFrame", padding=(24, 0))
         chat_wrapper.grid(row=2, column=0, sticky="nsew")
         chat_wrapper.rowconfigure(1, weight=1)
-        chat_wrapper.columnconfigure(0, weight=1)
+        chat_wrapper.columnconfigure(1, weight=1)
+
+        sidebar = ttk.Frame(chat_wrapper, style="CardSurface.TFrame", padding=12)
+        sidebar.grid(row=0, column=0, rowspan=2, sticky="nsw", padx=(0, 16))
+        sidebar.rowconfigure(1, weight=1)
+        sidebar_header = ttk.Frame(sidebar, style="CardSurface.TFrame")
+        sidebar_header.grid(row=0, column=0, sticky="ew", pady=(0, 8))
+        ttk.Label(sidebar_header, text="Keskustelut", style="MetricTitle.TLabel").pack(side=tk.LEFT)
+        ttk.Button(sidebar_header, text="＋ Uusi", style="Toolbar.TButton", command=self.new_conversation).pack(
+            side=tk.RIGHT
+        )
+        self.conversation_list = tk.Listbox(
+            sidebar,
+            width=26,
+            bg="#041024",
+            fg="#e2f7ff",
+            highlightcolor="#14f1ff",
+            highlightbackground="#0a223d",
+            selectbackground="#0ea5e9",
+            selectforeground="#01030f",
+            activestyle="none",
+            exportselection=False,
+            relief=tk.FLAT,
+        )
+        self.conversation_list.grid(row=1, column=0, sticky="nsew")
+        self.conversation_list.bind("<<ListboxSelect>>", self._on_conversation_select)
+        ttk.Button(sidebar, text="Poista", style="Toolbar.TButton", command=self.delete_conversation).grid(
+            row=2, column=0, sticky="ew", pady=(8, 0)
+        )
+        transfer_row = ttk.Frame(sidebar, style="CardSurface.TFrame")
+        transfer_row.grid(row=3, column=0, sticky="ew", pady=(8, 0))
+        transfer_row.columnconfigure((0, 1), weight=1)
+        ttk.Button(transfer_row, text="⤓ Vie", style="Toolbar.TButton", command=self.export_conversation).grid(
+            row=0, column=0, sticky="ew", padx=(0, 4)
+        )
+        ttk.Button(transfer_row, text="⤒ Tuo", style="Toolbar.TButton", command=self.import_conversations).grid(
+            row=0, column=1, sticky="ew", padx=(4, 0)
+        )
+        ttk.Label(
+            sidebar, textvariable=self.transfer_status_var, style="Subtle.TLabel", wraplength=200
+        ).grid(row=4, column=0, sticky="ew", pady=(6, 0))
 
         chat_header = ttk.Frame(chat_wrapper, style="Surface.TFrame")
-        chat_header.grid(row=0, column=0, sticky="ew", pady=(0, 12))
+        chat_header.grid(row=0, column=1, sticky="ew", pady=(0, 12))
         ttk.Label(chat_header, text="Reaaliaikainen keskustelu", style="SectionTitle.TLabel").pack(side=tk.LEFT)
         self.typing_badge = ttk.Label(chat_header, textvariable=self.typing_status_var, style="StatusBadgeIdle.TLabel")
         self.typing_badge.pack(side=tk.RIGHT)
 
         chat_card = ttk.Frame(chat_wrapper, style="CardSurface.TFrame", padding=0)
-        chat_card.grid(row=1, column=0, sticky="nsew")
+        chat_card.grid(row=1, column=1, sticky="nsew")
         chat_card.rowconfigure(0, weight=1)
         chat_card.columnconfigure(0, weight=1)
 
@@ -1091,6 +1349,10 @@ class JugiAIApp(tk.Tk):
         action_row = ttk.Frame(composer, style="Surface.TFrame")
         action_row.grid(row=3, column=0, sticky="ew", pady=(12, 0))
         ttk.Label(action_row, text="Vaihto+Enter = rivinvaihto", style="Subtle.TLabel").pack(side=tk.LEFT)
+        self.attachment_savings_var = tk.StringVar(value="")
+        ttk.Label(action_row, textvariable=self.attachment_savings_var, style="Subtle.TLabel").pack(
+            side=tk.LEFT, padx=(16, 0)
+        )
         self.send_btn = ttk.Button(action_row, text="Lähetä ✈️", style="Accent.TButton", command=self.on_send)
         self.send_btn.pack(side=tk.RIGHT)
 
@@ -1149,6 +1411,16 @@ class JugiAIApp(tk.Tk):
             return
         self.metric_vars["profile"].set(self.config_dict.get("active_profile", DEFAULT_PROFILE_NAME))
         self.metric_vars["model"].set(self._format_model_label())
+        store = self._history_store
+        if isinstance(store, SQLiteHistoryStore) and self._history_synced():
+            # Counters are kept in the conversations table; no list walk needed.
+            try:
+                count, last = store.stats()
+                self.metric_vars["messages"].set(str(count))
+                self.metric_vars["last"].set(last or "–")
+                return
+            except Exception:
+                pass
         self.metric_vars["messages"].set(str(len(self.history)))
         last_ts = "–"
         for entry in reversed(self.history):
@@ -1209,8 +1481,27 @@ class JugiAIApp(tk.Tk):
                 self.chat.tag_configure("attachment", foreground="#facc15", font=accent_font)
                 self.chat.tag_configure("separator_user", foreground="#38bdf8")
                 self.chat.tag_configure("separator_assistant", foreground="#0ea5e9")
+                # Markdown in assistant replies (see stream_render.MarkdownStream).
+                mono_font = ("Consolas", max(sanitized - 1, 8))
+                for level, grow in ((1, 6), (2, 4), (3, 2)):
+                    self.chat.tag_configure(f"md_h{level}", font=("Segoe UI", sanitized + grow, "bold"))
+                self.chat.tag_configure("md_bold", font=("Segoe UI", sanitized, "bold"))
+                self.chat.tag_configure("md_code", font=mono_font, background="#1e293b", foreground="#fbbf24")
+                self.chat.tag_configure(
+                    "md_code_block",
+                    font=mono_font,
+                    background="#111827",
+                    foreground="#e2e8f0",
+                    lmargin1=12,
+                    lmargin2=12,
+                )
+                self.chat.tag_configure("md_code_lang", font=accent_font, foreground="#94a3b8", lmargin1=12)
+                self.chat.tag_configure("md_bullet", foreground="#6ee7b7")
             except Exception:
                 pass
+            if self._message_logo_cache.loaded:
+                # Rescales the logo already embedded in every message.
+                self._load_message_logo()
 
         if hasattr(self, "input"):
             try:
@@ -1262,25 +1553,198 @@ class JugiAIApp(tk.Tk):
             self._history_viewer = None
             self._cancel_history_playback_job()
             return
-        listbox: tk.Listbox = viewer["listbox"]
-        selection = listbox.curselection()
-        selected_idx = selection[0] if selection else None
-        listbox.delete(0, tk.END)
-        for idx, entry in enumerate(self.history):
-            ts = entry.get("timestamp") or f"{idx + 1:02d}"
-            role = entry.get("role", "?").capitalize()
-            snippet = (entry.get("content") or "").strip().replace("\n", " ")
-            if len(snippet) > 48:
-                snippet = snippet[:45] + "…"
-            listbox.insert(tk.END, f"{idx + 1:02d}. {ts} · {role} – {snippet}")
-        if selected_idx is not None and selected_idx < listbox.size():
-            listbox.selection_set(selected_idx)
-            listbox.see(selected_idx)
-        viewer["status_var"].set(f"Tallenteita: {len(self.history)}")
+        if "session_combo" in viewer:
+            entries = self._conversations.entries()
+            viewer["session_ids"] = [entry["id"] for entry in entries]
+            viewer["session_combo"].configure(
+                values=[
+                    f"{display_title(entry)} (arkistoitu)" if entry.get("archived") else display_title(entry)
+                    for entry in entries
+                ]
+            )
+            active = self._conversations.active_id
+            if active in viewer["session_ids"]:
+                viewer["session_combo"].current(viewer["session_ids"].index(active))
+        query = viewer["search_var"].get().strip() if "search_var" in viewer else ""
+        semantic = bool(query) and "semantic_var" in viewer and bool(viewer["semantic_var"].get())
+        key = (self._conversations.active_id, self._history_epoch, query, semantic)
+        rows: VirtualRows = viewer["rows"]
+        if query:
+            # Search results are rebuilt only when the query, the results or the history change.
+            key += (len(self.history), id(viewer.get("semantic")))
+            if key != viewer.get("key"):
+                found = self._history_viewer_rows(query)
+                viewer["positions"] = [row[0] for row in found]
+                viewer["labels"] = [format_history_row(*row, truncate=False) for row in found]
+                viewer["key"] = key
+                viewer["selected"] = None
+                self._reload_history_list(rows.reset(len(found), top=0), top=0)
+        elif key != viewer.get("key") or len(self.history) < rows.total:
+            # Unfiltered rows map 1:1 to history entries; labels are formatted lazily and cached.
+            viewer["positions"] = None
+            viewer["labels"] = {}
+            viewer["key"] = key
+            viewer["selected"] = None
+            self._reload_history_list(rows.reset(len(self.history)))
+        else:
+            self._append_history_list_rows()
+        if query:
+            viewer["status_var"].set(f"Osumia: {rows.total} / {len(self.history)}")
+        else:
+            viewer["status_var"].set(f"Tallenteita: {len(self.history)}")
         state = viewer["state"]
         if state.get("index", 0) > len(self.history):
             state["index"] = len(self.history)
 
+    def _history_viewer_rows(self, query: str) -> List[Tuple[int, Optional[str], str, str]]:
+        """Return (index, timestamp, role, snippet) rows for the history viewer."""
+        viewer = self._history_viewer or {}
+        if query and "semantic_var" in viewer and viewer["semantic_var"].get():
+            semantic = viewer.get("semantic")
+            return semantic[1] if semantic and semantic[0] == query else []
+        store = self._history_store
+        if isinstance(store, SQLiteHistoryStore) and self._history_synced():
+            try:
+                if query:
+                    return store.search(query, limit=200)
+                return store.rows(snippet_chars=60)
+            except Exception as e:
+                _log_warning(f"History query failed: {e}")
+        if query:
+            index = self._active_search_index()
+            if index is not None:
+                rows: List[Tuple[int, Optional[str], str, str]] = []
+                for idx, _score, terms in index.search(query, limit=200):
+                    if idx < len(self.history):
+                        entry = self.history[idx]
+                        snippet = make_snippet(entry.get("content") or "", terms, radius=30)
+                        rows.append((idx, entry.get("timestamp"), entry.get("role", "?"), snippet))
+                return rows
+        needle = query.casefold()
+        return [
+            (idx, entry.get("timestamp"), entry.get("role", "?"), (entry.get("content") or "")[:60])
+            for idx, entry in enumerate(self.history)
+            if not needle or needle in (entry.get("content") or "").casefold()
+        ]
+
+    def _history_viewer_position(self, row: int) -> int:
+        """History index of the listbox row ``row`` (a local row of the loaded window)."""
+        viewer = self._history_viewer or {}
+        rows: Optional[VirtualRows] = viewer.get("rows")
+        if rows is not None:
+            row = rows.to_global(row)
+        positions = viewer.get("positions")
+        if positions is None:
+            return row
+        return positions[row] if 0 <= row < len(positions) else row
+
+    def _history_list_label(self, row: int) -> str:
+        viewer = self._history_viewer or {}
+        labels = viewer.get("labels")
+        if isinstance(labels, list):
+            return labels[row]
+        label = labels.get(row) if labels is not None else None
+        if label is None:
+            entry = self.history[row]
+            label = format_history_row(row, entry.get("timestamp"), entry.get("role", "?"), (entry.get("content") or "")[:60])
+            if labels is not None:
+                labels[row] = label
+        return label
+
+    def _reload_history_list(self, window: Tuple[int, int], top: Optional[int] = None) -> None:
+        """Fill the listbox with the loaded window only (global rows ``window[0]`` .. ``window[1] - 1``)."""
+        viewer = self._history_viewer
+        if not viewer:
+            return
+        listbox: tk.Listbox = viewer["listbox"]
+        rows: VirtualRows = viewer["rows"]
+        first, end = window
+        listbox.delete(0, tk.END)
+        if end > first:
+            listbox.insert(tk.END, *[self._history_list_label(row) for row in range(first, end)])
+        if top is None:
+            listbox.yview_moveto(1.0 if end == rows.total else 0.0)
+        else:
+            listbox.yview(max(0, top - first))
+        self._select_history_list_row(viewer.get("selected"), see=False)
+
+    def _append_history_list_rows(self) -> None:
+        """Add rows for new history entries; only touches the listbox when its tail is loaded."""
+        viewer = self._history_viewer
+        if not viewer:
+            return
+        listbox: tk.Listbox = viewer["listbox"]
+        rows: VirtualRows = viewer["rows"]
+        at_bottom = listbox.yview()[1] >= 1.0
+        start, end = rows.grow(len(self.history))
+        if end > start:
+            listbox.insert(tk.END, *[self._history_list_label(row) for row in range(start, end)])
+            drop = rows.trim()
+            if drop:
+                listbox.delete(0, drop - 1)
+            if at_bottom:
+                listbox.see(tk.END)
+        self._on_history_list_scroll(*listbox.yview())
+
+    def _select_history_list_row(self, row: Optional[int], see: bool = True) -> None:
+        """Select the global row ``row``, loading its part of the list first if needed."""
+        viewer = self._history_viewer
+        if not viewer:
+            return
+        listbox: tk.Listbox = viewer["listbox"]
+        rows: VirtualRows = viewer["rows"]
+        listbox.selection_clear(0, tk.END)
+        viewer["selected"] = row
+        if row is None or not 0 <= row < rows.total:
+            return
+        local = rows.to_local(row)
+        if local is None:
+            if not see:
+                return
+            self._reload_history_list(rows.place(row), top=row)
+            local = rows.to_local(row)
+        listbox.selection_set(local)
+        if see:
+            listbox.see(local)
+
+    def _on_history_list_scroll(self, first: str, last: str) -> None:
+        """Listbox yscrollcommand: show whole-list fractions and slide the window near its edges."""
+        viewer = self._history_viewer
+        if not viewer:
+            return
+        rows: VirtualRows = viewer["rows"]
+        low, high = rows.fractions(float(first), float(last))
+        viewer["scrollbar"].set(low, high)
+        top = int(rows.first + float(first) * rows.loaded)
+        bottom = int(rows.first + float(last) * rows.loaded)
+        if rows.needs_shift(top, bottom) and not viewer.get("shift_pending"):
+            viewer["shift_pending"] = True
+            self.after_idle(lambda: self._shift_history_list(top, bottom - top))
+
+    def _shift_history_list(self, top: int, visible: int) -> None:
+        viewer = self._history_viewer
+        if not viewer:
+            return
+        viewer["shift_pending"] = False
+        self._reload_history_list(viewer["rows"].place(top, visible), top=top)
+
+    def _on_history_list_scrollbar(self, action: str, *args: str) -> None:
+        """Scrollbar command over the whole list: jumps load the target window directly."""
+        viewer = self._history_viewer
+        if not viewer:
+            return
+        listbox: tk.Listbox = viewer["listbox"]
+        if action != "moveto":
+            listbox.yview(action, *args)
+            return
+        rows: VirtualRows = viewer["rows"]
+        top = rows.row_at(float(args[0]))
+        local = rows.to_local(top)
+        if local is None or rows.needs_shift(top, top):
+            self._reload_history_list(rows.place(top), top=top)
+        else:
+            listbox.yview(local)
+
     def _render_history_entry(self, index: int) -> None:
         viewer = self._history_viewer
         if not viewer:
@@ -1319,9 +1783,30 @@ class JugiAIApp(tk.Tk):
 
         list_frame = ttk.Frame(layout, style="CardSurface.TFrame", padding=12)
         list_frame.grid(row=1, column=0, sticky="nsew", padx=(0, 12))
-        list_frame.rowconfigure(0, weight=1)
+        list_frame.rowconfigure(2, weight=1)
         list_frame.columnconfigure(0, weight=1)
 
+        # Conversations come from the index; archived ones are listed without opening them.
+        session_var = tk.StringVar()
+        session_combo = ttk.Combobox(list_frame, textvariable=session_var, state="readonly")
+        session_combo.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 8))
+
+        search_row = ttk.Frame(list_frame, style="CardSurface.TFrame")
+        search_row.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(0, 8))
+        search_row.columnconfigure(0, weight=1)
+        search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_row, textvariable=search_var)
+        search_entry.grid(row=0, column=0, sticky="ew")
+        semantic_var = tk.BooleanVar(value=False)
+        if self._semantic_enabled():
+            # Semantic queries embed the text, so they run on Enter instead of per keystroke.
+            ttk.Checkbutton(
+                search_row,
+                text="🧠 Merkitys",
+                variable=semantic_var,
+                command=lambda: self._refresh_history_viewer(),
+            ).grid(row=0, column=1, padx=(8, 0))
+
         listbox = tk.Listbox(
             list_frame,
             bg="#041024",
@@ -1333,10 +1818,17 @@ class JugiAIApp(tk.Tk):
             activestyle="none",
             relief=tk.FLAT,
         )
-        listbox.grid(row=0, column=0, sticky="nsew")
-        list_scroll = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=listbox.yview)
-        list_scroll.grid(row=0, column=1, sticky="ns")
-        listbox.configure(yscrollcommand=list_scroll.set)
+        listbox.grid(row=2, column=0, sticky="nsew")
+        # Only a window of rows is loaded (VirtualRows); the scrollbar spans the whole list.
+        list_scroll = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self._on_history_list_scrollbar)
+        list_scroll.grid(row=2, column=1, sticky="ns")
+        listbox.configure(yscrollcommand=self._on_history_list_scroll)
+        ttk.Button(
+            list_frame,
+            text="🗜 Arkistoi vanhat",
+            style="Toolbar.TButton",
+            command=lambda: self.archive_idle_conversations(report=True),
+        ).grid(row=3, column=0, columnspan=2, sticky="ew", pady=(8, 0))
 
         detail_frame = ttk.Frame(layout, style="CardSurface.TFrame", padding=12)
         detail_frame.grid(row=1, column=1, sticky="nsew")
@@ -1381,21 +1873,53 @@ class JugiAIApp(tk.Tk):
         ttk.Button(controls, text="⚡ Nopeutus", style="Toolbar.TButton", command=lambda: self._set_history_play_speed("fast")).grid(
             row=0, column=6, padx=(12, 0)
         )
+        ttk.Button(controls, text="⏱ Ajoitukset", style="Toolbar.TButton", command=self.show_timing_stats).grid(
+            row=0, column=7, padx=(12, 0)
+        )
 
         viewer_state = {"index": 0, "speed": self._history_play_speed, "mode": "browse"}
         self._history_viewer = {
             "window": dlg,
             "listbox": listbox,
+            "scrollbar": list_scroll,
+            "rows": VirtualRows(),
+            "labels": {},
+            "key": None,
+            "selected": None,
             "display": display,
             "status_var": status_var,
+            "search_var": search_var,
+            "semantic_var": semantic_var,
+            "semantic": None,
+            "session_combo": session_combo,
+            "session_ids": [],
+            "positions": [],
             "state": viewer_state,
         }
+        def _on_search_key(event=None) -> None:
+            if semantic_var.get():
+                if event is not None and event.keysym == "Return" and search_var.get().strip():
+                    self._start_semantic_search(search_var.get().strip())
+                return
+            self._refresh_history_viewer()
+
+        search_entry.bind("<KeyRelease>", _on_search_key)
+
+        def _on_session_select(_event=None) -> None:
+            ids = self._history_viewer["session_ids"] if self._history_viewer else []
+            index = session_combo.current()
+            if 0 <= index < len(ids):
+                self.switch_conversation(ids[index])
+
+        session_combo.bind("<<ComboboxSelected>>", _on_session_select)
 
         def _on_select(event=None):
             selection = listbox.curselection()
             if not selection:
                 return
-            idx = selection[0]
+            idx = self._history_viewer_position(selection[0])
+            if self._history_viewer:
+                self._history_viewer["selected"] = self._history_viewer["rows"].to_global(selection[0])
             viewer_state["index"] = idx
             viewer_state["mode"] = "browse"
             self._cancel_history_playback_job()
@@ -1420,7 +1944,7 @@ class JugiAIApp(tk.Tk):
             return
         listbox: tk.Listbox = viewer["listbox"]
         selection = listbox.curselection()
-        start_index = selection[0] if selection else 0
+        start_index = self._history_viewer_position(selection[0]) if selection else 0
         viewer["state"]["index"] = start_index
         viewer["state"]["mode"] = "play"
         self._cancel_history_playback_job()
@@ -1443,18 +1967,93 @@ class JugiAIApp(tk.Tk):
             self._stop_history_playback(completed=True)
             return
         entry = self.history[idx]
+        positions = viewer.get("positions")
+        if positions is None:
+            self._select_history_list_row(idx)
+        else:
+            self._select_history_list_row(positions.index(idx) if idx in positions else None)
+        state["index"] = idx + 1
+        formatted = self._format_history_entry(entry)
+        trace = StreamTrace.from_dict(entry.get("timing"))
+        if trace is not None:
+            # Replies with a recorded trace are revealed chunk by chunk with the original timing.
+            header, _sep, body = formatted.partition("\n")
+            content_len = len((entry.get("content") or "").strip())
+            steps = playback_schedule(trace, content_len, resolve_speed_factor(state.get("speed", "normal")))
+            self._history_viewer_append(header + "\n")
+            self._history_viewer_play_chunk(body, content_len, steps, 0, 0)
+            return
+        self._history_viewer_append(formatted + "\n\n")
+        delay = resolve_speed_delay(state.get("speed", "normal"))
+        self._history_play_job = self.after(delay, self._history_viewer_play_step)
+
+    def _history_viewer_append(self, text: str) -> None:
+        viewer = self._history_viewer
+        if not viewer or not text:
+            return
         display: ScrolledText = viewer["display"]
         display.configure(state=tk.NORMAL)
-        display.insert(tk.END, self._format_history_entry(entry) + "\n\n")
+        display.insert(tk.END, text)
         display.configure(state=tk.DISABLED)
         display.see(tk.END)
-        listbox: tk.Listbox = viewer["listbox"]
-        listbox.selection_clear(0, tk.END)
-        listbox.selection_set(idx)
-        listbox.see(idx)
-        state["index"] = idx + 1
-        delay = resolve_speed_delay(state.get("speed", "normal"))
-        self._history_play_job = self.after(delay, self._history_viewer_play_step)
+
+    def _history_viewer_play_chunk(
+        self, body: str, content_len: int, steps: List[Tuple[int, int]], step: int, shown: int
+    ) -> None:
+        """Reveal step ``step`` of a timed reply after its recorded delay."""
+        viewer = self._history_viewer
+        if not viewer or viewer["state"].get("mode") != "play":
+            return
+        if step >= len(steps):
+            # Attachment lines follow the content; then the normal pause before the next entry.
+            self._history_viewer_append(body[content_len:] + "\n\n")
+            delay = resolve_speed_delay(viewer["state"].get("speed", "normal"))
+            self._history_play_job = self.after(delay, self._history_viewer_play_step)
+            return
+        delay, end = steps[step]
+
+        def reveal() -> None:
+            self._history_viewer_append(body[shown:end])
+            self._history_viewer_play_chunk(body, content_len, steps, step + 1, end)
+
+        self._history_play_job = self.after(delay, reveal)
+
+    def show_timing_stats(self) -> None:
+        """TTFT and inter-token latency percentiles per model over every saved conversation."""
+        # On the writer thread: nothing is read on the Tk thread, and replies whose
+        # saves are still queued are on disk by the time the job runs.
+        sqlite = str(self.config_dict.get("history_backend", "json")).lower() == "sqlite"
+        self._writer.submit("timing-stats", self._timing_stats_job, self._conversations.entries(), sqlite)
+
+    def _timing_stats_job(self, conversations: List[Dict[str, Any]], sqlite: bool) -> None:
+        try:
+            text = format_timing_stats(timing_stats(self._iter_saved_timings(conversations, sqlite)))
+        except Exception as e:
+            _log_warning(f"Reading reply timings failed: {e}")
+            text = f"Ajoitustietojen luku epäonnistui: {e}"
+
+        def show() -> None:
+            parent = self._history_viewer["window"] if self._history_viewer else self
+            messagebox.showinfo("Vastausten ajoitus", text, parent=parent)
+
+        self._ui.post(self.after_idle, show)
+
+    def _iter_saved_timings(self, conversations: List[Dict[str, Any]], sqlite: bool) -> Iterator[Dict[str, Any]]:
+        """Messages with stream traces: SQL rows, JSON histories and archives, one pass each."""
+        in_db: Set[int] = set()
+        if sqlite and os.path.exists(HISTORY_DB_FILE):
+            in_db = stored_conversation_ids(HISTORY_DB_FILE)
+            archived = {entry["id"] for entry in conversations if entry.get("archived")}
+            yield from iter_timing_entries(HISTORY_DB_FILE, skip=archived)
+        for entry in conversations:
+            cid = entry["id"]
+            if entry.get("archived"):
+                path = os.path.join(ARCHIVE_DIR, entry["archived"]["file"])
+                if os.path.exists(path):
+                    yield from iter_archive(path)
+            elif cid not in in_db:
+                # JSON backend, or not migrated into the database yet.
+                yield from HistoryJournal(*self._conversation_history_paths(cid)).iter_messages()
 
     def _pause_history_playback(self) -> None:
         viewer = self._history_viewer
@@ -1495,22 +2094,21 @@ class JugiAIApp(tk.Tk):
         for path in paths:
             try:
                 size = os.path.getsize(path)
-                with open(path, "rb") as f:
-                    data = f.read()
                 if size > 4 * 1024 * 1024:
                     if not messagebox.askyesno(
                         "Suuri tiedosto",
                         f"Tiedosto {os.path.basename(path)} on {size} tavua. Lisätäänkö silti?",
                     ):
                         continue
-                encoded = base64.b64encode(data).decode("ascii")
+                # Store the file once on disk; history keeps only the reference.
+                blob_id, size = default_blob_store.put_file(path)
                 mime, _ = mimetypes.guess_type(path)
                 self.pending_attachments.append(
                     {
                         "name": os.path.basename(path),
                         "mime": mime or "tuntematon",
                         "size": size,
-                        "data": encoded,
+                        "blob": blob_id,
                     }
                 )
                 added = True
@@ -1525,38 +2123,61 @@ class JugiAIApp(tk.Tk):
             self._refresh_attachment_chips()
 
     def start_assistant_stream(self, timestamp: str) -> None:
-        self.current_stream_text = ""
+        self._stream_text = StreamText()
+        self._stream_markdown = MarkdownStream()
         self.stream_start_index = None
         self.chat.configure(state=tk.NORMAL)
+        # Whole reply incl. header; tagged as a message once it is in the history.
+        self.chat.mark_set("stream_message", "end-1c")
+        self.chat.mark_gravity("stream_message", tk.LEFT)
         
         # Try to show logo instead of text prefix
         logo_img = self._load_message_logo()
         if logo_img:
-            self._logo_refs.append(logo_img)  # Keep reference
             self.chat.image_create(tk.END, image=logo_img)
             self.chat.insert(tk.END, " ", ("separator_assistant",))
         else:
             self.chat.insert(tk.END, "▮ ", ("separator_assistant",))
             
         self.chat.insert(tk.END, f"JugiAI · {timestamp}\n", ("header_assistant",))
-        self.stream_start_index = self.chat.index(tk.END)
+        # Marks instead of absolute indices: older pages may be prepended mid-stream.
+        self.chat.mark_set("stream_start", "end-1c")
+        self.chat.mark_gravity("stream_start", tk.LEFT)
+        self.stream_start_index = "stream_start"
         self.chat.insert(tk.END, "...\n\n", ("role_assistant",))
+        # New text goes in front of this mark (right gravity keeps it after the reply).
+        self.chat.mark_set("stream_tail", "end-3c")
         self.chat.see(tk.END)
         self.chat.configure(state=tk.DISABLED)
 
-    def update_assistant_stream(self, content: str) -> None:
+    def update_assistant_stream(self, delta: str) -> None:
+        """Append one streamed chunk; only the new characters touch the widget."""
         if self.stream_start_index is None:
             return
-        self.current_stream_text = content
-        display = content.strip() or "…"
+        first = not self._stream_text.shown
+        text = self._stream_text.feed(delta)
+        if not text:
+            return
         self.chat.configure(state=tk.NORMAL)
-        self.chat.delete(self.stream_start_index, tk.END)
-        self.chat.insert(tk.END, display + "\n\n", ("role_assistant",))
+        if first:
+            self.chat.delete(self.stream_start_index, "stream_tail")
+        # Markdown state carries over between deltas; only the new text is tagged.
+        self._insert_segments("stream_tail", self._stream_markdown.feed(text), "role_assistant")
         self.chat.configure(state=tk.DISABLED)
         self.chat.see(tk.END)
 
     def finalize_assistant_stream(self, content: str) -> None:
-        self.update_assistant_stream(content.strip())
+        if self.stream_start_index is None:
+            return
+        self.chat.configure(state=tk.NORMAL)
+        if self._stream_text.shown != len(content):
+            # Nothing (or something else) was shown, e.g. "(Ei vastausta)".
+            self.chat.delete(self.stream_start_index, "stream_tail")
+            self._insert_segments("stream_tail", render_markdown(content), "role_assistant")
+        else:
+            self._insert_segments("stream_tail", self._stream_markdown.close(), "role_assistant")
+        self.chat.configure(state=tk.DISABLED)
+        self.chat.see(tk.END)
         self.stream_start_index = None
 
     def handle_stream_failure(self, message: str) -> None:
@@ -1573,7 +2194,7 @@ class JugiAIApp(tk.Tk):
     def _timestamp_now(self) -> str:
         return datetime.now().strftime("%d.%m.%Y %H:%M:%S")
 
-    def _update_ping_indicator(self, latency: Optional[int], state: str) -> None:
+    def _update_ping_indicator(self, latency: Optional[float], state: str) -> None:
         colors = {
             "ok": "#22c55e",
             "warn": "#facc15",
@@ -1582,17 +2203,12 @@ class JugiAIApp(tk.Tk):
         color = colors.get(state, "#facc15")
         try:
             self.ping_canvas.itemconfig(self.ping_indicator, fill=color)
-            # Add subtle pulse animation for "ok" state
-            if state == "ok":
+            # Add subtle pulse animation for "ok" state (nobody sees it while minimised)
+            if state == "ok" and not self._monitor.hidden:
                 self._animate_ping_pulse()
         except Exception:
             pass
-        if state == "ok" and latency is not None:
-            self.ping_var.set(f"PING: {latency} ms")
-        elif state == "warn" and latency is not None:
-            self.ping_var.set(f"PING: {latency} ms (varoitus)")
-        else:
-            self.ping_var.set("PING: -- ms (ei yhteyttä)")
+        self.ping_var.set(format_ping(self._monitor.rtt, state))
     
     def _animate_ping_pulse(self, step: int = 0) -> None:
         """Create a subtle pulsing animation for the ping indicator."""
@@ -1627,40 +2243,24 @@ class JugiAIApp(tk.Tk):
         except Exception:
             pass
 
-    def _refresh_ping(self) -> None:
-        def worker() -> None:
-            # Skip ping check if in offline mode
-            if self._is_offline_mode():
-                self.after(0, lambda: self._update_ping_indicator(None, "error"))
-                return
-            
-            api_key = self.config_dict.get("api_key", "").strip()
-            url = "https://api.openai.com/v1/models"
-            req = urllib.request.Request(url, method="GET")
-            if api_key:
-                req.add_header("Authorization", f"Bearer {api_key}")
-            start = time.time()
-            latency: Optional[int] = None
-            state = "error"
-            try:
-                with urllib.request.urlopen(req, timeout=5) as resp:
-                    resp.read(1)
-                latency = int((time.time() - start) * 1000)
-                state = "ok"
-            except urllib.error.HTTPError as e:
-                latency = int((time.time() - start) * 1000)
-                if e.code in (401, 403):
-                    state = "warn" if not api_key else "ok"
-                else:
-                    state = "warn"
-            except urllib.error.URLError:
-                state = "error"
-            except Exception:
-                state = "error"
-            self.after(0, lambda: self._update_ping_indicator(latency, state))
+    def _probe_connection(self) -> Tuple[Optional[float], str]:
+        # Skip ping check if in offline mode
+        if self._is_offline_mode():
+            return None, "error"
+        return self._ping_probe()
+
+    def _ping_path(self) -> str:
+        # One model's metadata is a few hundred bytes; /v1/models lists them all.
+        model = (self.config_dict.get("model") or DEFAULT_CONFIG["model"]).strip()
+        return "/v1/models/" + urllib.parse.quote(model, safe="")
 
-        threading.Thread(target=worker, daemon=True).start()
-        self.after(8000, self._refresh_ping)
+    def _ping_headers(self) -> Dict[str, str]:
+        api_key = (self.config_dict.get("api_key") or "").strip()
+        return {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+    def _on_window_visibility(self, event: tk.Event) -> None:
+        if event.widget is self:
+            self._monitor.set_hidden(event.type == tk.EventType.Unmap)
 
     def _newline(self, event):
         self.input.insert(tk.INSERT, "\n")
@@ -1673,6 +2273,114 @@ class JugiAIApp(tk.Tk):
     def _on_chat_scroll(self, first: str, last: str) -> None:
         self._chat_scrollbar.set(first, last)
         self._position_watermark_overlay()
+        try:
+            at_top = float(first) <= 0.0
+        except (TypeError, ValueError):
+            at_top = False
+        try:
+            at_bottom = float(last) >= 1.0
+        except (TypeError, ValueError):
+            at_bottom = False
+        if self._loading_older:
+            return
+        if at_top and self._render_window.has_older:
+            self._loading_older = True
+            self.after_idle(self._load_older_messages)
+        elif at_bottom and self._render_window.has_newer(len(self.history)):
+            self._loading_older = True
+            self.after_idle(self._load_newer_messages)
+
+    def _load_older_messages(self) -> None:
+        """Prepend the next page of older messages, keeping the visible position.
+
+        Messages beyond the scrollback are paged out at the bottom; scrolling
+        back down brings them in again (see :meth:`_load_newer_messages`).
+        """
+        try:
+            if self.stream_start_index is not None or self._is_loading_history:
+                # Paging out at the bottom would cut into the live reply; retry on the next scroll.
+                return
+            if self.chat.yview()[0] > 0.0:
+                return
+            start, end = self._render_window.next_older()
+            if start >= end:
+                return
+            self.chat.configure(state=tk.NORMAL)
+            self.chat.mark_set("history_view", "@0,0")
+            self.chat.mark_set("history_older", "1.0")
+            self.chat.mark_gravity("history_older", tk.RIGHT)
+            self._render_history_range("history_older", start, end)
+            self._page_out_messages(*self._render_window.trim_back())
+            self.chat.configure(state=tk.DISABLED)
+            self.chat.yview("history_view")
+            self.chat.mark_unset("history_older", "history_view")
+        except Exception as e:
+            _log_warning(f"Loading older messages failed: {e}")
+        finally:
+            self._loading_older = False
+
+    def _load_newer_messages(self) -> None:
+        """Append the next page of paged-out newer messages, keeping the visible position."""
+        try:
+            if self.stream_start_index is not None or self._is_loading_history:
+                return
+            if self.chat.yview()[1] < 1.0:
+                return
+            start, end = self._render_window.next_newer(len(self.history))
+            if start >= end:
+                return
+            self.chat.configure(state=tk.NORMAL)
+            self.chat.mark_set("history_view", "@0,0")
+            self._render_history_range(tk.END, start, end)
+            self._page_out_messages(*self._render_window.trim_front())
+            self.chat.configure(state=tk.DISABLED)
+            self.chat.yview("history_view")
+            self.chat.mark_unset("history_view")
+        except Exception as e:
+            _log_warning(f"Loading newer messages failed: {e}")
+        finally:
+            self._loading_older = False
+
+    def _render_history_range(self, index: str, start: int, end: int) -> None:
+        # One slice, so a page of a lazily loaded history is one range query.
+        for number, m in enumerate(self.history[start:end], start):
+            self._render_message(
+                index,
+                m.get("role", "user"),
+                m.get("content", ""),
+                m.get("timestamp") or self._timestamp_now(),
+                m.get("attachments"),
+                number=number,
+            )
+
+    def _page_out_messages(self, start: int, end: int) -> None:
+        """Delete the rendered messages ``start`` .. ``end - 1`` (a run at either edge)."""
+        if start >= end:
+            return
+        # Paged-out runs always sit at an edge, so unrendered notices next to
+        # them (e.g. errors) go too.
+        if end == self._render_window.start:
+            last = self.chat.tag_ranges(f"msg{end - 1}")
+            if last:
+                self.chat.delete("1.0", last[-1])
+        else:
+            first = self.chat.tag_ranges(f"msg{start}")
+            if first:
+                self.chat.delete(first[0], "end-1c")
+        for number in range(start, end):
+            self.chat.tag_delete(f"msg{number}")
+
+    def _clear_message_tags(self) -> None:
+        names = [name for name in self.chat.tag_names() if name.startswith("msg") and name[3:].isdigit()]
+        if names:
+            self.chat.tag_delete(*names)
+
+    def _report_time_to_interactive(self) -> None:
+        elapsed_ms = (time.perf_counter() - self._started_at) * 1000.0
+        rendered = len(self.history) - self._render_window.start
+        self._safe_log(
+            f"Time to interactive: {elapsed_ms:.0f} ms (rendered {rendered}/{len(self.history)} messages)"
+        )
 
     # --- Config persistence ---
     def load_config(self) -> Dict[str, Any]:
@@ -1689,11 +2397,67 @@ class JugiAIApp(tk.Tk):
 
     def save_config(self) -> None:
         try:
-            with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.config_dict, f, ensure_ascii=False, indent=2)
+            data = json.dumps(self.config_dict, ensure_ascii=False, indent=2).encode("utf-8")
+            self._writer.submit("config", atomic_write_bytes, CONFIG_FILE, data)
         except Exception as e:
             messagebox.showerror("Virhe", f"Asetusten tallennus epäonnistui: {e}")
 
+    def _on_persistence_error(self, key: str, exc: BaseException) -> None:
+        # Called on the writer thread.
+        _log_warning(f"Saving {key} failed: {exc}")
+        if key == "config":
+            # Via after_idle: a modal dialog inside the dispatcher frame would hold back other events.
+            message = f"Asetusten tallennus epäonnistui: {exc}"
+            self._ui.post(self.after_idle, lambda: messagebox.showerror("Virhe", message))
+
+    def flush_persistence(self, timeout: float = 5.0) -> None:
+        """Wait for queued config/history writes; called on exit."""
+        writer = getattr(self, "_writer", None)
+        if writer is None or getattr(self, "_persistence_closed", False):
+            return
+        self._persistence_closed = True
+        for cid, session in list(self._sessions.items()):
+            self._save_search_index(cid, session)
+        if not writer.close(timeout):
+            _log_warning("Pending saves did not finish before exit")
+        stats = writer.stats()
+        for key, summary in stats["latency"].items():
+            self._safe_log(format_summary(f"save[{key}]", summary))
+        self._safe_log(f"save queue: max depth {stats['max_queue_depth']}, coalesced {stats['coalesced']}")
+        ui = self._ui.stats()
+        self._safe_log(format_summary("ui frame", ui["frame_ms"]))
+        self._safe_log(format_summary("ui queue depth", ui["queue_depth"], unit=""))
+        self._safe_log(
+            f"ui events: {ui['events']}, coalesced deltas {ui['coalesced']}, "
+            f"over-budget frames {ui['over_budget_frames']}"
+        )
+        if getattr(self, "_watchdog", None) is not None:
+            watchdog = self._watchdog.stats()
+            self._safe_log(format_summary("ui lag", watchdog["lag_ms"]))
+            self._safe_log(f"ui lag histogram: {format_histogram(watchdog['histogram'])}, stalls {watchdog['stalls']}")
+
+    @staticmethod
+    def _report_ui_stall(message: str) -> None:
+        # Called on the watchdog thread (stall) or the Tk thread (recovery).
+        _log_warning(message)
+        try:
+            with open(STALL_LOG_FILE, "a", encoding="utf-8") as fh:
+                fh.write(f"[{datetime.now().isoformat(timespec='seconds')}] {message}\n")
+        except Exception:
+            pass
+
+    def _on_close(self) -> None:
+        if self._watchdog is not None:
+            self._watchdog.stop()
+        self._monitor.stop()
+        # Run what workers already handed over (e.g. a finished reply) before saving.
+        self._ui.stop()
+        self._ui.drain()
+        if self._images is not None:
+            self._images.close()
+        self.flush_persistence()
+        self.destroy()
+
     # --- Chat helpers ---
     def append_message(
         self,
@@ -1702,31 +2466,59 @@ class JugiAIApp(tk.Tk):
         *,
         timestamp: Optional[str] = None,
         attachments: Optional[List[Dict[str, Any]]] = None,
+        number: Optional[int] = None,
     ) -> None:
+        """Render a message at the bottom; ``number`` is its position in the history."""
         ts = timestamp or self._timestamp_now()
+        self.chat.configure(state=tk.NORMAL)
+        self._render_message(tk.END, role, content, ts, attachments, number=number)
+        if number is not None and self._render_window.appended(number):
+            self._page_out_messages(*self._render_window.trim_front())
+        self.chat.see(tk.END)
+        self.chat.configure(state=tk.DISABLED)
+        if not self._is_loading_history:
+            self._update_overview_metrics()
+            self._refresh_history_viewer()
+
+    def _render_message(
+        self,
+        index: str,
+        role: str,
+        content: str,
+        ts: str,
+        attachments: Optional[List[Dict[str, Any]]],
+        number: Optional[int] = None,
+    ) -> None:
+        """Insert one message at ``index`` (``tk.END`` or a right-gravity mark).
+
+        With ``number`` the inserted range is tagged ``msg<number>`` so it can
+        be paged out of the scrollback later.
+        """
+        if number is not None:
+            self.chat.mark_set("message_begin", "end-1c" if index == tk.END else index)
+            self.chat.mark_gravity("message_begin", tk.LEFT)
         display_name = "JugiAI" if role == "assistant" else "Sinä"
         header_tag = "header_assistant" if role == "assistant" else "header_user"
         separator_tag = "separator_assistant" if role == "assistant" else "separator_user"
         body_tag = "role_assistant" if role == "assistant" else "role_user"
         content = (content or "").strip()
 
-        self.chat.configure(state=tk.NORMAL)
-        
         # For assistant messages, try to show logo instead of text prefix
         if role == "assistant":
             logo_img = self._load_message_logo()
             if logo_img:
-                self._logo_refs.append(logo_img)  # Keep reference
-                self.chat.image_create(tk.END, image=logo_img)
-                self.chat.insert(tk.END, " ", (separator_tag,))
+                self.chat.image_create(index, image=logo_img)
+                self.chat.insert(index, " ", (separator_tag,))
             else:
-                self.chat.insert(tk.END, "▮ ", (separator_tag,))
+                self.chat.insert(index, "▮ ", (separator_tag,))
         else:
-            self.chat.insert(tk.END, "▮ ", (separator_tag,))
-            
-        self.chat.insert(tk.END, f"{display_name} · {ts}\n", (header_tag,))
-        if content:
-            self.chat.insert(tk.END, content + "\n", (body_tag,))
+            self.chat.insert(index, "▮ ", (separator_tag,))
+
+        self.chat.insert(index, f"{display_name} · {ts}\n", (header_tag,))
+        if content and role == "assistant":
+            self._insert_segments(index, render_markdown(content + "\n"), body_tag)
+        elif content:
+            self.chat.insert(index, content + "\n", (body_tag,))
         if attachments:
             for att in attachments:
                 name = att.get("name", "tuntematon")
@@ -1734,16 +2526,24 @@ class JugiAIApp(tk.Tk):
                 size = att.get("size")
                 size_text = f", {size} tavua" if isinstance(size, int) else ""
                 self.chat.insert(
-                    tk.END,
+                    index,
                     f"   📎 {name} ({mime}{size_text})\n",
                     ("attachment",),
                 )
-        self.chat.insert(tk.END, "\n")
-        self.chat.see(tk.END)
-        self.chat.configure(state=tk.DISABLED)
-        if not self._is_loading_history:
-            self._update_overview_metrics()
-            self._refresh_history_viewer()
+        self.chat.insert(index, "\n")
+        if number is not None:
+            self.chat.tag_add(f"msg{number}", "message_begin", "end-1c" if index == tk.END else index)
+            self.chat.mark_unset("message_begin")
+
+    def _insert_segments(self, index: str, segments: List[Segment], base_tag: str) -> None:
+        """Insert Markdown segments in one Tk call, each tagged ``base_tag`` plus its own tags."""
+        if not segments:
+            return
+        args: List[Any] = []
+        for text, tags in segments:
+            args.append(text)
+            args.append((base_tag,) + tags)
+        self.chat.insert(index, *args)
 
     def append_error(self, content: str) -> None:
         self.chat.configure(state=tk.NORMAL)
@@ -1773,7 +2573,12 @@ class JugiAIApp(tk.Tk):
         # UI-tila ja viestit
         self.input.delete("1.0", tk.END)
         display_text = text if text else "(Liitteet lähetetty)"
-        self.append_message("user", display_text, timestamp=timestamp, attachments=attachments)
+        if self._render_window.has_newer(len(self.history)):
+            # Scrolled far back with the tail paged out: jump back to the newest page.
+            self._render_active_history()
+        self.append_message(
+            "user", display_text, timestamp=timestamp, attachments=attachments, number=len(self.history)
+        )
 
         history_entry = {
             "role": "user",
@@ -1823,39 +2628,72 @@ class JugiAIApp(tk.Tk):
 
     # --- Model call ---
     def _worker_call_openai(self) -> None:
-        accumulated = ""
+        parts: List[str] = []
+        trace = StreamTrace(self._trace_model_name())
+        self._stream_trace = trace
         try:
             for chunk in self.stream_model_backend():
                 if not chunk:
                     continue
-                accumulated += chunk
-                text_snapshot = accumulated
-                self.after(0, lambda t=text_snapshot: self.update_assistant_stream(t))
+                trace.chunk(chunk)
+                parts.append(chunk)
+                # Deltas queued within one frame reach the widget as a single insert.
+                self._ui.post_delta("assistant", self.update_assistant_stream, chunk)
         except Exception as e:
-            msg = str(e)
-            self.after(0, lambda m=msg: self.handle_stream_failure(m))
-            self.after(0, lambda: self.set_busy(False))
-            self.after(0, lambda: setattr(self, '_is_sending', False))
-            self.current_stream_timestamp = None
+            self._ui.post(self._fail_assistant_reply, str(e))
             return
+        finally:
+            self._stream_trace = None
+        trace.finish()
 
-        final_text = accumulated.strip()
+        final_text = "".join(parts).strip()
         if not final_text:
             final_text = "(Ei vastausta)"
+        self._ui.post(self._finish_assistant_reply, final_text, trace)
+
+    def _trace_model_name(self) -> str:
+        cfg = self.config_dict
+        if (cfg.get("backend", "openai") or "openai").lower() == "local":
+            return os.path.basename(cfg.get("local_model_path") or "") or "local"
+        return str(cfg.get("model") or "?")
+
+    def _tag_streamed_message(self, number: int) -> None:
+        """Give the finished streamed reply its message tag and trim the scrollback."""
+        try:
+            self.chat.tag_add(f"msg{number}", "stream_message", "end-1c")
+            self.chat.mark_unset("stream_message")
+            if self._render_window.appended(number):
+                self.chat.configure(state=tk.NORMAL)
+                self._page_out_messages(*self._render_window.trim_front())
+                self.chat.configure(state=tk.DISABLED)
+                self.chat.see(tk.END)
+        except tk.TclError:
+            pass
+
+    def _fail_assistant_reply(self, message: str) -> None:
+        self.handle_stream_failure(message)
+        self.set_busy(False)
+        self._is_sending = False
+        self.current_stream_timestamp = None
+
+    def _finish_assistant_reply(self, final_text: str, trace: Optional[StreamTrace] = None) -> None:
         timestamp = self.current_stream_timestamp or self._timestamp_now()
-        history_entry = {
+        entry: Dict[str, Any] = {
             "role": "assistant",
             "content": final_text,
             "attachments": [],
             "timestamp": timestamp,
         }
-        self.history.append(history_entry)
-        self.after(0, lambda text=final_text: self.finalize_assistant_stream(text))
-        self.after(0, self.save_history)
-        self.after(0, self._update_overview_metrics)
-        self.after(0, self._refresh_history_viewer)
-        self.after(0, lambda: self.set_busy(False))
-        self.after(0, lambda: setattr(self, '_is_sending', False))
+        if trace is not None and len(trace.gaps):
+            entry["timing"] = trace.to_dict()
+        self.history.append(entry)
+        self.finalize_assistant_stream(final_text)
+        self._tag_streamed_message(len(self.history) - 1)
+        self.save_history()
+        self._update_overview_metrics()
+        self._refresh_history_viewer()
+        self.set_busy(False)
+        self._is_sending = False
         self.current_stream_timestamp = None
 
     def stream_model_backend(self) -> Generator[str, None, None]:
@@ -1894,16 +2732,52 @@ class JugiAIApp(tk.Tk):
         
         return requested_threads
 
-    def _build_messages_for_backend(self) -> List[Dict[str, Any]]:
+    def _attachment_token_budget(self) -> int:
+        try:
+            return int(self.config_dict.get("attachment_token_budget", DEFAULT_TOKEN_BUDGET))
+        except (TypeError, ValueError):
+            return DEFAULT_TOKEN_BUDGET
+
+    def _build_messages_for_backend(self, streaming: bool = False) -> List[Dict[str, Any]]:
         cfg = self.config_dict
         messages: List[Dict[str, Any]] = []
         sys_prompt = (cfg.get("system_prompt") or "").strip()
         if sys_prompt:
             messages.append({"role": "system", "content": sys_prompt})
-        for msg in self.history:
-            role = msg.get("role", "user")
-            messages.append({"role": role, "content": self._compose_message_for_backend(msg)})
+        policy = cfg.get("attachment_history_policy", DEFAULT_CONFIG["attachment_history_policy"])
+        try:
+            keep_turns = int(cfg.get("attachment_keep_turns", 3))
+        except (TypeError, ValueError):
+            keep_turns = 3
+        budget = self._attachment_token_budget()
+        saved = 0
+        plan: List[Tuple[Dict[str, Any], str]] = []
+        for msg, age in zip(self.history, user_turn_ages(self.history)):
+            mode = resolve_attachment_mode(policy, age, keep_turns)
+            if mode != "full":
+                saved += sum(estimate_encoded_size(att, budget) for att in msg.get("attachments") or [])
+            plan.append((msg, mode))
+        # One attachment budget for the whole request, spent newest message first
+        # so older attachments are the ones cut when it runs out.
+        shared = AttachmentBudget(budget)
+        contents = [
+            self._compose_message_for_backend(msg, mode, streaming=streaming, budget=shared)
+            for msg, mode in reversed(plan)
+        ]
+        for (msg, _mode), content in zip(plan, reversed(contents)):
+            messages.append({"role": msg.get("role", "user"), "content": content})
+        self._ui.post(self._show_attachment_savings, saved)
         return messages
+
+    def _show_attachment_savings(self, saved_bytes: int) -> None:
+        if not hasattr(self, "attachment_savings_var"):
+            return
+        if saved_bytes > 0:
+            self.attachment_savings_var.set(
+                f"Aiemmat liitteet: säästetty ~{format_byte_count(saved_bytes)} tässä pyynnössä"
+            )
+        else:
+            self.attachment_savings_var.set("")
     
     def _build_messages_for_backend_with_context_limit(self) -> List[Dict[str, Any]]:
         """
@@ -1960,22 +2834,27 @@ class JugiAIApp(tk.Tk):
         
         return result
 
-    def _compose_message_for_backend(self, message: Dict[str, Any]) -> str:
+    def _compose_message_for_backend(
+        self,
+        message: Dict[str, Any],
+        attachment_mode: str = "full",
+        streaming: bool = False,
+        budget: Optional[AttachmentBudget] = None,
+    ) -> Any:
+        """Return the message text; with ``streaming`` binary attachments stay lazy.
+
+        ``budget`` is shared with the other messages of the same request.
+        """
         text = (message.get("content") or "").strip()
         attachments = message.get("attachments") or []
         if not attachments:
             return text
-        lines = [text] if text else []
-        lines.append("Liitteet (base64-muodossa):")
-        for att in attachments:
-            name = att.get("name", "liite")
-            mime = att.get("mime", "tuntematon")
-            size = att.get("size")
-            size_info = f", {size} tavua" if isinstance(size, int) else ""
-            data = att.get("data", "")
-            lines.append(f"{name} ({mime}{size_info})")
-            lines.append(f"BASE64:{data}")
-        return "\n".join(lines)
+        lines: List[Any] = [text] if text else []
+        if budget is None:
+            budget = AttachmentBudget(self._attachment_token_budget())
+        lines.extend(compose_attachment_lines(attachments, budget, attachment_mode))
+        content = join_lines(lines)
+        return content if streaming else str(content)
 
     def _call_openai_stream(self) -> Generator[str, None, None]:
         # Check offline mode first
@@ -1993,7 +2872,7 @@ class JugiAIApp(tk.Tk):
         url = "https://api.openai.com/v1/chat/completions"
         payload: Dict[str, Any] = {
             "model": cfg.get("model", "gpt-4o-mini"),
-            "messages": self._build_messages_for_backend(),
+            "messages": self._build_messages_for_backend(streaming=True),
             "temperature": float(cfg.get("temperature", 0.7)),
             "top_p": float(cfg.get("top_p", 1.0)),
             "presence_penalty": float(cfg.get("presence_penalty", 0.0)),
@@ -2004,20 +2883,31 @@ class JugiAIApp(tk.Tk):
         if isinstance(max_tokens, int) and max_tokens > 0:
             payload["max_tokens"] = max_tokens
 
-        data = json.dumps(payload).encode("utf-8")
-        req = urllib.request.Request(
-            url,
-            data=data,
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_key}",
-            },
-            method="POST",
-        )
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+        # The body is written in chunks as it is sent; attachments are read
+        # from disk and base64-encoded on the fly.
+        req = urllib.request.Request(url, data=iter_json_body(payload), headers=headers, method="POST")
 
         try:
-            with urllib.request.urlopen(req, timeout=90) as resp:
+            try:
+                resp = urllib.request.urlopen(req, timeout=90)
+            except urllib.error.HTTPError as e:
+                if e.code != 411:
+                    raise
+                self._safe_log("Chunked request body rejected (411); retrying with a buffered body.")
+                buffered = b"".join(iter_json_body(payload))
+                req = urllib.request.Request(url, data=buffered, headers=headers, method="POST")
+                resp = urllib.request.urlopen(req, timeout=90)
+            trace = self._stream_trace
+            if trace is not None:
+                trace.mark_connect()
+            with resp:
                 for raw_line in resp:
+                    if trace is not None:
+                        trace.mark_first_byte()
                     line = raw_line.strip()
                     if not line:
                         continue
@@ -2131,12 +3021,15 @@ class JugiAIApp(tk.Tk):
         except Exception:
             # Fallback yksinkertaiseen prompttiin
             sys_prompt = (cfg.get("system_prompt") or "").strip()
+            budget = AttachmentBudget(self._attachment_token_budget())  # newest first, as above
             user_texts = "\n\n".join(
-                [
-                    self._compose_message_for_backend(m)
-                    for m in self.history
-                    if m.get("role") == "user"
-                ]
+                reversed(
+                    [
+                        str(self._compose_message_for_backend(m, budget=budget))
+                        for m in reversed(self.history)
+                        if m.get("role") == "user"
+                    ]
+                )
             )
             prompt = (sys_prompt + "\n\n" + user_texts).strip()
             
@@ -2164,48 +3057,754 @@ class JugiAIApp(tk.Tk):
             yield buffer
 
     # --- Persistence ---
-    def load_history(self) -> None:
-        self._is_loading_history = True
-        if os.path.exists(HISTORY_FILE):
+    def _conversation_history_paths(self, cid: int) -> Tuple[str, str]:
+        """Snapshot and journal paths of conversation ``cid`` (JSON backend)."""
+        if cid == DEFAULT_CONVERSATION_ID:
+            # The original single history keeps its location.
+            return HISTORY_FILE, HISTORY_JOURNAL_FILE
+        os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
+        base = os.path.join(CONVERSATIONS_DIR, f"history-{cid}")
+        return base + ".json", base + ".jsonl"
+
+    def _create_history_store(self, cid: int) -> Any:
+        """Return the configured history store (SQLite or JSON snapshot + journal)."""
+        snapshot_path, journal_path = self._conversation_history_paths(cid)
+        journal = HistoryJournal(snapshot_path, journal_path)
+        if str(self.config_dict.get("history_backend", "json")).lower() != "sqlite":
+            return journal
+        try:
+            store = SQLiteHistoryStore(HISTORY_DB_FILE, conversation_id=cid)
+            count, _last = store.stats()
+            if count == 0 and (os.path.exists(snapshot_path) or os.path.exists(journal_path)):
+                # One-time migration of the JSON history into the database.
+                store.rewrite(journal.load(), reset=True)
+                self._report_quarantined(cid, journal)
+            return store
+        except Exception as e:
+            _log_warning(f"SQLite history unavailable, using JSON: {e}")
+            return journal
+
+    def _open_session(self, cid: int) -> Dict[str, Any]:
+        """Return the cached session of ``cid``, reading its store on first use only.
+
+        ``cid`` must not be in ``_archiving``; switch_conversation waits for that.
+        """
+        session = self._sessions.get(cid)
+        if session is None:
+            store = self._create_history_store(cid)
+            entry = self._conversations.get(cid) or {}
             try:
-                with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                if isinstance(data, list):
-                    self.history = data
+                if entry.get("archived"):
+                    history = self._restore_archived(cid, entry["archived"], store)
+                elif isinstance(store, SQLiteHistoryStore):
+                    # Only the newest page is read; older rows are queried when scrolled to.
+                    history = LazyHistory(store, self._render_window.page_size)
                 else:
-                    self.history = []
-                for m in self.history:
-                    self.append_message(
-                        m.get("role", "user"),
-                        m.get("content", ""),
-                        timestamp=m.get("timestamp"),
-                        attachments=m.get("attachments"),
-                    )
-            except Exception:
-                self.history = []
-        self._is_loading_history = False
-        self._update_overview_metrics()
-        self._refresh_history_viewer()
+                    # Snapshot (history.json) + replay of the append-only journal.
+                    history = store.load()
+                    self._report_quarantined(cid, store)
+            except Exception as e:
+                _log_warning(f"Loading conversation {cid} failed: {e}")
+                history = []
+            sync = HistorySync(store)
+            sync.reset_to(len(history))
+            session = {"history": history, "store": store, "sync": sync, "epoch": 0}
+            self._sessions[cid] = session
+        return session
+
+    @staticmethod
+    def _report_quarantined(cid: int, journal: HistoryJournal) -> None:
+        if journal.quarantined:
+            _log_warning(
+                f"History of conversation {cid} was unreadable and was moved aside: "
+                + ", ".join(journal.quarantined)
+            )
 
-    def save_history(self) -> None:
+    def _use_session(self, cid: int, stash: bool = True) -> None:
+        """Make ``cid`` the active conversation; the previous one stays cached."""
+        active = self._conversations.active_id
+        if stash and active in self._sessions:
+            self._sessions[active].update(
+                history=self.history,
+                store=self._history_store,
+                sync=self._history_sync,
+                epoch=self._history_epoch,
+            )
+        session = self._open_session(cid)
+        self.history = session["history"]
+        self._history_store = session["store"]
+        self._history_sync = session["sync"]
+        self._history_epoch = session["epoch"]
+        self._conversations.active_id = cid
+        self._conversations.update_from_history(cid, self.history)
+        self._active_vector_store()
+
+    def _render_active_history(self) -> None:
+        """Redraw the transcript with the newest page of the active conversation."""
+        self._is_loading_history = True
         try:
-            with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.history, f, ensure_ascii=False, indent=2)
-        except Exception:
-            pass
+            self.chat.configure(state=tk.NORMAL)
+            self.chat.delete("1.0", tk.END)
+            self._clear_message_tags()
+            # Render only the newest page; older pages load when scrolled to the top.
+            start, end = self._render_window.reset(len(self.history))
+            self._render_history_range(tk.END, start, end)
+            self.chat.see(tk.END)
+            self.chat.configure(state=tk.DISABLED)
+        finally:
+            self._is_loading_history = False
+
+    def load_history(self) -> None:
+        self._use_session(self._conversations.active_id)
+        self._render_active_history()
+        self._save_conversation_index()
+        self._refresh_conversation_list()
+        self._update_overview_metrics()
+        self._refresh_history_viewer()
+
+    def save_history(self, reset: bool = False) -> None:
+        """Queue a history save; ``reset`` rewrites the whole history.
+
+        The writer thread appends new entries (or rewrites after a reset);
+        queued saves coalesce into one write of the latest snapshot.
+        """
+        if reset:
+            self._history_epoch += 1
+        cid = self._conversations.active_id
+        try:
+            history = self.history
+            snapshot = history.snapshot() if isinstance(history, LazyHistory) else list(history)
+            self._writer.submit(f"history:{cid}", self._history_sync.sync, snapshot, self._history_epoch)
+        except Exception as e:
+            _log_warning(f"History save failed: {e}")
+        self._conversations.update_from_history(cid, self.history, reset=reset)
+        self._update_search_index(reset)
+        self._update_vector_store(reset)
+        self._save_conversation_index()
+        self._refresh_conversation_list()
+
+    def _history_synced(self) -> bool:
+        """True when the store holds exactly the in-memory history."""
+        return self._writer.is_idle() and self._history_sync.synced_count == len(self.history)
+
+    @staticmethod
+    def _search_index_path(store: Any) -> Optional[str]:
+        """Inverted index file next to a JSON history; SQLite uses its FTS5 table."""
+        if isinstance(store, HistoryJournal):
+            return os.path.splitext(store.snapshot_path)[0] + ".index"
+        return None
+
+    def _active_search_index(self) -> Optional[InvertedIndex]:
+        """Search index of the active conversation, loaded and caught up on first use."""
+        session = self._sessions.get(self._conversations.active_id)
+        path = self._search_index_path(self._history_store)
+        if session is None or path is None:
+            return None
+        index = session.get("search")
+        if index is None:
+            started = time.perf_counter()
+            index = InvertedIndex.load(path)
+            added = index.sync(message_texts(self.history))
+            session["search"] = index
+            session["search_saved"] = index.doc_count - added
+            self._safe_log(
+                f"Search index ready: {index.doc_count} messages ({added} indexed) in "
+                f"{(time.perf_counter() - started) * 1000.0:.0f} ms"
+            )
+        return index
+
+    def _update_search_index(self, reset: bool) -> None:
+        cid = self._conversations.active_id
+        session = self._sessions.get(cid)
+        index = session.get("search") if session else None
+        if index is None:
+            return
+        if reset or index.doc_count > len(self.history):
+            index.clear()
+            session["search_saved"] = -SEARCH_INDEX_SAVE_EVERY
+        for pos in range(index.doc_count, len(self.history)):
+            index.add(pos, self.history[pos].get("content") or "")
+        if index.doc_count - session.get("search_saved", 0) >= SEARCH_INDEX_SAVE_EVERY:
+            self._save_search_index(cid, session)
+
+    def _save_search_index(self, cid: int, session: Dict[str, Any]) -> None:
+        index = session.get("search")
+        path = self._search_index_path(session.get("store"))
+        if index is None or path is None or not index.dirty:
+            return
+        session["search_saved"] = index.doc_count
+        try:
+            self._writer.submit(f"search:{cid}", index.save, path)
+        except Exception as e:
+            _log_warning(f"Search index save failed: {e}")
+
+    # --- Semantic search ---
+    def _semantic_enabled(self) -> bool:
+        cfg = self.config_dict
+        model = (cfg.get("embedding_model_path") or cfg.get("local_model_path") or "").strip()
+        return bool(cfg.get("semantic_search")) and NUMPY_AVAILABLE and bool(model)
+
+    @staticmethod
+    def _vector_store_path(cid: int) -> str:
+        return os.path.join(CONVERSATIONS_DIR, f"vectors-{cid}.f32")
+
+    def _embedding_model_id(self) -> str:
+        cfg = self.config_dict
+        path = (cfg.get("embedding_model_path") or cfg.get("local_model_path") or "").strip()
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        return f"{os.path.basename(path)}:{size}"
+
+    def _embed_texts(self, texts: List[str]) -> List[Any]:
+        # Called from the indexer / search threads; the manager serializes access.
+        return _local_model_manager.embed(texts, dict(self.config_dict), self._safe_log)
+
+    def _active_vector_store(self) -> Optional[VectorStore]:
+        """Vector store of the active conversation; queues missing embeddings on first use."""
+        if not self._semantic_enabled():
+            return None
+        cid = self._conversations.active_id
+        session = self._sessions.get(cid)
+        if session is None:
+            return None
+        store = session.get("vectors")
+        if store is None:
+            try:
+                os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
+                store = VectorStore(self._vector_store_path(cid), self._embedding_model_id())
+            except Exception as e:
+                _log_warning(f"Semantic index unavailable: {e}")
+                return None
+            # Only the length and one message are checked here; the texts to embed
+            # are collected on the indexer thread (a lazy history reads them from SQL).
+            total = len(self.history)
+            last = str(self.history[store.count - 1].get("content") or "") if 0 < store.count <= total else ""
+            if store.count > total or not store.matches_last(last):
+                store.reset()
+            if self._embedding_indexer is None:
+                self._embedding_indexer = EmbeddingIndexer(
+                    self._embed_texts, on_error=lambda exc: _log_warning(f"Embedding failed: {exc}")
+                )
+            self._queue_embeddings(store, store.count, total)
+            session["vectors"] = store
+            session["vectors_queued"] = total
+        return store
+
+    def _queue_embeddings(self, store: VectorStore, start: int, end: int) -> None:
+        """Queue messages ``start`` .. ``end - 1`` of the active history for embedding."""
+        history = self.history
+        # A snapshot, so the indexer thread reads a fixed tail (older rows come from SQL).
+        source = history.snapshot() if isinstance(history, LazyHistory) else history
+        self._embedding_indexer.enqueue_lazy(store, start, lambda: message_texts(source[start:end]))
+
+    def _update_vector_store(self, reset: bool) -> None:
+        session = self._sessions.get(self._conversations.active_id)
+        store = session.get("vectors") if session else None
+        if store is None or self._embedding_indexer is None:
+            return
+        queued = session.get("vectors_queued", 0)
+        if reset or queued > len(self.history):
+            store.reset()
+            queued = 0
+        # From store.count if it fell behind (batches dropped while the indexer backed
+        # off); rows stored by work queued earlier are skipped by the indexer.
+        self._queue_embeddings(store, min(queued, store.count), len(self.history))
+        session["vectors_queued"] = len(self.history)
+
+    def _start_semantic_search(self, query: str) -> None:
+        viewer = self._history_viewer
+        store = self._active_vector_store()
+        if not viewer:
+            return
+        if store is None:
+            viewer["status_var"].set("Semanttinen haku ei ole käytössä (numpy + paikallinen malli)")
+            return
+        cid = self._conversations.active_id
+        viewer["status_var"].set("Semanttinen haku…")
+
+        def _worker() -> None:
+            error: Optional[BaseException] = None
+            hits: List[Tuple[int, float]] = []
+            try:
+                vector = pool_embedding(self._embed_texts([prepare_text(query)])[0])
+                hits = store.search(vector, limit=50)
+            except Exception as e:
+                error = e
+            self._ui.post(self._show_semantic_results, cid, query, hits, error)
+
+        threading.Thread(target=_worker, name="semantic-search", daemon=True).start()
+
+    def _show_semantic_results(
+        self, cid: int, query: str, hits: List[Tuple[int, float]], error: Optional[BaseException]
+    ) -> None:
+        viewer = self._history_viewer
+        if not viewer or cid != self._conversations.active_id:
+            return
+        if error is not None:
+            viewer["status_var"].set(f"Semanttinen haku epäonnistui: {error}")
+            return
+        rows: List[Tuple[int, Optional[str], str, str]] = []
+        for idx, score in hits:
+            if idx < len(self.history):
+                entry = self.history[idx]
+                snippet = " ".join((entry.get("content") or "").split())[:60]
+                rows.append((idx, entry.get("timestamp"), entry.get("role", "?"), f"{score:.2f} · {snippet}"))
+        viewer["semantic"] = (query, rows)
+        self._refresh_history_viewer()
+        pending = self._embedding_indexer.pending() if self._embedding_indexer else 0
+        suffix = f" · indeksointi kesken ({pending} erää)" if pending else ""
+        viewer["status_var"].set(f"Semanttisia osumia: {len(rows)}{suffix}")
+
+    @classmethod
+    def _remove_vector_files(cls, cid: int) -> None:
+        path = cls._vector_store_path(cid)
+        cls._remove_file(path)
+        cls._remove_file(path + ".json")
+
+    @staticmethod
+    def _remove_file(path: Optional[str]) -> None:
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                _log_warning(f"Removing {path} failed: {e}")
+
+    def _save_conversation_index(self) -> None:
+        try:
+            self._writer.submit("conversations", self._write_conversation_index, self._conversations.to_bytes())
+        except Exception as e:
+            _log_warning(f"Conversation index save failed: {e}")
+
+    @staticmethod
+    def _write_conversation_index(data: bytes) -> None:
+        os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
+        atomic_write_bytes(CONVERSATIONS_INDEX_FILE, data)
 
     def clear_history(self) -> None:
         if not messagebox.askyesno("Vahvista", "Tyhjennetäänkö keskustelu?"):
             return
         self.history = []
+        self._render_window.reset(0)
         self.chat.configure(state=tk.NORMAL)
         self.chat.delete("1.0", tk.END)
+        self._clear_message_tags()
         self.chat.configure(state=tk.DISABLED)
-        self.save_history()
+        self._conversations.update(self._conversations.active_id, title="")
+        self.save_history(reset=True)
+        self._schedule_blob_gc()
         self._insert_watermark_if_needed()
         self._update_overview_metrics()
         self._refresh_history_viewer()
 
+    # --- Conversations ---
+    def _can_switch_conversation(self) -> bool:
+        if self._is_sending:
+            messagebox.showinfo("Odota", "Odota, että vastaus valmistuu ennen keskustelun vaihtamista.")
+            return False
+        return True
+
+    def switch_conversation(self, cid: int) -> None:
+        self._pending_switch = None  # a newer choice supersedes one still waiting
+        if cid == self._conversations.active_id or cid not in self._conversations:
+            self._refresh_conversation_list()
+            return
+        if not self._can_switch_conversation():
+            self._refresh_conversation_list()
+            return
+        if self._import_state is not None and cid in self._import_state["cids"].values():
+            messagebox.showinfo("Odota", "Keskustelua tuodaan vielä. Avaa se, kun tuonti on valmis.")
+            self._refresh_conversation_list()
+            return
+        if cid in self._archiving:
+            # Open it once the archive jobs ahead of it on the writer have run.
+            self._pending_switch = cid
+            self._wait_for_archive(cid)
+            return
+        self._stop_history_playback()
+        self._use_session(cid)
+        self._render_active_history()
+        self._save_conversation_index()
+        self._refresh_conversation_list()
+        self._update_overview_metrics()
+        self._refresh_history_viewer()
+
+    def new_conversation(self) -> None:
+        if not self._can_switch_conversation():
+            return
+        entry = self._conversations.create()
+        self.switch_conversation(entry["id"])
+
+    def delete_conversation(self) -> None:
+        if not self._can_switch_conversation():
+            return
+        cid = self._conversations.active_id
+        title = display_title(self._conversations.get(cid) or {"id": cid})
+        if not messagebox.askyesno("Vahvista", f"Poistetaanko keskustelu \"{title}\"?"):
+            return
+        store = self._history_store
+        session = self._sessions.pop(cid, None) or {}
+        if session.get("vectors") is not None:
+            session["vectors"].reset()  # also drops embedding batches still queued for it
+        self._conversations.remove(cid)
+        if not len(self._conversations):
+            self._conversations.create()
+        # Queued under the same key, so a pending save of this conversation is dropped.
+        self._writer.submit(f"history:{cid}", store.discard)
+        self._writer.submit(f"search:{cid}", self._remove_file, self._search_index_path(store))
+        self._writer.submit(f"vectors:{cid}", self._remove_vector_files, cid)
+        self._stop_history_playback()
+        fallback = next((e["id"] for e in self._conversations.entries() if e["id"] not in self._archiving), None)
+        if fallback is None:
+            fallback = self._conversations.create()["id"]
+        self._use_session(fallback, stash=False)
+        self._schedule_blob_gc()  # after the switch: the deleted history is no longer live
+        self._render_active_history()
+        self._save_conversation_index()
+        self._refresh_conversation_list()
+        self._update_overview_metrics()
+        self._refresh_history_viewer()
+
+    # --- Export / import ---
+    def export_conversation(self) -> None:
+        """Stream the active conversation to a JSONL, Markdown or HTML file."""
+        cid = self._conversations.active_id
+        title = display_title(self._conversations.get(cid) or {"id": cid})
+        path = filedialog.asksaveasfilename(
+            title="Vie keskustelu",
+            defaultextension=".md",
+            initialfile=f"keskustelu-{cid}.md",
+            filetypes=[("Markdown", "*.md"), ("HTML", "*.html"), ("JSON Lines", "*.jsonl")],
+        )
+        if not path:
+            return
+        self.transfer_status_var.set("Viedään…")
+        # Queued after any pending save of this conversation, so the file is complete.
+        self._writer.submit(f"export:{time.monotonic_ns()}", self._export_job, self._history_store, path, title)
+        self._exports_pending += 1
+        if self._exports_pending == 1:
+            self._poll_export_results()
+
+    def _export_job(self, store: Any, path: str, title: str) -> None:
+        # Runs on the writer thread; reads the store page by page.
+        try:
+            self._export_results.append((path, write_export(store.iter_messages(), path, title=title)))
+        except Exception as e:
+            _log_warning(f"Export to {path} failed: {e}")
+            self._export_results.append((path, e))
+
+    def _poll_export_results(self) -> None:
+        while self._export_results:
+            path, result = self._export_results.pop(0)
+            self._exports_pending -= 1
+            if isinstance(result, Exception):
+                self.transfer_status_var.set("")
+                messagebox.showerror("Vienti epäonnistui", f"{path}\n\n{result}")
+                continue
+            summary = format_throughput(result["messages"], result["bytes"], result["seconds"])
+            self.transfer_status_var.set(f"Viety: {os.path.basename(path)}")
+            self._safe_log(f"Exported {path}: {summary}")
+            messagebox.showinfo("Vienti valmis", f"{path}\n\n{summary}")
+        if self._exports_pending > 0:
+            self.after(200, self._poll_export_results)
+
+    def import_conversations(self) -> None:
+        """Import conversations from a (possibly very large) JSON or JSON Lines export."""
+        if self._import_state is not None:
+            messagebox.showinfo("Tuonti käynnissä", "Edellinen tuonti on vielä kesken.")
+            return
+        path = filedialog.askopenfilename(
+            title="Tuo keskusteluja",
+            filetypes=[("JSON / JSON Lines", "*.json *.jsonl *.ndjson"), ("Kaikki tiedostot", "*.*")],
+        )
+        if not path:
+            return
+        state: Dict[str, Any] = {
+            "path": path,
+            # Bounded: the parser waits while the Tk thread and writer catch up.
+            "queue": queue.Queue(maxsize=8),
+            "bytes": 0,
+            "total_bytes": os.path.getsize(path),
+            "messages": 0,
+            "cids": {},
+            "counts": {},
+            "store": None,
+            "error": None,
+            "started": time.perf_counter(),
+        }
+        self._import_state = state
+        threading.Thread(target=self._import_worker, args=(state,), name="history-import", daemon=True).start()
+        self._poll_import()
+
+    @staticmethod
+    def _import_worker(state: Dict[str, Any]) -> None:
+        def _on_read(count: int) -> None:
+            state["bytes"] += count
+
+        try:
+            for batch in iter_import(state["path"], on_read=_on_read):
+                state["queue"].put(batch)
+        except Exception as e:
+            state["error"] = e
+        finally:
+            state["queue"].put(None)
+
+    def _close_import_store(self, state: Dict[str, Any]) -> None:
+        store = state.get("store")
+        close = getattr(store, "close", None)
+        if close is not None:
+            self._writer.submit(f"import-close:{id(store)}", close)
+        state["store"] = None
+
+    def _poll_import(self) -> None:
+        state = self._import_state
+        if state is None:
+            return
+        finished = False
+        for _ in range(8):
+            if self._writer.queue_depth() >= 16:
+                break
+            try:
+                item = state["queue"].get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                finished = True
+                break
+            ordinal, title, messages = item
+            cid = state["cids"].get(ordinal)
+            if cid is None:
+                self._close_import_store(state)
+                if len(title) > TITLE_MAX_CHARS:
+                    title = title[: TITLE_MAX_CHARS - 1] + "…"
+                cid = state["cids"][ordinal] = self._conversations.create(title)["id"]
+                state["store"] = self._create_history_store(cid)
+            start = state["counts"].get(cid, 0)
+            self._writer.submit(f"import:{cid}:{start}", state["store"].extend, start, messages)
+            state["counts"][cid] = start + len(messages)
+            state["messages"] += len(messages)
+            entry = self._conversations.get(cid) or {}
+            self._conversations.update(
+                cid,
+                message_count=start + len(messages),
+                size_bytes=int(entry.get("size_bytes") or 0)
+                + sum(len(m["content"].encode("utf-8")) for m in messages),
+                last_timestamp=next((m["timestamp"] for m in reversed(messages) if m["timestamp"]), None)
+                or entry.get("last_timestamp"),
+                updated_at=time.time(),
+            )
+        elapsed = time.perf_counter() - state["started"]
+        total = state["total_bytes"] or 1
+        self.transfer_status_var.set(
+            f"Tuodaan {min(100, state['bytes'] * 100 // total)} % · "
+            f"{format_throughput(state['messages'], state['bytes'], elapsed)}"
+        )
+        if not finished:
+            self.after(100, self._poll_import)
+            return
+        self._close_import_store(state)
+        self._import_state = None
+        self._save_conversation_index()
+        self._refresh_conversation_list()
+        summary = (
+            f"Keskusteluja: {len(state['cids'])}\n"
+            f"{format_throughput(state['messages'], state['bytes'], elapsed)}"
+        )
+        self.transfer_status_var.set(f"Tuotu {len(state['cids'])} keskustelua")
+        self._safe_log(f"Imported {state['path']}: {summary}")
+        if state["error"] is not None:
+            messagebox.showerror("Tuonti keskeytyi", f"{state['error']}\n\nTuotu ennen virhettä:\n{summary}")
+        else:
+            messagebox.showinfo("Tuonti valmis", summary)
+
+    # --- Archival ---
+    def _restore_archived(self, cid: int, info: Dict[str, Any], store: Any) -> List[Dict[str, Any]]:
+        """Decompress an archived conversation back into ``store``."""
+        started = time.perf_counter()
+        history = restore_store(os.path.join(ARCHIVE_DIR, info["file"]), store)
+        self._conversations.update(cid, archived=None)
+        self._safe_log(
+            f"Restored archived conversation {cid}: {len(history)} messages in "
+            f"{(time.perf_counter() - started) * 1000.0:.0f} ms"
+        )
+        return history
+
+    def archive_idle_conversations(self, report: bool = False) -> None:
+        """Queue archival of conversations idle for ``archive_after_days`` days."""
+        try:
+            days = float(self.config_dict.get("archive_after_days", DEFAULT_ARCHIVE_AFTER_DAYS))
+        except (TypeError, ValueError):
+            days = float(DEFAULT_ARCHIVE_AFTER_DAYS)
+        fmt = self.config_dict.get("archive_format", DEFAULT_ARCHIVE_FORMAT)
+        # Never archive the open conversation or one that is cached in memory.
+        exclude = {self._conversations.active_id, *self._sessions, *self._archiving}
+        candidates = idle_conversations(self._conversations.entries(), days, exclude=exclude)
+        for cid in candidates:
+            self._archiving.add(cid)
+            self._writer.submit(f"history:{cid}", self._archive_job, cid, fmt)
+        self._archive_report = (self._archive_report[0] + len(candidates), self._archive_report[1] or report)
+        # Queued after the archive jobs, so archived messages are read from their archives.
+        self._schedule_blob_gc()
+        self._poll_archive_results()
+
+    def _schedule_blob_gc(self) -> None:
+        """Queue a mark-and-sweep of attachment blobs that nothing references any more."""
+        # Histories in memory may hold messages the writer has not persisted yet;
+        # of a lazy history only the in-memory tail can be unsaved. The active
+        # session's stashed list is stale until the next switch (clear_history
+        # replaces self.history), so self.history stands in for it.
+        active = self._conversations.active_id
+        histories = [self.history] + [s["history"] for cid, s in self._sessions.items() if cid != active]
+        live: Set[str] = set()
+        for history in histories:
+            live |= message_blob_ids(history.tail if isinstance(history, LazyHistory) else history)
+        self._writer.submit("blob-gc", self._blob_gc_job, live)
+
+    def _json_history_paths(self) -> List[Tuple[str, str]]:
+        """Snapshot and journal paths of every JSON-backed conversation on disk."""
+        paths = [(HISTORY_FILE, HISTORY_JOURNAL_FILE)]
+        try:
+            names = sorted(os.listdir(CONVERSATIONS_DIR))
+        except OSError:
+            names = []
+        for name in names:
+            base, ext = os.path.splitext(name)
+            if name.startswith("history-") and ext in (".json", ".jsonl"):
+                pair = (os.path.join(CONVERSATIONS_DIR, base + ".json"), os.path.join(CONVERSATIONS_DIR, base + ".jsonl"))
+                if pair not in paths:
+                    paths.append(pair)
+        return paths
+
+    @staticmethod
+    def _quarantined_history_files() -> List[str]:
+        """History files moved aside because they did not parse (kept for recovery)."""
+        paths = []
+        for directory, prefix in ((os.path.dirname(HISTORY_FILE), "history"), (CONVERSATIONS_DIR, "history-")):
+            try:
+                names = sorted(os.listdir(directory))
+            except OSError:
+                continue
+            for name in names:
+                if name.startswith(prefix) and CORRUPT_SUFFIX in name:
+                    paths.append(os.path.join(directory, name))
+        return paths
+
+    def _blob_gc_job(self, live: Set[str]) -> None:
+        # Runs on the writer thread, after every save queued before it. Any read
+        # error aborts the sweep: an incomplete live set would delete used blobs.
+        try:
+            for snapshot_path, journal_path in self._json_history_paths():
+                live |= message_blob_ids(HistoryJournal(snapshot_path, journal_path).iter_messages(strict=True))
+            if os.path.exists(HISTORY_DB_FILE):
+                live |= referenced_blob_ids(HISTORY_DB_FILE)
+            for path in list_archives(ARCHIVE_DIR):
+                live |= message_blob_ids(iter_archive(path))
+            for path in self._quarantined_history_files():
+                with open(path, "rb") as fh:
+                    live |= scan_blob_ids(fh.read())
+        except Exception as e:
+            _log_warning(f"Attachment cleanup skipped: {e}")
+            return
+        removed, freed = default_blob_store.sweep(live)
+        if removed:
+            self._safe_log(f"Removed {removed} unused attachments ({format_byte_count(freed)}).")
+
+    def _archive_job(self, cid: int, fmt: str) -> None:
+        # Runs on the writer thread; results are picked up by _poll_archive_results.
+        # The live history stays until _discard_archived_job, after the index save.
+        try:
+            path = os.path.join(ARCHIVE_DIR, archive_file_name(cid, fmt))
+            self._archive_results[cid] = archive_store(self._create_history_store(cid), path, fmt)
+        except Exception as e:
+            _log_warning(f"Archiving conversation {cid} failed: {e}")
+            self._archive_results[cid] = None
+
+    def _apply_archive_result(self, cid: int) -> None:
+        if cid not in self._archive_results:
+            return
+        info = self._archive_results.pop(cid)
+        if info is None:
+            self._archiving.discard(cid)
+            return
+        if cid not in self._conversations:
+            # Deleted while it was being archived.
+            self._writer.submit(f"history:{cid}", self._remove_file, os.path.join(ARCHIVE_DIR, info["file"]))
+            self._archiving.discard(cid)
+            return
+        self._conversations.update(cid, archived=info)
+        self._save_conversation_index()
+        # Queued after the index save; cid stays in _archiving until it has run.
+        self._writer.submit(f"history:{cid}", self._discard_archived_job, cid)
+        self._refresh_conversation_list()
+        self._refresh_history_viewer()
+
+    def _discard_archived_job(self, cid: int) -> None:
+        # Runs on the writer thread. Only drop the live history once the index on
+        # disk points to the archive; if the index save failed, keep both copies.
+        try:
+            entry = ConversationIndex(CONVERSATIONS_INDEX_FILE).load().get(cid) or {}
+            if entry.get("archived"):
+                store = self._create_history_store(cid)
+                store.discard()
+                self._remove_file(self._search_index_path(store))
+                self._remove_vector_files(cid)
+            else:
+                _log_warning(f"Conversation {cid} kept live: the index does not record its archive")
+        except Exception as e:
+            _log_warning(f"Discarding archived conversation {cid} failed: {e}")
+        finally:
+            self._ui.post(self._archiving.discard, cid)
+
+    def _wait_for_archive(self, cid: int) -> None:
+        # The writer runs jobs in order, so this one comes after the queued archive work.
+        self._writer.submit(f"archive-wait:{cid}", self._ui.post, self._resume_switch, cid)
+
+    def _resume_switch(self, cid: int) -> None:
+        if self._pending_switch != cid:
+            return
+        self._apply_archive_result(cid)
+        if cid in self._archiving:  # the discard was only just queued
+            self._wait_for_archive(cid)
+            return
+        self.switch_conversation(cid)
+
+    def _poll_archive_results(self) -> None:
+        for cid in list(self._archive_results):
+            self._apply_archive_result(cid)
+        if self._archiving:
+            self.after(250, self._poll_archive_results)
+            return
+        archived, show = self._archive_report
+        self._archive_report = (0, False)
+        if not archived and not show:
+            return
+        text = format_archive_report(summarize_archives(self._conversations.entries()), archived)
+        self._safe_log(text.replace("\n", " · "))
+        if show:
+            messagebox.showinfo("Arkisto", text)
+
+    def _refresh_conversation_list(self) -> None:
+        listbox = getattr(self, "conversation_list", None)
+        if listbox is None:
+            return
+        entries = self._conversations.entries()
+        self._conversation_rows = [entry["id"] for entry in entries]
+        listbox.delete(0, tk.END)
+        for entry in entries:
+            marker = "🗄 " if entry.get("archived") else ""
+            listbox.insert(tk.END, f"{marker}{display_title(entry)} · {entry.get('message_count', 0)}")
+        active = self._conversations.active_id
+        if active in self._conversation_rows:
+            row = self._conversation_rows.index(active)
+            listbox.selection_set(row)
+            listbox.see(row)
+
+    def _on_conversation_select(self, _event=None) -> None:
+        selection = self.conversation_list.curselection()
+        if selection and selection[0] < len(self._conversation_rows):
+            self.switch_conversation(self._conversation_rows[selection[0]])
+
     def open_profiles(self) -> None:
         profiles = self.config_dict.get("profiles", {})
         dlg = tk.Toplevel(self)
@@ -2532,6 +4131,26 @@ class JugiAIApp(tk.Tk):
         row += 1
         ttk.Label(g, text="Positiivinen arvo vähentää toistoa, negatiivinen lisää toistoa.", style="Subtle.TLabel").grid(row=row, column=0, columnspan=2, sticky=tk.W)
         row += 1
+        ttk.Label(g, text="Aiemmat liitteet:").grid(row=row, column=0, sticky=tk.W, pady=(8, 0))
+        att_policy_var = tk.StringVar(
+            value=normalize_attachment_policy(self.config_dict.get("attachment_history_policy", DEFAULT_CONFIG["attachment_history_policy"]))
+        )
+        ttk.Combobox(g, textvariable=att_policy_var, values=list(ATTACHMENT_POLICIES), state="readonly").grid(
+            row=row, column=1, sticky=tk.EW, padx=(8, 0), pady=(8, 0)
+        )
+        row += 1
+        ttk.Label(g, text="Lähetä kokonaan (vuoroa):").grid(row=row, column=0, sticky=tk.W, pady=(8, 0))
+        att_keep_var = tk.IntVar(value=int(self.config_dict.get("attachment_keep_turns", 3)))
+        ttk.Spinbox(g, from_=1, to=50, textvariable=att_keep_var, width=5).grid(
+            row=row, column=1, sticky=tk.W, padx=(8, 0), pady=(8, 0)
+        )
+        row += 1
+        ttk.Label(
+            g,
+            text="full = aina kokonaan, reference = viittaus ja esikatselu, drop = jätetään pois vuorojen jälkeen.",
+            style="Subtle.TLabel",
+        ).grid(row=row, column=0, columnspan=2, sticky=tk.W)
+        row += 1
         for i in range(2):
             g.columnconfigure(i, weight=1)
         g.columnconfigure(2, weight=0)
@@ -2652,6 +4271,21 @@ class JugiAIApp(tk.Tk):
         opacity_value_lbl = ttk.Label(u, text=f"{opacity_var.get():.2f}")
         opacity_value_lbl.grid(row=row, column=2, sticky=tk.W, padx=(8, 0))
 
+        preview_job: Dict[str, Optional[str]] = {"id": None}
+
+        def _settle_opacity_preview(value: float) -> None:
+            preview_job["id"] = None
+            if show_bg_var.get():
+                self._preview_watermark_opacity(value, respect_visibility=False)
+
+        def _cancel_opacity_preview() -> None:
+            if preview_job["id"] is not None:
+                try:
+                    self.after_cancel(preview_job["id"])
+                except Exception:
+                    pass
+                preview_job["id"] = None
+
         def _on_opacity_change(*_args: Any) -> None:
             try:
                 value = float(opacity_var.get())
@@ -2659,12 +4293,18 @@ class JugiAIApp(tk.Tk):
                 value = original_opacity
             value = max(0.0, min(1.0, value))
             opacity_value_lbl.configure(text=f"{value:.2f}")
-            if show_bg_var.get():
-                self._preview_watermark_opacity(value, respect_visibility=False)
-            else:
+            if not show_bg_var.get():
+                _cancel_opacity_preview()
                 self._remove_watermark_overlay()
+                return
+            # While dragging: swap in the nearest precomputed step; the exact
+            # blend runs once the slider has rested for a moment.
+            self._show_watermark_ladder_step(value)
+            _cancel_opacity_preview()
+            preview_job["id"] = self.after(WATERMARK_PREVIEW_SETTLE_MS, _settle_opacity_preview, value)
 
         opacity_var.trace_add("write", _on_opacity_change)
+        self._start_watermark_ladder(opacity_var.get())
         _on_opacity_change()
         row += 1
         ttk.Label(u, text="Watermark-koko (1–8, suurempi = pienempi kuva):").grid(row=row, column=0, sticky=tk.W, pady=(8, 0))
@@ -2766,11 +4406,11 @@ class JugiAIApp(tk.Tk):
                             cameras_listbox.insert(tk.END, cam.get("name", f"{cam.get('ip')}:{cam.get('port')}"))
                         discovery_status_var.set(f"Löytyi {len(cameras)} kameraa")
                     
-                    dlg.after(0, update_ui)
+                    self._ui.post(update_ui)
                 except Exception as e:
                     def show_error():
                         discovery_status_var.set(f"Virhe: {str(e)}")
-                    dlg.after(0, show_error)
+                    self._ui.post(show_error)
             
             threading.Thread(target=discovery_thread, daemon=True).start()
         
@@ -2802,6 +4442,8 @@ class JugiAIApp(tk.Tk):
         btns.pack(side=tk.BOTTOM, fill=tk.X, pady=(12, 0))
 
         def cancel_and_close() -> None:
+            _cancel_opacity_preview()
+            self._stop_watermark_ladder()
             self._load_watermark_image()
             if original_show_background:
                 self._preview_watermark_opacity(original_opacity)
@@ -2813,6 +4455,8 @@ class JugiAIApp(tk.Tk):
         ttk.Button(btns, text="Sulje tallentamatta", command=cancel_and_close).pack(side=tk.RIGHT)
 
         def save_and_close():
+            _cancel_opacity_preview()
+            self._stop_watermark_ladder()
             # tallenna arvot
             self.config_dict["api_key"] = api_var.get().strip()
             self.config_dict["model"] = model_var.get().strip() or DEFAULT_CONFIG["model"]
@@ -2824,6 +4468,11 @@ class JugiAIApp(tk.Tk):
             self.config_dict["presence_penalty"] = float(f"{pp_var.get():.3f}")
             self.config_dict["frequency_penalty"] = float(f"{fp_var.get():.3f}")
             self.config_dict["backend"] = backend_var.get().strip() or "openai"
+            self.config_dict["attachment_history_policy"] = normalize_attachment_policy(att_policy_var.get())
+            try:
+                self.config_dict["attachment_keep_turns"] = max(1, int(att_keep_var.get()))
+            except (ValueError, TypeError, tk.TclError):
+                self.config_dict["attachment_keep_turns"] = 3
             self.config_dict["local_model_path"] = lpath_var.get().strip()
             
             # Validate and save thread count
@@ -2912,47 +4561,92 @@ class JugiAIApp(tk.Tk):
         path = self._resolve_default_logo()
         if not path:
             return
+        if self._images is not None:
+            self._images.request(path, APP_ICON_SIZE, self._install_app_icon)
+            return
         try:
             img = tk.PhotoImage(file=path)
             self.iconphoto(True, img)
             self._app_icon_ref = img
         except Exception:
             pass
+
+    def _install_app_icon(self, image: Optional[Any]) -> None:
+        if image is None:
+            return
+        try:
+            img = ImageTk.PhotoImage(image, master=self)
+            self.iconphoto(True, img)
+            self._app_icon_ref = img
+        except Exception:
+            pass
     
+    def _message_logo_size(self) -> int:
+        # 24 px at the default 12 pt font, following the text size.
+        return max(12, self._active_font_size * 2)
+
     def _load_message_logo(self) -> Optional[tk.PhotoImage]:
-        """Load and scale the logo for inline message display."""
-        path = self._resolve_default_logo()
-        if not path or not os.path.exists(path):
+        """Return the shared inline logo, decoding it only when path, mtime or size change."""
+        return self._message_logo_cache.get(self._resolve_default_logo(), self._message_logo_size())
+
+    def _request_message_logo(self, path: str, size: int, done: Callable[[Optional[Any]], None]) -> Optional[tk.PhotoImage]:
+        """Decode the logo on the image worker; meanwhile messages embed the blank shared image."""
+        if not os.path.exists(path):
             return None
-        
+        self._images.request(path, size, done)
         try:
-            if PIL_AVAILABLE:
-                # Use PIL for better quality scaling
-                from PIL import Image, ImageTk
-                pil_img = Image.open(path)
-                # Scale to approximately 24x24 pixels for inline display
-                pil_img.thumbnail((24, 24), Image.Resampling.LANCZOS)
-                return ImageTk.PhotoImage(pil_img)
-            else:
-                # Fallback to tk.PhotoImage with subsample
-                img = tk.PhotoImage(file=path)
-                # Subsample to make it smaller (larger number = smaller image)
-                # Ensure we don't divide by zero and have at least factor of 1
-                subsample_x = max(1, img.width() // 24) if img.width() >= 24 else 1
-                subsample_y = max(1, img.height() // 24) if img.height() >= 24 else 1
-                if subsample_x > 1 or subsample_y > 1:
-                    return img.subsample(subsample_x, subsample_y)
-                return img
+            if self._message_logo is None:
+                self._message_logo = tk.PhotoImage(master=self)
+            self._message_logo.blank()
+            self._message_logo.configure(width=size, height=size)
         except Exception as e:
             _log_warning(f"Failed to load message logo: {e}")
             return None
+        return self._message_logo
 
+    def _install_message_logo(self, decoded: Any) -> Optional[tk.PhotoImage]:
+        """Copy ``decoded`` into the shared PhotoImage so embedded copies update too."""
+        try:
+            if self._message_logo is None:
+                self._message_logo = tk.PhotoImage(master=self)
+            logo = self._message_logo
+            if PIL_AVAILABLE and isinstance(decoded, Image.Image):
+                decoded = ImageTk.PhotoImage(decoded, master=self)
+            logo.blank()
+            logo.configure(width=decoded.width(), height=decoded.height())
+            logo.tk.call(str(logo), "copy", str(decoded))
+            return logo
+        except Exception as e:
+            _log_warning(f"Failed to load message logo: {e}")
+            return None
 
-    def _load_watermark_image(self, respect_visibility: bool = True) -> None:
+    def _decode_message_logo(self, path: str, size: int) -> Optional[Any]:
+        """Load and scale the logo on the Tk thread (without Pillow)."""
+        if not os.path.exists(path):
+            return None
+
+        try:
+            img = tk.PhotoImage(file=path, master=self)
+            # Subsample to make it smaller (larger number = smaller image)
+            # Ensure we don't divide by zero and have at least factor of 1
+            subsample_x = max(1, img.width() // size) if img.width() >= size else 1
+            subsample_y = max(1, img.height() // size) if img.height() >= size else 1
+            if subsample_x > 1 or subsample_y > 1:
+                return img.subsample(subsample_x, subsample_y)
+            return img
+        except Exception as e:
+            _log_warning(f"Failed to load message logo: {e}")
+            return None
+
+
+    def _load_watermark_image(self, respect_visibility: bool = True, use_cache: bool = True) -> None:
         """
         Load watermark image with comprehensive error handling.
         If any error occurs, logs a warning and disables watermark instead of crashing.
+        With ``use_cache`` a cached variant is used as is; the opacity preview
+        passes ``False`` because it needs the decoded source.
         """
+        self._wm_request_token += 1
         self._wm_img = None
         self._wm_raw_img = None
         self._wm_scaled_img = None
@@ -2961,80 +4655,53 @@ class JugiAIApp(tk.Tk):
             self._remove_watermark_overlay()
             return
         
-        try:
-            from PIL import Image
-            pil_available = True
-        except Exception:
-            pil_available = False
-            try:
-                self._safe_log("Pillow (PIL) is not installed. Watermark disabled. Install Pillow to enable watermark features.")
-            except Exception:
-                print("[JugiAI] Pillow (PIL) missing; watermark disabled.")
-        
         path = self._resolve_default_logo()
-        if not path:
-            self._remove_watermark_overlay()
-            if pil_available:
-                try:
-                    self._safe_log(f"Watermark file not found at {path!r}; continuing without watermark.")
-                except Exception:
-                    pass
-            return
-        
-        if not os.path.isfile(path):
+        if not path or not os.path.isfile(path):
             self._remove_watermark_overlay()
             try:
                 self._safe_log(f"Watermark file not found at {path!r}; continuing without watermark.")
             except Exception:
                 pass
             return
-        
+
+        subs = clamp_subsample(self.config_dict.get("background_subsample", 2))
+        opacity_val = clamp_opacity(self.config_dict.get("background_opacity", DEFAULT_CONFIG["background_opacity"]))
+        key = variant_key(path, subs, opacity_val, self._watermark_background())
+        if use_cache:
+            cached = self._watermark_cache.lookup(key)
+            if cached:
+                try:
+                    self._wm_img = tk.PhotoImage(file=cached, master=self)
+                    return
+                except Exception as e:
+                    _log_warning(f"Cached watermark unreadable, rebuilding: {e}")
         try:
-            path = self._resolve_default_logo()
-            if not path:
-                self._remove_watermark_overlay()
-                return
-                
-            if not os.path.exists(path):
-                _log_warning(f"Watermark image file not found: {path}")
-                self.watermark_enabled = False
-                self._remove_watermark_overlay()
-                return
-                
-            try:
-                raw_img = tk.PhotoImage(file=path)
-            except tk.TclError as e:
-                _log_warning(f"Failed to load watermark image (TclError): {e}")
-                self.watermark_enabled = False
-                self._remove_watermark_overlay()
-                return
-            except Exception as e:
-                _log_warning(f"Failed to load watermark image: {e}")
-                self.watermark_enabled = False
-                self._remove_watermark_overlay()
-                return
-                
-            subs = int(self.config_dict.get("background_subsample", 2))
-            subs = max(1, min(8, subs))
-            try:
-                scaled = raw_img.subsample(subs, subs) if subs > 1 else raw_img.copy()
-            except Exception as e:
-                _log_warning(f"Failed to subsample watermark image: {e}")
-                scaled = raw_img
-                
-            opacity_val = float(self.config_dict.get("background_opacity", DEFAULT_CONFIG["background_opacity"]))
-            opacity_val = max(0.0, min(1.0, opacity_val))
-            
-            try:
-                processed = self._apply_watermark_opacity(scaled, opacity_val)
-            except Exception as e:
-                _log_warning(f"Failed to apply watermark opacity: {e}")
-                processed = scaled
-                
-            self._wm_raw_img = raw_img
-            self._wm_scaled_img = scaled
-            self._wm_img = processed
-            
+            if PIL_AVAILABLE:
+                # Decode, reduce and blend in Pillow; the reduced RGBA source is kept
+                # so opacity previews only redo the blend.
+                decoded = self._images.load(path) if self._images is not None else None
+                source = (
+                    prepare_watermark_source(decoded, subs) if decoded is not None else load_watermark_source(path, subs)
+                )
+                self._wm_scaled_img = source
+                blended = blend_image(source, opacity_val, self._watermark_background())
+                self._wm_img = ImageTk.PhotoImage(blended, master=self)
+                # PNG encoding happens on the writer thread.
+                self._writer.submit(
+                    "watermark-cache", self._watermark_cache.store, key, lambda tmp: blended.save(tmp, "PNG")
+                )
+            else:
+                self._safe_log("Pillow (PIL) is not installed; using the slower Tk watermark path.")
+                raw_img = tk.PhotoImage(file=path, master=self)
+                scaled = raw_img.subsample(subs, subs) if subs > 1 else raw_img
+                self._wm_raw_img = raw_img
+                self._wm_scaled_img = scaled
+                self._wm_img = self._apply_watermark_opacity(scaled, opacity_val)
+                processed = self._wm_img
+                try:
+                    self._watermark_cache.store(key, lambda tmp: processed.write(tmp, format="png"))
+                except Exception as e:
+                    _log_warning(f"Caching the watermark failed: {e}")
         except Exception as e:
             _log_warning(f"Unexpected error loading watermark, continuing without it: {e}")
             self.watermark_enabled = False
@@ -3047,29 +4714,53 @@ class JugiAIApp(tk.Tk):
                 self._safe_log(traceback.format_exc())
             except Exception:
                 pass
+
+    def _request_watermark_image(self) -> None:
+        """Startup load: decode (or read the cached variant) and blend on the image worker."""
+        path = self._resolve_default_logo()
+        if self._images is None or not self.watermark_enabled or not path or not os.path.isfile(path):
+            self._load_watermark_image()
+            self._insert_watermark_if_needed()
             return
-        
+        subs = clamp_subsample(self.config_dict.get("background_subsample", 2))
+        opacity_val = clamp_opacity(self.config_dict.get("background_opacity", DEFAULT_CONFIG["background_opacity"]))
+        background = self._watermark_background()
+        key = variant_key(path, subs, opacity_val, background)
+        self._wm_request_token += 1
+        token = self._wm_request_token
+        cached = self._watermark_cache.lookup(key)
+        if cached:
+            self._images.request(cached, 0, lambda image: self._install_requested_watermark(token, key, image))
+            return
+
+        def prepare(image: Any) -> Tuple[Any, Any]:
+            source = prepare_watermark_source(image, subs)
+            return source, blend_image(source, opacity_val, background)
+
+        self._images.request(path, 0, lambda result: self._install_requested_watermark(token, key, result), prepare)
+
+    def _install_requested_watermark(self, token: int, key: Optional[str], result: Optional[Any]) -> None:
+        if token != self._wm_request_token:
+            return  # a synchronous load has replaced it meanwhile
+        if result is None:
+            # Let the synchronous path retry, report and disable as needed.
+            self._load_watermark_image()
+            self._insert_watermark_if_needed()
+            return
+        if isinstance(result, tuple):
+            source, blended = result
+            self._wm_scaled_img = source
+            self._writer.submit(
+                "watermark-cache", self._watermark_cache.store, key, lambda tmp: blended.save(tmp, "PNG")
+            )
+        else:
+            blended = result
         try:
-            subs = int(self.config_dict.get("background_subsample", 2))
-            subs = max(1, min(8, subs))
-            try:
-                scaled = raw_img.subsample(subs, subs) if subs > 1 else raw_img.copy()
-            except Exception:
-                scaled = raw_img
-            opacity_val = float(self.config_dict.get("background_opacity", DEFAULT_CONFIG["background_opacity"]))
-            opacity_val = max(0.0, min(1.0, opacity_val))
-            processed = self._apply_watermark_opacity(scaled, opacity_val)
-            self._wm_raw_img = raw_img
-            self._wm_scaled_img = scaled
-            self._wm_img = processed
-        except Exception:
-            self._remove_watermark_overlay()
-            try:
-                self._safe_log("Failed to load/process watermark; continuing without watermark.")
-                self._safe_log(traceback.format_exc())
-            except Exception:
-                pass
+            self._wm_img = ImageTk.PhotoImage(blended, master=self)
+        except Exception as e:
+            _log_warning(f"Failed to show the watermark: {e}")
             return
+        self._insert_watermark_if_needed()
 
     def _insert_watermark_if_needed(self) -> None:
         # Check if watermark should be shown based on show_background setting
@@ -3159,119 +4850,109 @@ class JugiAIApp(tk.Tk):
         if respect_visibility and not self.config_dict.get("show_background", True):
             self._remove_watermark_overlay()
             return
-        if not self._wm_scaled_img:
-            self._load_watermark_image(respect_visibility=respect_visibility)
-        if not self._wm_scaled_img:
+        if self._wm_scaled_img is None and self._wm_ladder is not None:
+            self._wm_scaled_img = self._wm_ladder.source
+        if self._wm_scaled_img is None:
+            self._load_watermark_image(respect_visibility=respect_visibility, use_cache=False)
+        if self._wm_scaled_img is None:
             return
-        value = max(0.0, min(1.0, float(value)))
+        value = clamp_opacity(value)
         new_img = self._apply_watermark_opacity(self._wm_scaled_img, value)
         self._wm_img = new_img
         self._ensure_watermark_overlay()
         self._position_watermark_overlay()
 
-    def _apply_watermark_opacity(self, img: tk.PhotoImage, opacity: float) -> tk.PhotoImage:
-        """
-        Apply an opacity factor to a tk.PhotoImage.
-        Uses PIL/Pillow for better performance and reliability when available,
-        otherwise falls back to pixel-by-pixel manipulation.
-        - img: tk.PhotoImage
-        - opacity: numeric or string representing 0..1 (or 0..100 as percent)
-        Returns a tk.PhotoImage with opacity applied.
-        """
-        # Normalize opacity to float 0..1
-        try:
-            normalized_opacity = float(opacity)
-        except Exception:
-            # If someone passed "50" meaning 50%, normalize
+    def _start_watermark_ladder(self, opacity: float) -> None:
+        """Decode the watermark and blend the preview steps on a worker thread."""
+        self._stop_watermark_ladder()
+        if not (PIL_AVAILABLE and self.watermark_enabled):
+            return
+        path = self._resolve_default_logo()
+        if not path or not os.path.isfile(path):
+            return
+        subs = clamp_subsample(self.config_dict.get("background_subsample", 2))
+        background = self._watermark_background()
+        token = self._wm_ladder_token
+
+        def worker() -> None:
             try:
-                normalized_opacity = float(str(opacity).strip().rstrip("%")) / 100.0
-            except Exception:
-                normalized_opacity = 1.0
+                decoded = self._images.load(path)
+                if decoded is None:
+                    return
+                ladder = OpacityLadder(prepare_watermark_source(decoded, subs), background)
+            except Exception as e:
+                _log_warning(f"Watermark preview decode failed: {e}")
+                return
+            self._ui.post(self._adopt_watermark_ladder, token, ladder)
+            try:
+                ladder.build(around=opacity)
+            except Exception as e:
+                _log_warning(f"Watermark preview blending failed: {e}")
 
-        # If user gave 0..100 scale, convert
-        if normalized_opacity > 1.0:
-            normalized_opacity = max(0.0, min(100.0, normalized_opacity)) / 100.0
+        threading.Thread(target=worker, name="watermark-ladder", daemon=True).start()
 
-        opacity_val = max(0.0, min(1.0, normalized_opacity))
+    def _adopt_watermark_ladder(self, token: int, ladder: OpacityLadder) -> None:
+        if token != self._wm_ladder_token:
+            ladder.cancel()  # the dialog closed while decoding
+            return
+        self._wm_ladder = ladder
+        self._wm_ladder_photos = {}
+
+    def _stop_watermark_ladder(self) -> None:
+        self._wm_ladder_token += 1
+        if self._wm_ladder is not None:
+            self._wm_ladder.cancel()
+        self._wm_ladder = None
+        self._wm_ladder_photos = {}
+
+    def _show_watermark_ladder_step(self, value: float) -> bool:
+        """Show the precomputed step nearest to ``value``; ``False`` if it is not ready."""
+        ladder = self._wm_ladder
+        if ladder is None:
+            return False
+        level = ladder.level(value)
+        photo = self._wm_ladder_photos.get(level)
+        if photo is None:
+            image = ladder.get(value)
+            if image is None:
+                return False
+            photo = ImageTk.PhotoImage(image, master=self)
+            self._wm_ladder_photos[level] = photo
+        if self._wm_scaled_img is None:
+            self._wm_scaled_img = ladder.source
+        self._wm_img = photo
+        self._ensure_watermark_overlay()
+        self._position_watermark_overlay()
+        return True
 
-        # If opacity is essentially 1.0, just return a copy
-        if opacity_val >= 0.999:
-            try:
-                return img.copy()
-            except Exception as e:
-                _log_warning(f"Failed to copy image: {e}")
-                return img
+    def _watermark_background(self) -> tuple[int, int, int]:
+        try:
+            return self._hex_to_rgb(self.chat.cget("bg"))
+        except Exception:
+            return DEFAULT_WATERMARK_BACKGROUND
 
-        # Try PIL/Pillow approach for better performance
-        if PIL_AVAILABLE:
-            try:
-                # Convert tk.PhotoImage to PIL Image
-                # Get dimensions
-                width = img.width()
-                height = img.height()
-                
-                # Create a PIL image from tk.PhotoImage pixel data
-                # We need to get the data in a format PIL can use
-                pil_img = Image.new('RGBA', (width, height))
-                pixels = []
-                for y in range(height):
-                    for x in range(width):
-                        try:
-                            pixel = img.get(x, y)
-                        except Exception:
-                            pixel = None
-                        if pixel:
-                            rgb = self._hex_to_rgb(pixel)
-                            pixels.append(rgb + (255,))  # Add full alpha
-                        else:
-                            pixels.append((11, 18, 32, 255))
-                pil_img.putdata(pixels)
-                
-                # Apply opacity by modifying alpha channel
-                r, g, b, a = pil_img.split()
-                a = a.point(lambda v: int(v * opacity_val))
-                pil_img = Image.merge('RGBA', (r, g, b, a))
-                
-                # Convert back to tk.PhotoImage
-                return ImageTk.PhotoImage(pil_img)
-            except Exception:
-                # Fall through to fallback implementation
-                pass
+    def _apply_watermark_opacity(self, img: Any, opacity: float) -> tk.PhotoImage:
+        """
+        Blend the watermark source against the chat background at ``opacity``.
+        - img: Pillow image (from load_watermark_source) or tk.PhotoImage
+        - opacity: numeric or string representing 0..1 (or 0..100 as percent)
+        Returns a tk.PhotoImage with opacity applied.
+        """
+        opacity_val = clamp_opacity(opacity)
+        background = self._watermark_background()
+        if PIL_AVAILABLE and isinstance(img, Image.Image):
+            return ImageTk.PhotoImage(blend_image(img, opacity_val, background), master=self)
 
-        # Fallback: pixel-by-pixel manipulation (original implementation)
+        # Without Pillow: read all pixels in one Tcl call, blend in Python, write them back in one.
         try:
             width = img.width()
             height = img.height()
-        except Exception:
+            rows = [img.tk.splitlist(row) for row in img.tk.splitlist(img.tk.call(str(img), "data"))]
+        except Exception as e:
+            _log_warning(f"Failed to read watermark pixels: {e}")
             return img
-            
-        bg_color = "#0b1220"
-        try:
-            bg_color = self.chat.cget("bg")
-        except Exception:
-            pass
-            
-        bg_rgb = self._hex_to_rgb(bg_color)
-        opacity_scalar = opacity_val
-        result = tk.PhotoImage(width=width, height=height)
-        for y in range(height):
-            row_colors = []
-            for x in range(width):
-                try:
-                    pixel = img.get(x, y)
-                except Exception:
-                    pixel = None
-                if not pixel:
-                    blended_rgb = bg_rgb
-                else:
-                    rgb = self._hex_to_rgb(pixel)
-                    blended_rgb = (
-                        int(rgb[0] * opacity_scalar + bg_rgb[0] * (1.0 - opacity_scalar)),
-                        int(rgb[1] * opacity_scalar + bg_rgb[1] * (1.0 - opacity_scalar)),
-                        int(rgb[2] * opacity_scalar + bg_rgb[2] * (1.0 - opacity_scalar)),
-                    )
-                row_colors.append(self._rgb_to_hex(blended_rgb))
-            result.put("{" + " ".join(row_colors) + "}", to=(0, y))
+        result = tk.PhotoImage(width=width, height=height, master=self)
+        result.put(blend_hex_rows(rows, opacity_val, background), to=(0, 0))
         return result
 
     def _hex_to_rgb(self, value: str | tuple | list) -> tuple[int, int, int]:
@@ -3324,19 +5005,13 @@ class JugiAIApp(tk.Tk):
         except Exception:
             return (11, 18, 32)
 
-    def _rgb_to_hex(self, rgb: tuple[int, int, int]) -> str:
-        r, g, b = rgb
-        r = max(0, min(255, int(r)))
-        g = max(0, min(255, int(g)))
-        b = max(0, min(255, int(b)))
-        return f"#{r:02x}{g:02x}{b:02x}"
-
 
 def main() -> None:
     app: Optional[JugiAIApp] = None
     try:
         app = JugiAIApp()
         app.mainloop()
+        app.flush_persistence()
     except Exception as exc:
         _handle_fatal_error(exc, app)
 
@@ -0,0 +1,68 @@
+"""Small, dependency-free latency statistics for runtime instrumentation."""
+
+from __future__ import annotations
+
+import math
+import threading
+from collections import deque
+from typing import Dict, Final, Iterable, List, Optional
+
+
+DEFAULT_SAMPLE_WINDOW: Final[int] = 256
+
+
+def percentile(values: Iterable[float], pct: float) -> Optional[float]:
+    """Return the ``pct`` percentile (0–100, nearest-rank) or ``None`` if empty."""
+
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    pct = max(0.0, min(100.0, float(pct)))
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class LatencyRecorder:
+    """Thread-safe ring buffer of recent samples (e.g. milliseconds)."""
+
+    def __init__(self, maxlen: int = DEFAULT_SAMPLE_WINDOW) -> None:
+        self._samples: deque[float] = deque(maxlen=max(1, int(maxlen)))
+        self._lock = threading.Lock()
+        self.count = 0
+        self.max_value = 0.0
+
+    def record(self, value: float) -> None:
+        value = float(value)
+        with self._lock:
+            self._samples.append(value)
+            self.count += 1
+            if value > self.max_value:
+                self.max_value = value
+
+    def samples(self) -> List[float]:
+        with self._lock:
+            return list(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        return percentile(self.samples(), pct)
+
+    def summary(self) -> Dict[str, float]:
+        """Return count, p50, p95 and max over the retained window."""
+
+        window = self.samples()
+        return {
+            "count": float(self.count),
+            "p50": percentile(window, 50) or 0.0,
+            "p95": percentile(window, 95) or 0.0,
+            "max": self.max_value,
+        }
+
+
+def format_summary(name: str, summary: Dict[str, float], unit: str = "ms") -> str:
+    return (
+        f"{name}: n={int(summary.get('count', 0))} p50={summary.get('p50', 0.0):.1f}{unit} "
+        f"p95={summary.get('p95', 0.0):.1f}{unit} max={summary.get('max', 0.0):.1f}{unit}"
+    )
+
+
+__all__ = ["DEFAULT_SAMPLE_WINDOW", "LatencyRecorder", "format_summary", "percentile"]
@@ -0,0 +1,165 @@
+"""Background persistence writer for config and history saves.
+
+All disk writes run on one daemon thread so that a slow disk or an antivirus
+scan never blocks the Tk event loop. Jobs are keyed: submitting a job whose
+key is still queued replaces the queued one, so a burst of saves collapses
+into a single write of the latest state. :meth:`BackgroundWriter.flush` waits
+until everything submitted so far is on disk (used on exit).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Final, List, Optional, Tuple
+
+from perf_metrics import LatencyRecorder
+
+
+SLOW_SAVE_MS: Final[float] = 250.0
+
+ErrorHandler = Callable[[str, BaseException], None]
+SlowHandler = Callable[[str, float, int], None]  # key, elapsed ms, queue depth
+
+
+class BackgroundWriter:
+    """Single writer thread with per-key coalescing and latency metrics."""
+
+    def __init__(
+        self,
+        on_error: Optional[ErrorHandler] = None,
+        name: str = "persistence-writer",
+        on_slow: Optional[SlowHandler] = None,
+    ) -> None:
+        self.on_error = on_error
+        self.on_slow = on_slow
+        self._pending: "OrderedDict[str, Tuple[Callable[..., Any], Tuple[Any, ...]]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._completed = 0
+        self._closed = False
+        self.latency: Dict[str, LatencyRecorder] = {}
+        self.max_queue_depth = 0
+        self.coalesced = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, key: str, func: Callable[..., Any], *args: Any) -> None:
+        """Queue ``func(*args)``; replaces a still-queued job with the same key."""
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("writer is closed")
+            if key in self._pending:
+                self.coalesced += 1
+                # The replaced job counts as done: its state is superseded.
+                self._completed += 1
+            self._pending[key] = (func, args)
+            self._submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+            self._cond.notify_all()
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def is_idle(self) -> bool:
+        with self._cond:
+            return self._completed == self._submitted
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every job submitted so far has run; ``False`` on timeout."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._submitted
+            while self._completed < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Flush pending jobs and stop the thread."""
+
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return flushed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "coalesced": self.coalesced,
+            "latency": {key: rec.summary() for key, rec in list(self.latency.items())},
+        }
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                key, (func, args) = self._pending.popitem(last=False)
+            started = time.perf_counter()
+            try:
+                func(*args)
+            except BaseException as exc:  # noqa: BLE001 - reported to the owner
+                if self.on_error is not None:
+                    try:
+                        self.on_error(key, exc)
+                    except Exception:
+                        pass
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000.0
+                self.latency.setdefault(key, LatencyRecorder()).record(elapsed_ms)
+                if elapsed_ms >= SLOW_SAVE_MS and self.on_slow is not None:
+                    try:
+                        self.on_slow(key, elapsed_ms, self.queue_depth())
+                    except Exception:
+                        pass
+                with self._cond:
+                    self._completed += 1
+                    self._cond.notify_all()
+
+
+class HistorySync:
+    """Brings a history store (journal or SQLite) up to date with a snapshot.
+
+    Runs on the writer thread. ``epoch`` is bumped by the owner whenever the
+    history is cleared or replaced; a changed epoch forces a full rewrite even
+    if the coalesced snapshot is longer than what was persisted before.
+    """
+
+    def __init__(self, store: Any) -> None:
+        self.store = store
+        self.synced_count = 0
+        self._epoch = 0
+
+    def reset_to(self, count: int, epoch: int = 0) -> None:
+        """Record that ``count`` entries are already persisted (after a load)."""
+
+        self.synced_count = count
+        self._epoch = epoch
+
+    def sync(self, snapshot: List[Dict[str, Any]], epoch: int) -> None:
+        store = self.store
+        if epoch != self._epoch or len(snapshot) < self.synced_count:
+            store.rewrite(snapshot, reset=True)
+        else:
+            for index in range(self.synced_count, len(snapshot)):
+                store.append(index, snapshot[index])
+            if store.needs_compaction():
+                # Already off the Tk thread: compact inline instead of spawning.
+                store.rewrite(snapshot)
+        self._epoch = epoch
+        self.synced_count = len(snapshot)
+
+
+__all__ = ["BackgroundWriter", "HistorySync", "SLOW_SAVE_MS"]
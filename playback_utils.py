@@ -16,6 +16,13 @@ _SPEED_DELAY_MS: Final[dict[str, int]] = {
     "fast": 420,
 }
 
+# Timed playback (recorded stream timing) is scaled instead of using fixed delays.
+_SPEED_FACTOR: Final[dict[str, float]] = {
+    "slow": 2.0,
+    "normal": 1.0,
+    "fast": 0.5,
+}
+
 
 def clamp_font_size(current: int, delta: int) -> int:
     """Clamp font size within sane UI bounds and apply delta."""
@@ -39,4 +46,11 @@ def resolve_speed_delay(speed: str) -> int:
     return _SPEED_DELAY_MS.get(label, _SPEED_DELAY_MS["normal"])
 
 
-__all__ = ["clamp_font_size", "resolve_speed_delay", "MIN_FONT_SIZE", "MAX_FONT_SIZE"]
+def resolve_speed_factor(speed: str) -> float:
+    """Return the time scale for replaying recorded timing (2.0 = half speed)."""
+
+    label = (speed or "normal").strip().lower()
+    return _SPEED_FACTOR.get(label, 1.0)
+
+
+__all__ = ["clamp_font_size", "resolve_speed_delay", "resolve_speed_factor", "MIN_FONT_SIZE", "MAX_FONT_SIZE"]
@@ -0,0 +1,148 @@
+"""Streaming JSON request bodies for large chat payloads.
+
+The body is produced as an iterator of ``bytes`` so that ``urllib`` sends it
+with chunked transfer encoding. Attachment data is pulled from disk and
+base64-encoded incrementally while the body is written, so peak memory stays
+close to a single buffer instead of several copies of the whole payload.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any, Final, Iterable, Iterator, List, Union
+
+
+DEFAULT_BUFFER_SIZE: Final[int] = 64 * 1024
+# Must be a multiple of 3 so that concatenated base64 blocks need no padding.
+BASE64_READ_SIZE: Final[int] = 48 * 1024
+
+
+class StreamPart:
+    """A piece of message text that is produced lazily while sending."""
+
+    def iter_text(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def __str__(self) -> str:
+        return "".join(self.iter_text())
+
+
+class Base64FilePart(StreamPart):
+    """``prefix`` followed by the base64 encoding of a file, read in blocks."""
+
+    def __init__(self, path: str, prefix: str = "", read_size: int = BASE64_READ_SIZE) -> None:
+        self.path = path
+        self.prefix = prefix
+        self.read_size = max(3, read_size - read_size % 3)
+
+    def iter_text(self) -> Iterator[str]:
+        if self.prefix:
+            yield self.prefix
+        with open(self.path, "rb") as fh:
+            while True:
+                block = fh.read(self.read_size)
+                if not block:
+                    break
+                yield base64.b64encode(block).decode("ascii")
+
+
+class StreamedText:
+    """Message content assembled from plain strings and :class:`StreamPart` pieces."""
+
+    def __init__(self, parts: Iterable[Union[str, StreamPart]]) -> None:
+        self.parts: List[Union[str, StreamPart]] = list(parts)
+
+    def iter_text(self) -> Iterator[str]:
+        for part in self.parts:
+            if isinstance(part, StreamPart):
+                yield from part.iter_text()
+            else:
+                yield str(part)
+
+    def __str__(self) -> str:
+        return "".join(self.iter_text())
+
+
+def join_lines(lines: Iterable[Union[str, StreamPart]]) -> Union[str, StreamedText]:
+    """Join lines with newlines, staying lazy only if a streamed part is present."""
+
+    items = list(lines)
+    if not any(isinstance(item, StreamPart) for item in items):
+        return "\n".join(str(item) for item in items)
+    parts: List[Union[str, StreamPart]] = []
+    for idx, item in enumerate(items):
+        if idx:
+            parts.append("\n")
+        parts.append(item)
+    return StreamedText(parts)
+
+
+def materialize(obj: Any) -> Any:
+    """Return ``obj`` with every lazy text replaced by a plain string."""
+
+    if isinstance(obj, (StreamedText, StreamPart)):
+        return str(obj)
+    if isinstance(obj, dict):
+        return {key: materialize(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [materialize(value) for value in obj]
+    return obj
+
+
+def _escape(text: str) -> str:
+    return json.dumps(text, ensure_ascii=False)[1:-1]
+
+
+def _iter_json_text(obj: Any) -> Iterator[str]:
+    if isinstance(obj, (StreamedText, StreamPart)):
+        yield '"'
+        for piece in obj.iter_text():
+            yield _escape(piece)
+        yield '"'
+    elif isinstance(obj, dict):
+        yield "{"
+        for idx, (key, value) in enumerate(obj.items()):
+            if idx:
+                yield ", "
+            yield json.dumps(str(key), ensure_ascii=False)
+            yield ": "
+            yield from _iter_json_text(value)
+        yield "}"
+    elif isinstance(obj, (list, tuple)):
+        yield "["
+        for idx, value in enumerate(obj):
+            if idx:
+                yield ", "
+            yield from _iter_json_text(value)
+        yield "]"
+    else:
+        yield json.dumps(obj, ensure_ascii=False)
+
+
+def iter_json_body(obj: Any, buffer_size: int = DEFAULT_BUFFER_SIZE) -> Iterator[bytes]:
+    """Serialize ``obj`` as UTF-8 JSON, yielding blocks of about ``buffer_size`` bytes."""
+
+    pending: List[str] = []
+    pending_len = 0
+    for piece in _iter_json_text(obj):
+        pending.append(piece)
+        pending_len += len(piece)
+        if pending_len >= buffer_size:
+            yield "".join(pending).encode("utf-8")
+            pending = []
+            pending_len = 0
+    if pending:
+        yield "".join(pending).encode("utf-8")
+
+
+__all__ = [
+    "BASE64_READ_SIZE",
+    "DEFAULT_BUFFER_SIZE",
+    "Base64FilePart",
+    "StreamPart",
+    "StreamedText",
+    "iter_json_body",
+    "join_lines",
+    "materialize",
+]
@@ -0,0 +1,59 @@
+"""Compare backend token cost of base64-only vs type-aware attachment encoding.
+
+Usage: python scripts/bench_attachments.py
+"""
+
+from __future__ import annotations
+
+import base64
+import os
+import pathlib
+import sys
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from attachment_utils import describe_attachment, encode_attachment, estimate_tokens
+
+
+def _sample_corpus() -> list[tuple[str, str, bytes]]:
+    csv_rows = "\n".join(f"{i},tuote-{i},{i * 3.5:.2f},Helsinki" for i in range(800))
+    source = (PROJECT_ROOT / "playback_utils.py").read_bytes()
+    markdown = ("# Otsikko\n\nTämä on esimerkkidokumentti. " * 40 + "\n") * 10
+    json_doc = "[" + ",".join(f'{{"id": {i}, "nimi": "käyttäjä {i}"}}' for i in range(400)) + "]"
+    return [
+        ("hinnat.csv", "text/csv", csv_rows.encode("utf-8")),
+        ("playback_utils.py", "text/x-python", source),
+        ("muistio.md", "text/markdown", markdown.encode("utf-8")),
+        ("data.json", "application/json", json_doc.encode("utf-8")),
+        ("kuva.bin", "application/octet-stream", os.urandom(4096)),
+    ]
+
+
+def _legacy_lines(att: dict) -> list[str]:
+    return [describe_attachment(att), f"BASE64:{att['data']}"]
+
+
+def main() -> None:
+    total_old = total_new = 0
+    print(f"{'tiedosto':<20} {'koko B':>8} {'base64 tok':>11} {'uusi tok':>9} {'säästö':>7}")
+    for name, mime, payload in _sample_corpus():
+        att = {
+            "name": name,
+            "mime": mime,
+            "size": len(payload),
+            "data": base64.b64encode(payload).decode("ascii"),
+        }
+        old = estimate_tokens("\n".join(_legacy_lines(att)))
+        new = estimate_tokens("\n".join(encode_attachment(att, token_budget=1_000_000)))
+        total_old += old
+        total_new += new
+        saving = 100.0 * (old - new) / old if old else 0.0
+        print(f"{name:<20} {len(payload):>8} {old:>11} {new:>9} {saving:>6.1f}%")
+    saving = 100.0 * (total_old - total_new) / total_old if total_old else 0.0
+    print(f"{'yhteensä':<20} {'':>8} {total_old:>11} {total_new:>9} {saving:>6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
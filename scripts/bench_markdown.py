@@ -0,0 +1,113 @@
+"""Throughput of Markdown rendering for streamed replies.
+
+Usage: python scripts/bench_markdown.py [characters] [chunk size]
+
+Compares re-parsing the whole reply on every chunk (what a naive renderer
+would do) with :class:`stream_render.MarkdownStream`, which parses each
+character once. With a display the incremental variant also drives a real
+``tk.Text`` to include the cost of inserting tagged segments.
+"""
+
+from __future__ import annotations
+
+import pathlib
+import random
+import sys
+import time
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from stream_render import MarkdownStream, render_markdown
+
+
+_BLOCKS = [
+    "## Selitys\n",
+    "Tämä on **tärkeä** kohta, jossa mainitaan `funktio()` ja muuta tekstiä.\n",
+    "- ensimmäinen kohta\n- toinen kohta, jossa on `koodia`\n",
+    "1. vaihe yksi\n2. vaihe kaksi\n",
+    "```python\nfor i in range(10):\n    print(i ** 2)\n```\n",
+    "\n",
+]
+
+
+def _reply(total: int) -> str:
+    rng = random.Random(7)
+    parts = []
+    size = 0
+    while size < total:
+        block = rng.choice(_BLOCKS)
+        parts.append(block)
+        size += len(block)
+    return "".join(parts)[:total]
+
+
+def _chunks(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def _reparse(chunks: list[str]) -> None:
+    accumulated = ""
+    for chunk in chunks:
+        accumulated += chunk
+        render_markdown(accumulated)
+
+
+def _incremental(chunks: list[str]) -> None:
+    stream = MarkdownStream()
+    for chunk in chunks:
+        stream.feed(chunk)
+    stream.close()
+
+
+def _incremental_tk(text, chunks: list[str]) -> None:
+    import tkinter as tk
+
+    text.delete("1.0", tk.END)
+    stream = MarkdownStream()
+    for chunk in chunks:
+        args = []
+        for piece, tags in stream.feed(chunk):
+            args += [piece, ("role_assistant",) + tags]
+        if args:
+            text.insert(tk.END, *args)
+        text.update_idletasks()
+
+
+def _measure(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - started) * 1000.0
+
+
+def main() -> None:
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 40_000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    text_widget = None
+    try:
+        import tkinter as tk
+
+        root = tk.Tk()
+        root.withdraw()
+        text_widget = tk.Text(root, wrap=tk.WORD)
+        text_widget.pack()
+    except Exception as exc:  # no display
+        print(f"Tk ei käytettävissä ({exc.__class__.__name__}); mitataan vain jäsennys.")
+
+    header = f"{'merkkiä':>8} {'palasia':>8} {'uudelleen ms':>13} {'inkr. ms':>9} {'merkkiä/s':>11}"
+    if text_widget is not None:
+        header += f" {'Tk ms':>8}"
+    print(header)
+    for length in (total // 4, total // 2, total):
+        chunks = _chunks(_reply(length), size)
+        old = _measure(_reparse, chunks)
+        new = _measure(_incremental, chunks)
+        line = f"{length:>8} {len(chunks):>8} {old:>13.1f} {new:>9.1f} {length / max(new, 1e-6) * 1000:>11.0f}"
+        if text_widget is not None:
+            line += f" {_measure(_incremental_tk, text_widget, chunks):>8.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Measure inverted-index build, save/load and query time on a large history.
+
+Usage: python scripts/bench_search.py [messages]
+"""
+
+from __future__ import annotations
+
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from search_index import InvertedIndex, make_snippet
+
+_WORDS = (
+    "sää huomenna helsinki tampere äänekoski ohjelmointi python virhe tietokanta haku "
+    "kysymys vastaus malli liite kuva teksti päätös projekti aikataulu budjetti kokous "
+    "palvelin yhteys viive muisti levytila varmuuskopio käyttäjä asetukset profiili"
+).split()
+
+
+def _messages(count: int) -> list[str]:
+    rng = random.Random(42)
+    vocab = _WORDS + [f"sana{i}" for i in range(5000)]
+    return [" ".join(rng.choice(vocab) for _ in range(rng.randint(8, 60))) for _ in range(count)]
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    texts = _messages(count)
+    index = InvertedIndex()
+    started = time.perf_counter()
+    index.sync(texts)
+    print(f"indeksointi: {count} viestiä, {time.perf_counter() - started:.2f} s")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.index")
+        started = time.perf_counter()
+        index.save(path)
+        saved = time.perf_counter() - started
+        started = time.perf_counter()
+        index = InvertedIndex.load(path)
+        loaded = time.perf_counter() - started
+        print(f"tallennus {saved:.2f} s, lataus {loaded:.2f} s, {os.path.getsize(path) / 1e6:.1f} Mt")
+
+    for query in ("aanekoski", "päätös projekti", "tietok", "sana123", "budjetti kokous palvelin"):
+        started = time.perf_counter()
+        hits = index.search(query, limit=20)
+        elapsed = (time.perf_counter() - started) * 1000.0
+        snippet = make_snippet(texts[hits[0][0]], hits[0][2])[:70] if hits else "–"
+        print(f"{query!r:<28} {len(hits):>3} osumaa {elapsed:7.1f} ms  {snippet}")
+
+
+if __name__ == "__main__":
+    main()
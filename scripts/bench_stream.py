@@ -0,0 +1,115 @@
+"""Compare full re-render vs. append-only rendering of a streamed reply.
+
+Usage: python scripts/bench_stream.py [characters] [chunk size]
+
+Runs a quarter, half and all of ``characters`` (default 200000 → 50k/100k/200k)
+in chunks of ``chunk size`` (default 4).
+
+With a display, both strategies drive a real ``tk.Text``; without one only
+the Python side (accumulation and strip per chunk) is measured.
+"""
+
+from __future__ import annotations
+
+import pathlib
+import random
+import sys
+import time
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from stream_render import StreamText
+
+
+def _chunks(total: int, size: int) -> list[str]:
+    rng = random.Random(3)
+    words = "Tämä on pitkä vastaus, jossa on koodia ja selitystä.\n".split(" ")
+    text = ""
+    while len(text) < total:
+        text += rng.choice(words) + " "
+    return [text[i : i + size] for i in range(0, total, size)]
+
+
+def _old_python(chunks: list[str]) -> None:
+    accumulated = ""
+    for chunk in chunks:
+        accumulated += chunk
+        snapshot = accumulated
+        snapshot.strip() or "…"
+
+
+def _new_python(chunks: list[str]) -> None:
+    stream = StreamText()
+    for chunk in chunks:
+        stream.feed(chunk)
+    stream.text()
+
+
+def _old_tk(text, chunks: list[str]) -> None:
+    import tkinter as tk
+
+    text.delete("1.0", tk.END)
+    start = text.index(tk.END)
+    accumulated = ""
+    for chunk in chunks:
+        accumulated += chunk
+        text.delete(start, tk.END)
+        text.insert(tk.END, (accumulated.strip() or "…") + "\n\n", ("role_assistant",))
+        text.update_idletasks()
+
+
+def _new_tk(text, chunks: list[str]) -> None:
+    import tkinter as tk
+
+    text.delete("1.0", tk.END)
+    text.mark_set("stream_start", "end-1c")
+    text.mark_gravity("stream_start", tk.LEFT)
+    text.insert(tk.END, "...\n\n", ("role_assistant",))
+    text.mark_set("stream_tail", "end-3c")
+    stream = StreamText()
+    for chunk in chunks:
+        first = not stream.shown
+        piece = stream.feed(chunk)
+        if piece:
+            if first:
+                text.delete("stream_start", "stream_tail")
+            text.insert("stream_tail", piece, ("role_assistant",))
+        text.update_idletasks()
+
+
+def _measure(func, *args) -> float:
+    started = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - started) * 1000.0
+
+
+def main() -> None:
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    text_widget = None
+    try:
+        import tkinter as tk
+
+        root = tk.Tk()
+        root.withdraw()
+        text_widget = tk.Text(root, wrap=tk.WORD)
+        text_widget.pack()
+    except Exception as exc:  # no display
+        print(f"Tk ei käytettävissä ({exc.__class__.__name__}); mitataan vain Python-puoli.")
+
+    print(f"{'merkkiä':>8} {'palasia':>8} {'vanha ms':>10} {'uusi ms':>10}")
+    for length in (total // 4, total // 2, total):
+        chunks = _chunks(length, size)
+        if text_widget is not None:
+            old = _measure(_old_tk, text_widget, chunks)
+            new = _measure(_new_tk, text_widget, chunks)
+        else:
+            old = _measure(_old_python, chunks)
+            new = _measure(_new_python, chunks)
+        print(f"{length:>8} {len(chunks):>8} {old:>10.1f} {new:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Measure streaming import of a ChatGPT-style export and export to JSONL/MD/HTML.
+
+Usage: python scripts/bench_transfer.py [conversations] [messages per conversation]
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from history_db import SQLiteHistoryStore
+from history_transfer import format_throughput, iter_import, write_export
+
+
+def _write_chatgpt_export(path: str, conversations: int, per_conversation: int) -> None:
+    rng = random.Random(7)
+    words = "sää huomenna ohjelmointi python virhe tietokanta vastaus malli päätös projekti".split()
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write("[")
+        for c in range(conversations):
+            mapping = {"root": {"id": "root", "message": None, "parent": None, "children": ["m0"]}}
+            for m in range(per_conversation):
+                text = " ".join(rng.choice(words) for _ in range(rng.randint(20, 200)))
+                mapping[f"m{m}"] = {
+                    "id": f"m{m}",
+                    "parent": "root" if m == 0 else f"m{m - 1}",
+                    "children": [f"m{m + 1}"] if m + 1 < per_conversation else [],
+                    "message": {
+                        "author": {"role": "user" if m % 2 == 0 else "assistant"},
+                        "content": {"content_type": "text", "parts": [text]},
+                        "create_time": 1_700_000_000 + c * 1000 + m,
+                    },
+                }
+            item = {"title": f"Keskustelu {c}", "mapping": mapping, "current_node": f"m{per_conversation - 1}"}
+            fh.write(("," if c else "") + json.dumps(item, ensure_ascii=False))
+        fh.write("]")
+
+
+def main() -> None:
+    conversations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    per_conversation = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "conversations.json")
+        _write_chatgpt_export(source, conversations, per_conversation)
+        size = os.path.getsize(source)
+        print(f"lähde: {size / 1e6:.0f} Mt, {conversations} keskustelua")
+
+        db = os.path.join(tmp, "history.sqlite3")
+        stores = {}
+        started = time.perf_counter()
+        for ordinal, _title, batch in iter_import(source):
+            store = stores.get(ordinal)
+            if store is None:
+                store = stores[ordinal] = SQLiteHistoryStore(db, conversation_id=ordinal + 1)
+                store.count = 0
+            store.extend(store.count, batch)
+            store.count += len(batch)
+        elapsed = time.perf_counter() - started
+        total = sum(store.count for store in stores.values())
+        print(f"tuonti: {format_throughput(total, size, elapsed)}")
+
+        store = stores[0]
+        for ext in ("jsonl", "md", "html"):
+            result = write_export(store.iter_messages(), os.path.join(tmp, f"out.{ext}"), title="Keskustelu 0")
+            print(f"vienti .{ext}: {format_throughput(result['messages'], result['bytes'], result['seconds'])}")
+        for store in stores.values():
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Compare the per-pixel watermark opacity loop with the vectorised Pillow pipeline.
+
+Usage: python scripts/bench_watermark.py [image] [subsample] [opacity]
+
+"startup" is decode + subsample + opacity, "preview" is what one slider
+movement in the settings costs. With a display the old variant reads pixels
+through ``PhotoImage.get`` like the app did; without one it reads them
+through Pillow, which understates the old cost (no Tcl round-trips).
+"""
+
+from __future__ import annotations
+
+import pathlib
+import sys
+import time
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from watermark import PIL_AVAILABLE, blend_image, load_watermark_source
+
+BACKGROUND = (11, 18, 32)
+
+
+def _blend_pixels(get, width: int, height: int, opacity: float) -> list:
+    """The old loop: one pixel at a time, hex strings, blended in Python."""
+
+    out = []
+    for y in range(height):
+        for x in range(width):
+            pixel = get(x, y)
+            value = pixel.lstrip("#")
+            rgb = (int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16))
+            out.append(tuple(int(c * opacity + b * (1.0 - opacity)) for c, b in zip(rgb, BACKGROUND)))
+    return out
+
+
+def _old_tk(root, path: str, subsample: int, opacity: float) -> float:
+    import tkinter as tk
+
+    started = time.perf_counter()
+    raw = tk.PhotoImage(file=path, master=root)
+    scaled = raw.subsample(subsample, subsample) if subsample > 1 else raw
+
+    def get(x: int, y: int) -> str:
+        r, g, b = scaled.get(x, y)
+        return f"#{r:02x}{g:02x}{b:02x}"
+
+    _blend_pixels(get, scaled.width(), scaled.height(), opacity)
+    return (time.perf_counter() - started) * 1000.0
+
+
+def _old_python(path: str, subsample: int, opacity: float) -> float:
+    from PIL import Image
+
+    started = time.perf_counter()
+    with Image.open(path) as img:
+        rgb = img.convert("RGB")
+    if subsample > 1:
+        rgb = rgb.resize((rgb.width // subsample, rgb.height // subsample), Image.NEAREST)
+
+    def get(x: int, y: int) -> str:
+        return "#%02x%02x%02x" % rgb.getpixel((x, y))
+
+    pixels = _blend_pixels(get, rgb.width, rgb.height, opacity)
+    Image.new("RGB", rgb.size).putdata(pixels)
+    return (time.perf_counter() - started) * 1000.0
+
+
+def _new(path: str, subsample: int, opacity: float, root=None) -> tuple[float, float]:
+    started = time.perf_counter()
+    source = load_watermark_source(path, subsample)
+    image = blend_image(source, opacity, BACKGROUND)
+    if root is not None:
+        from PIL import ImageTk
+
+        ImageTk.PhotoImage(image, master=root)
+    startup = (time.perf_counter() - started) * 1000.0
+    started = time.perf_counter()
+    blend_image(source, opacity * 0.5, BACKGROUND)
+    preview = (time.perf_counter() - started) * 1000.0
+    return startup, preview
+
+
+def main() -> None:
+    if not PIL_AVAILABLE:
+        print("Pillow puuttuu: pip install pillow")
+        return
+    path = sys.argv[1] if len(sys.argv) > 1 else str(PROJECT_ROOT / "logo.png")
+    subsample = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    opacity = float(sys.argv[3]) if len(sys.argv) > 3 else 0.18
+    root = None
+    try:
+        import tkinter as tk
+
+        root = tk.Tk()
+        root.withdraw()
+    except Exception as exc:  # no display
+        print(f"Tk ei käytettävissä ({exc.__class__.__name__}); vanha tapa mitataan ilman Tcl-kutsuja.")
+
+    old = _old_tk(root, path, subsample, opacity) if root is not None else _old_python(path, subsample, opacity)
+    startup, preview = _new(path, subsample, opacity, root)
+    print(f"kuva: {path} (subsample {subsample}, opacity {opacity})")
+    print(f"{'':>10} {'vanha ms':>10} {'uusi ms':>10}")
+    print(f"{'käynnistys':>10} {old:>10.1f} {startup:>10.1f}")
+    print(f"{'esikatselu':>10} {old:>10.1f} {preview:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
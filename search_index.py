@@ -0,0 +1,292 @@
+"""In-process inverted index for full-text history search.
+
+Terms are normalised Finnish-aware: case-folded, with ä/ö/å (and other
+diacritics) folded to their base letters so that ``aanekoski`` finds
+``Äänekoski``. Postings are compact ``array`` columns (document id + term
+frequency) and results are ranked with BM25. Documents are message positions
+in a conversation and are added incrementally as messages are appended.
+
+The index is persisted as a single JSON file next to the history. It only
+needs to be saved occasionally: on load, messages past the indexed count are
+indexed again, and a fingerprint of the last indexed message detects a
+history that was replaced so the index can be rebuilt.
+"""
+
+from __future__ import annotations
+
+import base64
+import bisect
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from typing import Any, Dict, Final, Iterable, List, Optional, Sequence, Tuple
+
+from history_journal import atomic_write_bytes
+
+
+INDEX_VERSION: Final[int] = 1
+MIN_PREFIX_CHARS: Final[int] = 2
+SNIPPET_RADIUS: Final[int] = 60
+BM25_K1: Final[float] = 1.2
+BM25_B: Final[float] = 0.75
+
+_TOKEN_RE: Final = re.compile(r"\w+")
+
+
+def _fold_char(ch: str) -> str:
+    folded = unicodedata.normalize("NFKD", ch.casefold())
+    base = "".join(c for c in folded if not unicodedata.combining(c))
+    # Keep a 1:1 character mapping so match offsets line up with the original.
+    return base if len(base) == 1 else ch.lower()
+
+
+_FOLD_TABLE: Dict[str, str] = {}
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case and fold diacritics (ä→a, ö→o, å→a), preserving length."""
+
+    out = []
+    for ch in text:
+        if ch.isascii():
+            out.append(ch.lower())
+            continue
+        folded = _FOLD_TABLE.get(ch)
+        if folded is None:
+            folded = _FOLD_TABLE[ch] = _fold_char(ch)
+        out.append(folded)
+    return "".join(out)
+
+
+# Fast path for tokenizing: fold Latin-1 and Latin Extended-A letters with
+# str.translate; lengths may change here (ß -> ss), which is fine for terms.
+_TOKEN_FOLD: Final[Dict[int, str]] = {
+    code: _fold_char(chr(code)) for code in range(0xC0, 0x180) if chr(code).isalpha()
+}
+
+
+def tokenize(text: str) -> List[str]:
+    text = text.lower() if text.isascii() else text.casefold().translate(_TOKEN_FOLD)
+    return _TOKEN_RE.findall(text)
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def make_snippet(text: str, terms: Sequence[str], radius: int = SNIPPET_RADIUS) -> str:
+    """Excerpt around the first matching term, marked with «»."""
+
+    flat = " ".join(str(text or "").split())
+    normalized = normalize_text(flat)
+    best: Optional[Tuple[int, int]] = None
+    for term in terms:
+        match = re.search(r"\b" + re.escape(term) + r"\w*", normalized)
+        if match and (best is None or match.start() < best[0]):
+            best = (match.start(), match.end())
+    if best is None:
+        return flat[: radius * 2] + ("…" if len(flat) > radius * 2 else "")
+    start, end = best
+    left = max(0, start - radius)
+    right = min(len(flat), end + radius)
+    return (
+        ("…" if left > 0 else "")
+        + flat[left:start]
+        + "«"
+        + flat[start:end]
+        + "»"
+        + flat[end:right]
+        + ("…" if right < len(flat) else "")
+    )
+
+
+class _Postings:
+    __slots__ = ("docs", "freqs")
+
+    def __init__(self) -> None:
+        self.docs = array("I")
+        self.freqs = array("I")
+
+
+class InvertedIndex:
+    """Incremental BM25 inverted index over message texts."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        self._postings: Dict[str, _Postings] = {}
+        self._doc_len = array("I")
+        self._total_len = 0
+        self._tail = ""
+        self._tail_text: Optional[str] = None  # fingerprinted lazily
+        self._vocab: List[str] = []
+        self._vocab_dirty = False
+        self.dirty = True
+
+    @property
+    def doc_count(self) -> int:
+        return len(self._doc_len)
+
+    def _tail_fingerprint(self) -> str:
+        if self._tail_text is not None:
+            self._tail = _fingerprint(self._tail_text)
+            self._tail_text = None
+        return self._tail
+
+    # --- Building ---
+    def add(self, doc_id: int, text: str) -> None:
+        """Index message ``doc_id``; ids must be added in order (0, 1, 2, ...)."""
+
+        if doc_id != len(self._doc_len):
+            raise ValueError(f"expected document {len(self._doc_len)}, got {doc_id}")
+        counts: Dict[str, int] = {}
+        tokens = tokenize(text or "")
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        with self._lock:
+            for term, tf in counts.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = _Postings()
+                    self._vocab_dirty = True
+                postings.docs.append(doc_id)
+                postings.freqs.append(tf)
+            self._doc_len.append(len(tokens))
+            self._total_len += len(tokens)
+            self._tail_text = text or ""
+            self.dirty = True
+
+    def sync(self, texts: Sequence[str]) -> int:
+        """Bring the index up to date with ``texts``; returns documents indexed.
+
+        Rebuilds from scratch when the history no longer matches what was
+        indexed (cleared, replaced or shortened).
+        """
+
+        count = self.doc_count
+        if count > len(texts) or (count and _fingerprint(texts[count - 1] or "") != self._tail_fingerprint()):
+            self.clear()
+            count = 0
+        for doc_id in range(count, len(texts)):
+            self.add(doc_id, texts[doc_id])
+        return len(texts) - count
+
+    # --- Querying ---
+    def _expand(self, term: str, prefix: bool) -> List[str]:
+        if not prefix or len(term) < MIN_PREFIX_CHARS:
+            return [term] if term in self._postings else []
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+        vocab = self._vocab
+        out = []
+        for pos in range(bisect.bisect_left(vocab, term), len(vocab)):
+            if not vocab[pos].startswith(term):
+                break
+            out.append(vocab[pos])
+        return out
+
+    def search(self, query: str, limit: int = 50, prefix: bool = True) -> List[Tuple[int, float, List[str]]]:
+        """Return ``(doc_id, score, matched_terms)`` for documents matching every query term."""
+
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            n_docs = len(self._doc_len)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs or 1.0
+            scores: Optional[Dict[int, float]] = None
+            matched: Dict[int, List[str]] = {}
+            for term in terms:
+                term_scores: Dict[int, float] = {}
+                for word in self._expand(term, prefix):
+                    postings = self._postings[word]
+                    df = len(postings.docs)
+                    idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                    for doc, tf in zip(postings.docs, postings.freqs):
+                        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self._doc_len[doc] / avg_len)
+                        term_scores[doc] = term_scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {doc: score + term_scores[doc] for doc, score in scores.items() if doc in term_scores}
+                if not scores:
+                    return []
+                for doc in scores:
+                    matched.setdefault(doc, []).append(term)
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return [(doc, score, matched.get(doc, terms)) for doc, score in best]
+
+    # --- Persistence ---
+    def to_bytes(self) -> bytes:
+        with self._lock:
+            payload = {
+                "version": INDEX_VERSION,
+                "tail": self._tail_fingerprint(),
+                "doc_len": base64.b64encode(self._doc_len.tobytes()).decode("ascii"),
+                "postings": {
+                    term: [
+                        base64.b64encode(p.docs.tobytes()).decode("ascii"),
+                        base64.b64encode(p.freqs.tobytes()).decode("ascii"),
+                    ]
+                    for term, p in self._postings.items()
+                },
+            }
+            self.dirty = False
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def save(self, path: str) -> None:
+        atomic_write_bytes(path, self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "InvertedIndex":
+        """Load a saved index; a missing or unreadable file gives an empty index."""
+
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        try:
+            with open(path, "rb") as fh:
+                payload = json.loads(fh.read().decode("utf-8"))
+            if payload.get("version") != INDEX_VERSION:
+                return index
+            doc_len = array("I")
+            doc_len.frombytes(base64.b64decode(payload["doc_len"]))
+            postings: Dict[str, _Postings] = {}
+            for term, (docs_b64, freqs_b64) in payload["postings"].items():
+                entry = _Postings()
+                entry.docs.frombytes(base64.b64decode(docs_b64))
+                entry.freqs.frombytes(base64.b64decode(freqs_b64))
+                postings[term] = entry
+        except Exception:
+            return cls()
+        index._postings = postings
+        index._doc_len = doc_len
+        index._total_len = sum(doc_len)
+        index._tail = str(payload.get("tail") or "")
+        index._vocab_dirty = True
+        index.dirty = False
+        return index
+
+
+def message_texts(history: Iterable[Dict[str, Any]]) -> List[str]:
+    return [str(message.get("content") or "") for message in history]
+
+
+__all__ = [
+    "InvertedIndex",
+    "make_snippet",
+    "message_texts",
+    "normalize_text",
+    "tokenize",
+]
@@ -0,0 +1,286 @@
+"""Semantic history search: embedding vectors in a memory-mapped matrix.
+
+Each message of a conversation gets one embedding row (row = message
+position). Rows are L2-normalised float32 and appended to a raw ``.f32``
+file; a small JSON sidecar records the dimension, row count, the embedding
+model and a fingerprint of the last embedded message. Searching maps the file
+with ``numpy.memmap`` and ranks rows by dot product (cosine similarity) with
+``argpartition`` top-k, so the matrix is never copied into Python objects.
+
+Embeddings are computed off the Tk thread by :class:`EmbeddingIndexer`.
+NumPy is optional; without it semantic search is reported as unavailable.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Final, List, Optional, Sequence, Tuple, Union
+
+from history_journal import atomic_write_bytes
+
+try:  # pragma: no cover - depends on the environment
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None  # type: ignore[assignment]
+    NUMPY_AVAILABLE = False
+
+
+EMBED_MAX_CHARS: Final[int] = 2000
+EMBED_BATCH_SIZE: Final[int] = 16
+ERROR_BACKOFF_S: Final[float] = 30.0
+MAX_ERROR_BACKOFF_S: Final[float] = 600.0
+
+EmbedFn = Callable[[List[str]], List[Sequence[float]]]
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def prepare_text(text: str, limit: int = EMBED_MAX_CHARS) -> str:
+    """Collapse whitespace and cut to ``limit`` chars so it fits the model context."""
+
+    return " ".join(str(text or "").split())[:limit]
+
+
+def pool_embedding(raw: Any) -> List[float]:
+    """Return one vector; token-level output (list of vectors) is mean-pooled."""
+
+    if raw and isinstance(raw[0], (list, tuple)):
+        width = len(raw[0])
+        sums = [0.0] * width
+        for token in raw:
+            for i, value in enumerate(token):
+                sums[i] += float(value)
+        return [value / len(raw) for value in sums]
+    return [float(value) for value in raw]
+
+
+class VectorStore:
+    """Append-only float32 matrix on disk with a JSON sidecar."""
+
+    def __init__(self, path: str, model_id: str = "") -> None:
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("NumPy ei ole asennettuna; semanttinen haku ei ole käytössä.")
+        self.path = path
+        self.meta_path = path + ".json"
+        self.model_id = model_id
+        self._lock = threading.Lock()
+        self._matrix: Any = None
+        self._mapped_rows = -1
+        self.dim = 0
+        self.count = 0
+        self.generation = 0  # bumped by reset(); stale queued batches are skipped
+        self._tail = ""
+        self._load_meta()
+
+    def _load_meta(self) -> None:
+        meta: Dict[str, Any] = {}
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as fh:
+                meta = json.load(fh)
+        except (OSError, ValueError):
+            meta = {}
+        dim = int(meta.get("dim") or 0)
+        count = int(meta.get("count") or 0)
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if meta.get("model") != self.model_id or (dim and size < count * dim * 4):
+            # Different model or a truncated file: start over.
+            self.reset()
+            return
+        self.dim = dim
+        self.count = count
+        self._tail = str(meta.get("tail") or "")
+        if dim and size > count * dim * 4:
+            # Rows written after the last sidecar update are discarded.
+            with open(self.path, "r+b") as fh:
+                fh.truncate(count * dim * 4)
+
+    def _write_meta(self) -> None:
+        meta = {"dim": self.dim, "count": self.count, "model": self.model_id, "tail": self._tail}
+        atomic_write_bytes(self.meta_path, json.dumps(meta).encode("utf-8"))
+
+    def reset(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._matrix = None
+            self._mapped_rows = -1
+            self.dim = 0
+            self.count = 0
+            self._tail = ""
+            for path in (self.path, self.meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def matches(self, texts: Sequence[str]) -> bool:
+        """True if the stored rows were computed for a prefix of ``texts``."""
+
+        if self.count > len(texts):
+            return False
+        return self.matches_last(texts[self.count - 1] if self.count else "")
+
+    def matches_last(self, text: str) -> bool:
+        """True if ``text`` is what the last stored row was computed for.
+
+        :meth:`matches` without the list: the caller checks the length and
+        passes only message ``count - 1``.
+        """
+
+        return not self.count or _fingerprint(text or "") == self._tail
+
+    def append(
+        self,
+        position: int,
+        vectors: Sequence[Sequence[float]],
+        last_text: str,
+        generation: Optional[int] = None,
+    ) -> None:
+        """Append rows for positions ``position .. position+len(vectors)-1``.
+
+        Rows computed before a :meth:`reset` (an older ``generation``) are dropped.
+        """
+
+        if position != self.count or not vectors:
+            return
+        block = np.asarray(vectors, dtype=np.float32)
+        if block.ndim != 2:
+            raise ValueError("expected a 2-D block of vectors")
+        if self.dim and block.shape[1] != self.dim:
+            raise ValueError(f"embedding dimension changed: {block.shape[1]} != {self.dim}")
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        block = block / np.where(norms == 0, 1.0, norms)
+        with self._lock:
+            if position != self.count or (generation is not None and generation != self.generation):
+                return
+            with open(self.path, "ab") as fh:
+                fh.write(block.astype(np.float32, copy=False).tobytes())
+                fh.flush()
+                os.fsync(fh.fileno())
+            self.dim = int(block.shape[1])
+            self.count += int(block.shape[0])
+            self._tail = _fingerprint(last_text or "")
+            self._write_meta()
+
+    def _matrix_locked(self) -> Any:
+        if self._mapped_rows != self.count:
+            if not self.count:
+                self._matrix = None
+            else:
+                self._matrix = np.memmap(self.path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+            self._mapped_rows = self.count
+        return self._matrix
+
+    def search(self, query_vector: Sequence[float], limit: int = 20) -> List[Tuple[int, float]]:
+        """Top ``limit`` rows by cosine similarity, best first."""
+
+        with self._lock:
+            matrix = self._matrix_locked()
+            if matrix is None:
+                return []
+            query = np.asarray(query_vector, dtype=np.float32)
+            if query.shape != (self.dim,):
+                return []
+            norm = float(np.linalg.norm(query))
+            if norm == 0 or math.isnan(norm):
+                return []
+            scores = matrix @ (query / norm)
+        k = min(int(limit), scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+
+TextSource = Union[List[str], Callable[[], Sequence[str]]]
+
+
+class EmbeddingIndexer:
+    """Background thread that embeds queued messages into their vector store.
+
+    After a failed batch (typically the embedding model failing to load) the
+    jobs of the next :data:`ERROR_BACKOFF_S` seconds are dropped, doubling up
+    to :data:`MAX_ERROR_BACKOFF_S` while failures continue; ``on_error`` hears
+    only the first failure of such a streak.
+    """
+
+    def __init__(
+        self,
+        embed_fn: EmbedFn,
+        on_error: Optional[Callable[[BaseException], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.embed_fn = embed_fn
+        self.on_error = on_error
+        self._clock = clock
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._queue: "queue.Queue[Tuple[VectorStore, int, int, TextSource]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-indexer", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, store: VectorStore, start: int, texts: Sequence[str]) -> None:
+        """Queue ``texts`` (messages ``start..``) for embedding, in batches."""
+
+        for offset in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = list(texts[offset : offset + EMBED_BATCH_SIZE])
+            self._queue.put((store, store.generation, start + offset, batch))
+
+    def enqueue_lazy(self, store: VectorStore, start: int, load_texts: Callable[[], Sequence[str]]) -> None:
+        """Like :meth:`enqueue`, but ``load_texts()`` runs on the indexer thread."""
+
+        self._queue.put((store, store.generation, start, load_texts))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def join(self) -> None:
+        self._queue.join()
+
+    def _embed(self, store: VectorStore, generation: int, start: int, texts: Sequence[str]) -> None:
+        # Rows another job already stored are skipped, so overlapping jobs are cheap.
+        for offset in range(store.count - start, len(texts), EMBED_BATCH_SIZE):
+            if generation != store.generation or start + offset != store.count:
+                return
+            batch = list(texts[offset : offset + EMBED_BATCH_SIZE])
+            vectors = [pool_embedding(v) for v in self.embed_fn([prepare_text(t) for t in batch])]
+            store.append(start + offset, vectors, batch[-1], generation)
+
+    def _run(self) -> None:
+        while True:
+            store, generation, start, texts = self._queue.get()
+            try:
+                if self._clock() < self._retry_at:
+                    continue  # backing off; the owner queues the missing rows again later
+                if generation == store.generation and start <= store.count:
+                    self._embed(store, generation, start, texts() if callable(texts) else texts)
+                self._backoff = 0.0
+            except BaseException as exc:  # noqa: BLE001 - reported to the owner
+                first = not self._backoff
+                self._backoff = min(MAX_ERROR_BACKOFF_S, self._backoff * 2 or ERROR_BACKOFF_S)
+                self._retry_at = self._clock() + self._backoff
+                if first and self.on_error is not None:
+                    try:
+                        self.on_error(exc)
+                    except Exception:
+                        pass
+            finally:
+                self._queue.task_done()
+
+
+__all__ = [
+    "EMBED_BATCH_SIZE",
+    "EMBED_MAX_CHARS",
+    "ERROR_BACKOFF_S",
+    "EmbeddingIndexer",
+    "NUMPY_AVAILABLE",
+    "VectorStore",
+    "pool_embedding",
+    "prepare_text",
+]
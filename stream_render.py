@@ -0,0 +1,221 @@
+"""Append-only bookkeeping for streamed assistant replies.
+
+The chat used to delete and re-insert the whole reply on every chunk, which
+is quadratic in the reply length. :class:`StreamText` instead turns each
+delta into the text that has to be appended on screen, so the widget only
+ever receives new characters.
+
+:class:`MarkdownStream` sits after it and turns the appended text into
+tagged segments (headers, bold, inline code, fenced code blocks, list
+bullets). It keeps its parser state between deltas and holds back only the
+few characters that are still ambiguous, so every character is parsed once.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Final, List, Optional, Tuple
+
+Segment = Tuple[str, Tuple[str, ...]]
+
+
+class StreamText:
+    """Accumulates deltas; :meth:`feed` returns the part to append on screen.
+
+    What is shown always equals ``text().strip()``: leading whitespace is
+    dropped and trailing whitespace is held back until more text follows it.
+    """
+
+    def __init__(self) -> None:
+        self._parts: List[str] = []
+        self._pending_ws = ""
+        self.shown = 0  # characters appended on screen so far
+
+    def feed(self, delta: str) -> str:
+        if not delta:
+            return ""
+        self._parts.append(delta)
+        if not self.shown:
+            delta = delta.lstrip()
+        body = delta.rstrip()
+        if not body:
+            if self.shown:
+                self._pending_ws += delta
+            return ""
+        out = self._pending_ws + body
+        self._pending_ws = delta[len(body) :]
+        self.shown += len(out)
+        return out
+
+    def text(self) -> str:
+        """The full accumulated text (joined once, then cached)."""
+
+        if len(self._parts) > 1:
+            self._parts = ["".join(self._parts)]
+        return self._parts[0] if self._parts else ""
+
+
+_FENCE: Final = re.compile(r" {0,3}```")
+_HEADER: Final = re.compile(r"(#{1,6}) ")
+_BULLET: Final = re.compile(r"( *)[-*+] ")
+_ORDERED: Final = re.compile(r"( *)(\d{1,9}[.)]) ")
+# Line starts that may still turn into one of the markers above.
+_FENCE_START: Final = re.compile(r" {0,3}`{0,2}")
+_UNDECIDED: Final = re.compile(r" {0,3}`{0,2}|#{1,6}| *([-*+]|\d{1,9}[.)]?)?")
+_INLINE: Final = re.compile(r"\*\*|`")
+
+CODE_BLOCK_TAG: Final[str] = "md_code_block"
+
+
+class MarkdownStream:
+    """Incremental Markdown tokenizer; :meth:`feed` returns ``(text, tags)`` segments.
+
+    Markup characters are consumed (``**``, backticks, ``#`` prefixes, fence
+    lines); a fence's language is shown as a small label. Inline state is
+    reset at each line end so a stray marker cannot restyle the rest of the
+    reply.
+    """
+
+    def __init__(self) -> None:
+        self._pending = ""
+        self._line: Optional[str] = None  # None at a line start, else the line kind
+        self._line_tags: Tuple[str, ...] = ()
+        self._fence = False
+        self._bold = False
+        self._code = False
+
+    def feed(self, delta: str) -> List[Segment]:
+        out: List[Segment] = []
+        text = self._pending + delta
+        self._pending = ""
+        pos = 0
+        size = len(text)
+        while pos < size:
+            nl = text.find("\n", pos)
+            if self._line is None:
+                head = text[pos:] if nl < 0 else text[pos:nl]
+                if nl < 0 and self._undecided(head):
+                    self._pending = head
+                    break
+                pos = self._start_line(text, pos, nl, out)
+                continue
+            stop = size if nl < 0 else nl
+            if self._line == "code":
+                self._emit(out, text[pos:stop], (CODE_BLOCK_TAG,))
+            else:
+                self._inline(out, text[pos:stop], line_done=nl >= 0)
+            if nl < 0:
+                break
+            self._emit(out, "\n", (CODE_BLOCK_TAG,) if self._line == "code" else self._line_tags)
+            self._end_line()
+            pos = nl + 1
+        return out
+
+    def close(self) -> List[Segment]:
+        """Flush whatever is still held back (end of the reply)."""
+
+        out: List[Segment] = []
+        text, self._pending = self._pending, ""
+        pos = 0
+        if text and self._line is None:
+            pos = self._start_line(text, 0, -1, out)
+        if pos < len(text):
+            if self._line == "code":
+                self._emit(out, text[pos:], (CODE_BLOCK_TAG,))
+            else:
+                self._inline(out, text[pos:], line_done=True)
+        return out
+
+    # --- internals ---
+    def _undecided(self, head: str) -> bool:
+        if _FENCE.match(head) is not None:
+            return True  # fence lines are consumed whole, wait for the newline
+        if self._fence:
+            return _FENCE_START.fullmatch(head) is not None
+        return _UNDECIDED.fullmatch(head) is not None
+
+    def _start_line(self, text: str, pos: int, nl: int, out: List[Segment]) -> int:
+        fence = _FENCE.match(text, pos)
+        if fence is not None:
+            # Fence lines are consumed whole (a held-back head guarantees nl >= 0).
+            end = len(text) if nl < 0 else nl + 1
+            if not self._fence:
+                lang = text[fence.end() : end].strip()
+                if lang:
+                    self._emit(out, lang + "\n", ("md_code_lang",))
+            self._fence = not self._fence
+            return end
+        if self._fence:
+            self._line = "code"
+            return pos
+        self._line = "text"
+        header = _HEADER.match(text, pos)
+        if header is not None:
+            self._line_tags = (f"md_h{min(len(header.group(1)), 3)}",)
+            return header.end()
+        bullet = _BULLET.match(text, pos)
+        if bullet is not None:
+            self._emit(out, bullet.group(1) + "• ", ("md_bullet",))
+            return bullet.end()
+        ordered = _ORDERED.match(text, pos)
+        if ordered is not None:
+            self._emit(out, ordered.group(0), ("md_bullet",))
+            return ordered.end()
+        return pos
+
+    def _end_line(self) -> None:
+        self._line = None
+        self._line_tags = ()
+        self._bold = False
+        self._code = False
+
+    def _inline(self, out: List[Segment], chunk: str, line_done: bool) -> None:
+        if not line_done and chunk.endswith("*") and not self._code:
+            # A lone trailing "*" may become "**" with the next delta.
+            stars = len(chunk) - len(chunk.rstrip("*"))
+            if stars % 2:
+                self._pending = "*"
+                chunk = chunk[:-1]
+        last = 0
+        for match in _INLINE.finditer(chunk):
+            marker = match.group(0)
+            if marker == "**" and self._code:
+                continue
+            self._emit(out, chunk[last : match.start()], self._inline_tags())
+            if marker == "`":
+                self._code = not self._code
+            else:
+                self._bold = not self._bold
+            last = match.end()
+        self._emit(out, chunk[last:], self._inline_tags())
+
+    def _inline_tags(self) -> Tuple[str, ...]:
+        tags = self._line_tags
+        if self._code:
+            return tags + ("md_code",)
+        if self._bold:
+            return tags + ("md_bold",)
+        return tags
+
+    @staticmethod
+    def _emit(out: List[Segment], text: str, tags: Tuple[str, ...]) -> None:
+        if not text:
+            return
+        if out and out[-1][1] == tags:
+            out[-1] = (out[-1][0] + text, tags)
+        else:
+            out.append((text, tags))
+
+
+def render_markdown(text: str) -> List[Segment]:
+    """One-shot rendering of a complete message (history, non-streamed replies)."""
+
+    stream = MarkdownStream()
+    return stream.feed(text) + stream.close()
+
+
+def plain_text(segments: List[Segment]) -> str:
+    return "".join(text for text, _tags in segments)
+
+
+__all__ = ["CODE_BLOCK_TAG", "MarkdownStream", "Segment", "StreamText", "plain_text", "render_markdown"]
@@ -0,0 +1,199 @@
+"""Per-chunk timing traces of streamed replies.
+
+A :class:`StreamTrace` records when a request started, when the connection
+answered (response headers), when the first body bytes arrived, when each
+text chunk arrived and when the stream ended. Chunk arrival times are kept
+delta-encoded in microseconds in an ``array('I')`` together with each
+chunk's length, and are stored with the history entry as base64 so a long
+reply costs a few bytes per chunk. The same data drives timed playback
+(:func:`playback_schedule`) and per-model latency statistics
+(:func:`timing_stats`).
+"""
+
+from __future__ import annotations
+
+import base64
+import sys
+import time
+from array import array
+from typing import Any, Callable, Dict, Final, Iterable, List, Optional, Tuple
+
+from perf_metrics import percentile
+
+
+TRACE_VERSION: Final[int] = 1
+MIN_PLAYBACK_STEP_MS: Final[int] = 16  # coalesce chunks that arrived within one frame
+_MAX_US: Final[int] = 0xFFFFFFFF
+
+
+def _encode(values: array) -> str:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return base64.b64encode(values.tobytes()).decode("ascii")
+
+
+def _decode(text: str) -> array:
+    values = array("I")
+    values.frombytes(base64.b64decode(text.encode("ascii"), validate=True))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class StreamTrace:
+    """Timing of one streamed reply; marks are microseconds after the request started."""
+
+    def __init__(self, model: str = "", clock: Callable[[], float] = time.perf_counter) -> None:
+        self.model = model
+        self._clock = clock
+        self._start = clock()
+        self._last_us = 0
+        self.connect_us: Optional[int] = None
+        self.first_byte_us: Optional[int] = None
+        self.end_us: Optional[int] = None
+        self.gaps = array("I")  # microseconds since the previous chunk (the first: since start)
+        self.chars = array("I")  # characters in each chunk
+
+    def _now_us(self) -> int:
+        return min(_MAX_US, max(0, round((self._clock() - self._start) * 1_000_000)))
+
+    def mark_connect(self) -> None:
+        if self.connect_us is None:
+            self.connect_us = self._now_us()
+
+    def mark_first_byte(self) -> None:
+        if self.first_byte_us is None:
+            self.first_byte_us = self._now_us()
+
+    def chunk(self, text: str) -> None:
+        now = self._now_us()
+        self.gaps.append(max(0, now - self._last_us))
+        self.chars.append(min(_MAX_US, len(text)))
+        self._last_us = now
+
+    def finish(self) -> None:
+        self.end_us = self._now_us()
+
+    # --- derived values ---
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        """Time to the first text chunk."""
+
+        return self.gaps[0] / 1000.0 if self.gaps else None
+
+    def inter_token_ms(self) -> List[float]:
+        return [gap / 1000.0 for gap in self.gaps[1:]]
+
+    def offsets_ms(self) -> List[float]:
+        total = 0
+        out: List[float] = []
+        for gap in self.gaps:
+            total += gap
+            out.append(total / 1000.0)
+        return out
+
+    # --- persistence ---
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "v": TRACE_VERSION,
+            "model": self.model,
+            "connect_us": self.connect_us,
+            "first_byte_us": self.first_byte_us,
+            "end_us": self.end_us,
+            "gaps_us": _encode(self.gaps),
+            "chars": _encode(self.chars),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Any) -> Optional["StreamTrace"]:
+        """Rebuild a stored trace; ``None`` for missing or malformed data."""
+
+        if not isinstance(data, dict) or data.get("v") != TRACE_VERSION:
+            return None
+        try:
+            trace = cls(str(data.get("model") or ""))
+            trace.gaps = _decode(data["gaps_us"])
+            trace.chars = _decode(data["chars"])
+            for key in ("connect_us", "first_byte_us", "end_us"):
+                value = data.get(key)
+                setattr(trace, key, int(value) if value is not None else None)
+        except Exception:
+            return None
+        if len(trace.gaps) != len(trace.chars):
+            return None
+        return trace
+
+
+def playback_schedule(trace: StreamTrace, length: int, factor: float = 1.0) -> List[Tuple[int, int]]:
+    """``(delay_ms, end_pos)`` steps that reveal ``length`` characters with the recorded timing.
+
+    Chunks closer together than one frame are merged; ``factor`` scales the
+    delays (2.0 = half speed). The last step always ends at ``length``.
+    """
+
+    steps: List[Tuple[int, int]] = []
+    pos = 0
+    waited = 0.0
+    for gap, chars in zip(trace.gaps, trace.chars):
+        waited += gap / 1000.0 * factor
+        pos = min(length, pos + chars)
+        if waited >= MIN_PLAYBACK_STEP_MS or not steps:
+            steps.append((int(waited), pos))
+            waited = 0.0
+        else:
+            steps[-1] = (steps[-1][0], pos)
+    if not steps:
+        steps.append((0, length))
+    elif steps[-1][1] < length:
+        steps[-1] = (steps[-1][0], length)
+    return steps
+
+
+def timing_stats(entries: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per model: replies, TTFT p50/p95 and inter-token gap p50/p95 (ms)."""
+
+    ttft: Dict[str, List[float]] = {}
+    gaps: Dict[str, List[float]] = {}
+    for entry in entries:
+        trace = StreamTrace.from_dict(entry.get("timing"))
+        if trace is None or trace.ttft_ms is None:
+            continue
+        model = trace.model or "?"
+        ttft.setdefault(model, []).append(trace.ttft_ms)
+        gaps.setdefault(model, []).extend(trace.inter_token_ms())
+    stats: Dict[str, Dict[str, float]] = {}
+    for model, values in ttft.items():
+        model_gaps = gaps.get(model) or []
+        stats[model] = {
+            "replies": float(len(values)),
+            "ttft_p50": percentile(values, 50) or 0.0,
+            "ttft_p95": percentile(values, 95) or 0.0,
+            "itl_p50": percentile(model_gaps, 50) or 0.0,
+            "itl_p95": percentile(model_gaps, 95) or 0.0,
+        }
+    return stats
+
+
+def format_timing_stats(stats: Dict[str, Dict[str, float]]) -> str:
+    if not stats:
+        return "Ei ajoitustietoja vielä – ne tallentuvat uusien vastausten mukana."
+    lines = []
+    for model in sorted(stats):
+        row = stats[model]
+        lines.append(
+            f"{model}: {int(row['replies'])} vastausta\n"
+            f"  Ensimmäinen token p50 {row['ttft_p50']:.0f} ms · p95 {row['ttft_p95']:.0f} ms\n"
+            f"  Tokenien väli p50 {row['itl_p50']:.1f} ms · p95 {row['itl_p95']:.1f} ms"
+        )
+    return "\n\n".join(lines)
+
+
+__all__ = [
+    "MIN_PLAYBACK_STEP_MS",
+    "StreamTrace",
+    "TRACE_VERSION",
+    "format_timing_stats",
+    "playback_schedule",
+    "timing_stats",
+]
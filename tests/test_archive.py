@@ -0,0 +1,109 @@
+"""Unit tests for compressed conversation archives."""
+
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from archive import (
+    archive_file_name,
+    archive_store,
+    format_archive_report,
+    idle_conversations,
+    iter_archive,
+    list_archives,
+    normalize_archive_format,
+    restore_store,
+    summarize_archives,
+    write_archive,
+)
+from history_journal import HistoryJournal
+
+
+def _history(n: int) -> list:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"viesti {i} " + "sisältö " * 40, "timestamp": str(i)}
+        for i in range(n)
+    ]
+
+
+class ArchiveRoundTripTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_both_formats_round_trip_and_shrink(self) -> None:
+        history = _history(20)
+        for fmt in ("xz", "gz"):
+            path = os.path.join(self.tmp.name, archive_file_name(7, fmt))
+            info = write_archive(iter(history), path, fmt)
+            self.assertEqual(info["messages"], 20)
+            self.assertLess(info["archived_bytes"], info["original_bytes"] / 4)
+            self.assertEqual(list(iter_archive(path)), history)
+
+    def test_archive_and_restore_store(self) -> None:
+        snapshot = os.path.join(self.tmp.name, "history-3.json")
+        journal = HistoryJournal(snapshot)
+        history = _history(5)
+        for i, message in enumerate(history):
+            journal.append(i, message)
+        path = os.path.join(self.tmp.name, "archive", archive_file_name(3))
+        info = archive_store(journal, path, now=123.0)
+        self.assertEqual(info["file"], "conversation-3.jsonl.xz")
+        self.assertEqual(info["archived_at"], 123.0)
+        self.assertEqual(info["messages"], 5)
+        self.assertEqual(journal.load(), history)  # discarded by the caller later
+        journal.discard()
+        restored = restore_store(path, HistoryJournal(snapshot))
+        self.assertEqual(restored, history)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(HistoryJournal(snapshot).load(), history)
+
+    def test_list_archives(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in (archive_file_name(2, "gz"), archive_file_name(1, "xz"), "muu.txt", ".tmp-conversation-3.jsonl.xz"):
+                open(os.path.join(tmp, name), "wb").close()
+            self.assertEqual(
+                [os.path.basename(path) for path in list_archives(tmp)],
+                ["conversation-1.jsonl.xz", "conversation-2.jsonl.gz"],
+            )
+        self.assertEqual(list_archives(os.path.join(tmp, "puuttuu")), [])
+
+    def test_unknown_format_falls_back_to_xz(self) -> None:
+        self.assertEqual(normalize_archive_format(".GZ"), "gz")
+        self.assertEqual(normalize_archive_format("zip"), "xz")
+
+
+class IdleSelectionTests(unittest.TestCase):
+    def test_only_old_nonempty_unarchived_entries(self) -> None:
+        now = 100 * 86400.0
+        entries = [
+            {"id": 1, "message_count": 4, "updated_at": 0.0},
+            {"id": 2, "message_count": 4, "updated_at": now},
+            {"id": 3, "message_count": 0, "updated_at": 0.0},
+            {"id": 4, "message_count": 4, "updated_at": 0.0, "archived": {"file": "x"}},
+            {"id": 5, "message_count": 4, "updated_at": 0.0},
+        ]
+        self.assertEqual(idle_conversations(entries, 30, now=now, exclude={5}), [1])
+        self.assertEqual(idle_conversations(entries, 0, now=now), [])
+
+
+class ReportTests(unittest.TestCase):
+    def test_summary_uses_index_metadata_only(self) -> None:
+        entries = [
+            {"id": 1, "archived": {"original_bytes": 4096, "archived_bytes": 1024}},
+            {"id": 2},
+        ]
+        summary = summarize_archives(entries)
+        self.assertEqual(summary, {"conversations": 1, "original_bytes": 4096, "archived_bytes": 1024, "saved_bytes": 3072})
+        report = format_archive_report(summary, newly_archived=1)
+        self.assertIn("Säästö: 3.0 kt (75 %)", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""Unit tests for the type-aware attachment encoder pipeline."""
+
+import base64
+import pathlib
+import sys
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import attachment_utils
+from attachment_utils import (
+    CHARS_PER_TOKEN,
+    AttachmentBudget,
+    compose_attachment_lines,
+    encode_attachment,
+    fit_text_to_budget,
+    is_text_attachment,
+    looks_like_text,
+    register_attachment_encoder,
+    split_text_chunks,
+)
+
+
+def _att(name: str, mime: str, payload: bytes) -> dict:
+    return {
+        "name": name,
+        "mime": mime,
+        "size": len(payload),
+        "data": base64.b64encode(payload).decode("ascii"),
+    }
+
+
+class SniffingTests(unittest.TestCase):
+    def test_plain_utf8_is_text(self) -> None:
+        self.assertTrue(looks_like_text("Hei maailma – äöå\n".encode("utf-8")))
+
+    def test_nul_bytes_are_binary(self) -> None:
+        self.assertFalse(looks_like_text(b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"))
+
+    def test_invalid_utf8_is_binary(self) -> None:
+        self.assertFalse(looks_like_text(b"\xff\xfe\xfa" * 20))
+
+    def test_csv_declared_text(self) -> None:
+        att = _att("data.csv", "text/csv", b"a,b\n1,2\n")
+        self.assertTrue(is_text_attachment(att, b"a,b\n1,2\n"))
+
+    def test_known_binary_mime_is_not_sniffed_as_text(self) -> None:
+        self.assertFalse(is_text_attachment({"name": "x.png", "mime": "image/png"}, b"abc"))
+
+    def test_unknown_mime_falls_back_to_sniffing(self) -> None:
+        self.assertTrue(is_text_attachment({"name": "README", "mime": "tuntematon"}, b"hello"))
+
+
+class BudgetTests(unittest.TestCase):
+    def test_chunks_prefer_line_breaks(self) -> None:
+        chunks = split_text_chunks("aaa\nbbb\nccc\n", 5)
+        self.assertEqual("".join(chunks), "aaa\nbbb\nccc\n")
+        self.assertTrue(all(len(c) <= 5 for c in chunks))
+        self.assertEqual(chunks[0], "aaa\n")
+
+    def test_fit_within_budget_is_unchanged(self) -> None:
+        self.assertEqual(fit_text_to_budget("short", 100), ("short", 0))
+
+    def test_fit_truncates_and_reports_omitted(self) -> None:
+        text = "line\n" * 100
+        kept, omitted = fit_text_to_budget(text, 50)
+        self.assertLessEqual(len(kept), 50)
+        self.assertEqual(len(kept) + omitted, len(text))
+
+    def test_single_long_line_is_hard_cut(self) -> None:
+        kept, omitted = fit_text_to_budget("x" * 100, 10)
+        self.assertEqual(kept, "x" * 10)
+        self.assertEqual(omitted, 90)
+
+
+class EncoderTests(unittest.TestCase):
+    def test_text_attachment_is_sent_as_text(self) -> None:
+        payload = "print('hei')\n".encode("utf-8")
+        lines = encode_attachment(_att("main.py", "text/x-python", payload))
+        joined = "\n".join(lines)
+        self.assertIn("print('hei')", joined)
+        self.assertNotIn("BASE64:", joined)
+
+    def test_binary_attachment_keeps_base64(self) -> None:
+        payload = b"\x00\x01\x02\x03" * 8
+        att = _att("blob.bin", "application/octet-stream", payload)
+        lines = encode_attachment(att)
+        self.assertEqual(lines[-1], f"BASE64:{att['data']}")
+
+    def test_oversized_text_is_truncated_to_budget(self) -> None:
+        payload = ("rivi\n" * 5000).encode("utf-8")
+        lines = encode_attachment(_att("big.txt", "text/plain", payload), token_budget=10)
+        body = lines[2]
+        self.assertLessEqual(len(body), 10 * CHARS_PER_TOKEN)
+        self.assertTrue(lines[-1].startswith("[Liite katkaistu"))
+
+    def test_unread_bytes_are_estimated_as_characters(self) -> None:
+        payload = ("äö\n" * 3000).encode("utf-8")  # 5 bytes per 3 characters
+        lines = encode_attachment(_att("big.txt", "text/plain", payload), token_budget=10, data=payload[:1000])
+        kept = len(lines[2]) + 1  # the trailing newline is stripped from the shown text
+        self.assertEqual(lines[-1], f"[Liite katkaistu: noin {9000 - kept} merkkiä jätettiin pois token-budjetin vuoksi]")
+
+    def test_budget_is_shared_by_the_attachments_of_a_request(self) -> None:
+        budget = AttachmentBudget(token_budget=30)
+        first = _att("a.txt", "text/plain", b"x" * 30)
+        second = _att("b.txt", "text/plain", ("rivi\n" * 20).encode("utf-8"))
+        lines = compose_attachment_lines([first, second], budget)
+        self.assertEqual(lines[3], "x" * 30)
+        self.assertLess(len(lines[7]), 30 * CHARS_PER_TOKEN - 30)  # what the first one left
+        self.assertTrue(lines[-1].startswith("[Liite katkaistu"))
+        self.assertTrue(budget.exhausted)
+        later = encode_attachment(_att("c.txt", "text/plain", b"abc"), budget)
+        self.assertEqual(len(later), 1)
+        self.assertIn("token-budjetti on käytetty", later[0])
+        self.assertTrue(encode_attachment(_att("d.bin", "application/octet-stream", b"\x00\x01"), budget)[-1].startswith("BASE64:"))
+        self.assertIsNone(AttachmentBudget(0).remaining)
+
+    def test_compose_has_header(self) -> None:
+        lines = compose_attachment_lines([_att("a.txt", "text/plain", b"x")])
+        self.assertEqual(lines[0], "Liitteet:")
+
+    def test_registered_encoder_takes_precedence(self) -> None:
+        original = list(attachment_utils._ENCODERS)
+        try:
+            register_attachment_encoder(
+                "custom",
+                lambda att, data: att.get("name", "").endswith(".foo"),
+                lambda att, data, budget: ["CUSTOM"],
+            )
+            self.assertEqual(encode_attachment(_att("x.foo", "text/plain", b"a")), ["CUSTOM"])
+        finally:
+            attachment_utils._ENCODERS[:] = original
+
+    def test_failing_encoder_falls_back_to_base64(self) -> None:
+        original = list(attachment_utils._ENCODERS)
+
+        def _boom(att, data, budget):
+            raise ValueError("boom")
+
+        try:
+            register_attachment_encoder("broken", lambda att, data: True, _boom)
+            lines = encode_attachment(_att("a.txt", "text/plain", b"abc"))
+            self.assertTrue(lines[-1].startswith("BASE64:"))
+        finally:
+            attachment_utils._ENCODERS[:] = original
+
+
+if __name__ == "__main__":
+    unittest.main()
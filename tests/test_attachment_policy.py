@@ -0,0 +1,95 @@
+"""Unit tests for the older-attachment send policy."""
+
+import base64
+import pathlib
+import sys
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from attachment_utils import (
+    compose_attachment_lines,
+    estimate_encoded_size,
+    format_byte_count,
+    normalize_attachment_policy,
+    reference_attachment_lines,
+    resolve_attachment_mode,
+    user_turn_ages,
+)
+
+
+def _att(name: str, mime: str, payload: bytes) -> dict:
+    return {
+        "name": name,
+        "mime": mime,
+        "size": len(payload),
+        "data": base64.b64encode(payload).decode("ascii"),
+    }
+
+
+class TurnAgeTests(unittest.TestCase):
+    def test_latest_turn_has_age_zero(self) -> None:
+        history = [
+            {"role": "user"},
+            {"role": "assistant"},
+            {"role": "user"},
+            {"role": "assistant"},
+            {"role": "user"},
+        ]
+        self.assertEqual(user_turn_ages(history), [2, 2, 1, 1, 0])
+
+    def test_empty_history(self) -> None:
+        self.assertEqual(user_turn_ages([]), [])
+
+
+class PolicyResolutionTests(unittest.TestCase):
+    def test_full_policy_never_changes(self) -> None:
+        self.assertEqual(resolve_attachment_mode("full", 99, 1), "full")
+
+    def test_recent_turns_are_sent_in_full(self) -> None:
+        self.assertEqual(resolve_attachment_mode("drop", 1, 3), "full")
+
+    def test_old_turns_follow_policy(self) -> None:
+        self.assertEqual(resolve_attachment_mode("reference", 3, 3), "reference")
+        self.assertEqual(resolve_attachment_mode("drop", 5, 3), "drop")
+
+    def test_unknown_policy_defaults_to_full(self) -> None:
+        self.assertEqual(normalize_attachment_policy("bogus"), "full")
+        self.assertEqual(resolve_attachment_mode(None, 10, 0), "full")
+
+
+class ComposeModeTests(unittest.TestCase):
+    def test_drop_mode_emits_nothing(self) -> None:
+        self.assertEqual(compose_attachment_lines([_att("a.txt", "text/plain", b"x")], mode="drop"), [])
+
+    def test_reference_mode_omits_content(self) -> None:
+        payload = b"\x00\x01" * 500
+        lines = compose_attachment_lines([_att("a.bin", "application/octet-stream", payload)], mode="reference")
+        self.assertEqual(len(lines), 2)
+        self.assertNotIn("BASE64", "\n".join(lines))
+
+    def test_reference_includes_text_preview(self) -> None:
+        payload = "Hyvää huomenta, tässä muistio.\n".encode("utf-8") * 20
+        line = reference_attachment_lines(_att("muistio.txt", "text/plain", payload))[0]
+        self.assertIn("Hyvää huomenta", line)
+
+
+class SavingsTests(unittest.TestCase):
+    def test_binary_estimate_matches_base64_length(self) -> None:
+        att = _att("a.bin", "application/octet-stream", b"\x00" * 300)
+        self.assertEqual(estimate_encoded_size(att), len(att["data"]))
+
+    def test_text_estimate_is_capped_by_budget(self) -> None:
+        att = _att("a.txt", "text/plain", b"x" * 10000)
+        self.assertEqual(estimate_encoded_size(att, token_budget=100), 400)
+
+    def test_format_byte_count(self) -> None:
+        self.assertEqual(format_byte_count(512), "512 B")
+        self.assertEqual(format_byte_count(2048), "2.0 kt")
+        self.assertEqual(format_byte_count(3 * 1024 * 1024), "3.0 Mt")
+
+
+if __name__ == "__main__":
+    unittest.main()
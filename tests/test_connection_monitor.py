@@ -0,0 +1,154 @@
+"""Unit tests for the adaptive connection monitor."""
+
+import pathlib
+import sys
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from connection_monitor import (
+    BASE_INTERVAL_S,
+    MAX_INTERVAL_S,
+    ConnectionMonitor,
+    HttpProbe,
+    classify_status,
+    format_ping,
+    next_interval,
+)
+from perf_metrics import LatencyRecorder
+
+
+class PolicyTests(unittest.TestCase):
+    def test_classify_status(self) -> None:
+        self.assertEqual(classify_status(200, True), "ok")
+        self.assertEqual(classify_status(404, True), "ok")
+        self.assertEqual(classify_status(401, True), "ok")
+        self.assertEqual(classify_status(401, False), "warn")
+        self.assertEqual(classify_status(503, True), "warn")
+
+    def test_interval_backs_off(self) -> None:
+        self.assertEqual(next_interval("error", 0), BASE_INTERVAL_S)
+        self.assertEqual(next_interval("ok", 1), BASE_INTERVAL_S)
+        self.assertEqual(next_interval("ok", 2), 2 * BASE_INTERVAL_S)
+        self.assertEqual(next_interval("ok", 50), 8 * BASE_INTERVAL_S)
+        self.assertEqual(next_interval("ok", 50, idle=True), 16 * BASE_INTERVAL_S)
+        self.assertEqual(next_interval("ok", 50, idle=True, hidden=True), MAX_INTERVAL_S)
+        self.assertEqual(next_interval("error", 0, hidden=True), 4 * BASE_INTERVAL_S)
+
+    def test_format_ping(self) -> None:
+        rtt = LatencyRecorder()
+        self.assertEqual(format_ping(rtt, "ok"), "PING: -- ms")
+        self.assertEqual(format_ping(rtt, "error"), "PING: -- ms (ei yhteyttä)")
+        for value in (100, 110, 120, 130, 400):
+            rtt.record(value)
+        self.assertEqual(format_ping(rtt, "ok"), "PING: p50 120 · p95 400 ms")
+        self.assertTrue(format_ping(rtt, "warn").endswith("(varoitus)"))
+
+
+class ConnectionMonitorTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.results = [(50.0, "ok"), (60.0, "ok"), (None, "error"), (70.0, "ok")]
+        self.reports = []
+        self.monitor = ConnectionMonitor(
+            lambda: self.results.pop(0), lambda rtt, state: self.reports.append((rtt, state)), clock=lambda: self.now
+        )
+
+    def test_run_once_records_and_adapts(self) -> None:
+        intervals = [self.monitor.run_once() for _ in range(4)]
+        self.assertEqual(intervals, [BASE_INTERVAL_S, 2 * BASE_INTERVAL_S, BASE_INTERVAL_S, BASE_INTERVAL_S])
+        self.assertEqual(self.monitor.rtt.samples(), [50.0, 60.0, 70.0])
+        self.assertEqual(self.reports[2], (None, "error"))
+        self.assertEqual(self.monitor.state, "ok")
+
+    def test_idle_and_hidden_stretch_the_interval(self) -> None:
+        self.now = 1000.0
+        self.assertTrue(self.monitor.idle)
+        self.monitor.set_hidden(True)
+        self.assertEqual(self.monitor.run_once(), 8 * BASE_INTERVAL_S)
+        self.monitor.touch()
+        self.monitor.set_hidden(False)
+        self.assertEqual(self.monitor.run_once(), 2 * BASE_INTERVAL_S)
+
+    def test_probe_exception_counts_as_error(self) -> None:
+        def probe():
+            raise OSError("down")
+
+        monitor = ConnectionMonitor(probe, lambda rtt, state: self.reports.append(state))
+        monitor.run_once()
+        self.assertEqual(self.reports, ["error"])
+
+    def test_thread_probes_and_stops(self) -> None:
+        probed = threading.Event()
+        monitor = ConnectionMonitor(lambda: (1.0, "ok"), lambda rtt, state: probed.set())
+        monitor.start()
+        self.assertTrue(probed.wait(5))
+        monitor.stop()
+        monitor._thread.join(5)
+        self.assertFalse(monitor._thread.is_alive())
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    peers = set()
+
+    def do_GET(self) -> None:
+        _Handler.peers.add(self.client_address)
+        status = 200 if self.headers.get("Authorization") else 401
+        body = b'{"id": "malli"}'
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class HttpProbeTests(unittest.TestCase):
+    def setUp(self) -> None:
+        _Handler.peers = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.headers = {}
+        self.probe = HttpProbe(
+            "127.0.0.1", lambda: "/v1/models/malli", lambda: self.headers, https=False, port=self.server.server_port
+        )
+        self.addCleanup(self.probe.close)
+
+    def test_reuses_one_connection(self) -> None:
+        self.assertEqual(self.probe()[1], "warn")
+        self.headers = {"Authorization": "Bearer x"}
+        for _ in range(3):
+            rtt, state = self.probe()
+            self.assertEqual(state, "ok")
+            self.assertGreaterEqual(rtt, 0.0)
+        self.assertEqual(self.probe.connects, 1)
+        self.assertEqual(len(_Handler.peers), 1)
+
+    def test_retries_once_when_the_server_dropped_the_idle_connection(self) -> None:
+        self.headers = {"Authorization": "Bearer x"}
+        self.assertEqual(self.probe()[1], "ok")
+        self.probe._conn.sock.close()  # as if the server had closed it while idle
+        rtt, state = self.probe()
+        self.assertEqual(state, "ok")
+        self.assertIsNotNone(rtt)
+        self.assertEqual(self.probe.connects, 2)
+
+    def test_reconnects_after_failure(self) -> None:
+        self.probe()
+        self.server.shutdown()
+        self.server.server_close()
+        self.probe.close()
+        self.assertEqual(self.probe(), (None, "error"))
+        self.assertEqual(self.probe.connects, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Unit tests for the conversation index."""
+
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from conversations import DEFAULT_CONVERSATION_ID, ConversationIndex, derive_title, display_title
+from history_journal import HistoryJournal
+
+
+def _msg(role: str, content: str, ts: str = "01.01.2025 12:00:00") -> dict:
+    return {"role": role, "content": content, "timestamp": ts}
+
+
+class ConversationIndexTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "index.json")
+
+    def test_missing_index_starts_with_default_conversation(self) -> None:
+        index = ConversationIndex(self.path).load()
+        self.assertEqual(index.active_id, DEFAULT_CONVERSATION_ID)
+        self.assertEqual([e["id"] for e in index.entries()], [DEFAULT_CONVERSATION_ID])
+
+    def test_round_trip_through_bytes(self) -> None:
+        index = ConversationIndex(self.path).load()
+        created = index.create("Toinen")
+        index.active_id = created["id"]
+        with open(self.path, "wb") as fh:
+            fh.write(index.to_bytes())
+        loaded = ConversationIndex(self.path).load()
+        self.assertEqual(loaded.active_id, created["id"])
+        self.assertEqual(loaded.get(created["id"])["title"], "Toinen")
+        self.assertEqual(len(loaded), 2)
+
+    def test_update_from_history_counts_only_new_messages(self) -> None:
+        index = ConversationIndex(self.path).load()
+        history = [_msg("user", "hei"), _msg("assistant", "moi", "02.01.2025 08:00:00")]
+        index.update_from_history(1, history)
+        entry = index.get(1)
+        self.assertEqual((entry["message_count"], entry["size_bytes"]), (2, 6))
+        self.assertEqual(entry["last_timestamp"], "02.01.2025 08:00:00")
+        self.assertEqual(entry["title"], "hei")
+        history.append(_msg("user", "äö"))
+        index.update_from_history(1, history)
+        self.assertEqual(index.get(1)["size_bytes"], 10)
+        index.update_from_history(1, [], reset=True)
+        self.assertEqual((index.get(1)["message_count"], index.get(1)["size_bytes"]), (0, 0))
+
+    def test_entries_are_most_recent_first(self) -> None:
+        index = ConversationIndex(self.path).load()
+        second = index.create()
+        index.update(1, updated_at=10.0)
+        index.update(second["id"], updated_at=5.0)
+        self.assertEqual([e["id"] for e in index.entries()], [1, second["id"]])
+
+    def test_removing_active_picks_another(self) -> None:
+        index = ConversationIndex(self.path).load()
+        second = index.create()
+        index.active_id = second["id"]
+        index.remove(second["id"])
+        self.assertEqual(index.active_id, 1)
+
+    def test_corrupt_index_falls_back_to_default(self) -> None:
+        with open(self.path, "w", encoding="utf-8") as fh:
+            fh.write("{ei jsonia")
+        self.assertEqual(ConversationIndex(self.path).load().active_id, DEFAULT_CONVERSATION_ID)
+
+
+class TitleTests(unittest.TestCase):
+    def test_title_from_first_user_message(self) -> None:
+        history = [_msg("assistant", "Tervetuloa"), _msg("user", "Miten\n  teen " + "x" * 60)]
+        title = derive_title(history)
+        self.assertTrue(title.startswith("Miten"))
+        self.assertLessEqual(len(title), 40)
+        self.assertEqual(display_title({"id": 3, "title": ""}), "Keskustelu 3")
+
+
+class DiscardTests(unittest.TestCase):
+    def test_journal_discard_removes_files(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal = HistoryJournal(os.path.join(tmp, "history-2.json"))
+            journal.append(0, _msg("user", "hei"))
+            journal.rewrite([_msg("user", "hei")])
+            journal.discard()
+            self.assertEqual(os.listdir(tmp), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,193 @@
+"""Unit tests for the optional SQLite history store."""
+
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from history_db import (
+    LazyHistory,
+    SQLiteHistoryStore,
+    fts_query,
+    iter_timing_entries,
+    referenced_blob_ids,
+    stored_conversation_ids,
+)
+from persistence import HistorySync
+
+
+def _msg(i: int, content: str = "") -> dict:
+    return {
+        "role": "user" if i % 2 == 0 else "assistant",
+        "content": content or f"viesti {i}",
+        "timestamp": str(i),
+        "attachments": [],
+    }
+
+
+class SQLiteHistoryStoreTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "history.sqlite3")
+        self.store = self._open()
+
+    def _open(self) -> SQLiteHistoryStore:
+        store = SQLiteHistoryStore(self.path)
+        self.addCleanup(store.close)
+        return store
+
+    def test_appends_survive_reopen(self) -> None:
+        for i in range(3):
+            self.store.append(i, _msg(i))
+        self.assertEqual(self._open().load(), [_msg(0), _msg(1), _msg(2)])
+
+    def test_attachments_and_extra_keys_round_trip(self) -> None:
+        message = _msg(0)
+        message["attachments"] = [{"name": "a.txt", "mime": "text/plain", "size": 3, "blob": "ab" * 32}]
+        message["model"] = "gpt-4o-mini"
+        self.store.append(0, message)
+        self.assertEqual(self.store.load(), [message])
+
+    def test_stats_track_count_and_last_timestamp(self) -> None:
+        self.assertEqual(self.store.stats(), (0, None))
+        for i in range(4):
+            self.store.append(i, _msg(i))
+        self.assertEqual(self.store.stats(), (4, "3"))
+
+    def test_rows_return_prefixes_in_order(self) -> None:
+        self.store.append(0, _msg(0, "a" * 100))
+        self.store.append(1, _msg(1, "lyhyt"))
+        rows = self.store.rows(snippet_chars=10)
+        self.assertEqual(rows, [(0, "0", "user", "a" * 10), (1, "1", "assistant", "lyhyt")])
+        self.assertEqual(self.store.rows(start=1), [(1, "1", "assistant", "lyhyt")])
+
+    def test_search_matches_finnish_prefixes(self) -> None:
+        self.store.append(0, _msg(0, "Mikä on Äänekosken väkiluku?"))
+        self.store.append(1, _msg(1, "Hyvää huomenta"))
+        hits = self.store.search("äänekos")
+        self.assertEqual([hit[0] for hit in hits], [0])
+        if self.store.fts_enabled:
+            self.assertIn("«Äänekosken»", hits[0][3])
+
+    def test_replaced_position_is_not_found_by_old_text(self) -> None:
+        self.store.append(0, _msg(0, "vanha sisältö"))
+        self.store.append(0, _msg(0, "uusi sisältö"))
+        self.assertEqual(self.store.search("vanha"), [])
+        self.assertEqual(len(self.store.search("uusi")), 1)
+
+    def test_rewrite_with_reset_replaces_history(self) -> None:
+        for i in range(3):
+            self.store.append(i, _msg(i))
+        self.store.rewrite([], reset=True)
+        self.assertEqual(self.store.load(), [])
+        self.assertEqual(self.store.stats(), (0, None))
+        self.assertEqual(self.store.search("viesti"), [])
+        self.store.rewrite([_msg(0), _msg(1)])
+        self.assertEqual(self.store.stats(), (2, "1"))
+
+    def test_search_tolerates_query_syntax(self) -> None:
+        self.store.append(0, _msg(0, 'sano "hei" (heti)'))
+        self.assertEqual(len(self.store.search('"hei')), 1)
+        self.assertEqual(self.store.search("   "), [])
+
+    def test_conversations_are_isolated_and_discardable(self) -> None:
+        other = SQLiteHistoryStore(self.path, conversation_id=2)
+        other.append(0, _msg(0, "toinen keskustelu"))
+        self.store.append(0, _msg(0))
+        self.assertEqual(self.store.search("toinen"), [])
+        other.discard()
+        self.assertEqual(SQLiteHistoryStore(self.path, conversation_id=2).load(), [])
+        self.assertEqual(self.store.load(), [_msg(0)])
+
+    def test_extend_and_paged_iteration(self) -> None:
+        messages = [_msg(i) for i in range(7)]
+        messages[3]["attachments"] = [{"name": "a.txt", "size": 1}]
+        self.store.extend(0, messages[:5])
+        self.store.extend(5, messages[5:])
+        self.assertEqual(list(self.store.iter_messages(page_size=3)), messages)
+        self.assertEqual(self.store.stats(), (7, "6"))
+
+
+    def test_referenced_blob_ids_cover_every_conversation(self) -> None:
+        first = _msg(0)
+        first["attachments"] = [{"name": "a.png", "blob": "AB" * 32}]
+        self.store.append(0, first)
+        other = SQLiteHistoryStore(self.path, conversation_id=2)
+        self.addCleanup(other.close)
+        second = _msg(0)
+        second["attachments"] = [{"name": "b.txt", "blob": "cd" * 32}, {"name": "c.txt", "data": "eA=="}]
+        other.append(0, second)
+        self.assertEqual(referenced_blob_ids(self.path), {"ab" * 32, "cd" * 32})
+
+    def test_timing_entries_stream_from_every_conversation(self) -> None:
+        timed = _msg(1)
+        timed["timing"] = {"v": 1, "model": "m", "ttft_ms": 120.0}
+        self.store.extend(0, [_msg(0), timed])
+        other = SQLiteHistoryStore(self.path, conversation_id=3)
+        self.addCleanup(other.close)
+        other.append(0, dict(timed, timing={"v": 1, "model": "n", "ttft_ms": 80.0}))
+        self.assertEqual(stored_conversation_ids(self.path), {1, 3})
+        self.assertEqual([entry["timing"]["model"] for entry in iter_timing_entries(self.path)], ["m", "n"])
+        self.assertEqual([entry["timing"]["model"] for entry in iter_timing_entries(self.path, skip={1})], ["n"])
+
+
+class LazyHistoryTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = SQLiteHistoryStore(os.path.join(self.tmp.name, "history.sqlite3"))
+        self.addCleanup(self.store.close)
+        self.messages = [_msg(i) for i in range(23)]
+        self.messages[3]["attachments"] = [{"name": "a.txt", "mime": "text/plain", "size": 3, "blob": "cd" * 32}]
+        self.store.extend(0, self.messages)
+
+    def test_load_tail_and_range(self) -> None:
+        self.assertEqual(self.store.load_tail(5), (18, self.messages[18:]))
+        self.assertEqual(self.store.load_tail(50), (0, self.messages))
+        self.assertEqual(self.store.load_range(2, 6), self.messages[2:6])
+        self.assertEqual(self.store.load_range(6, 2), [])
+
+    def test_reads_only_the_tail_until_older_rows_are_needed(self) -> None:
+        history = LazyHistory(self.store, page_size=5)
+        self.assertEqual((history.base, history.tail), (18, self.messages[18:]))
+        self.assertEqual(len(history), 23)
+        self.assertEqual(history[3], self.messages[3])
+        self.assertEqual(history[-1], self.messages[-1])
+        self.assertEqual(history[-23], self.messages[0])
+        with self.assertRaises(IndexError):
+            history[23]
+        self.assertEqual(history[15:20], self.messages[15:20])
+        self.assertEqual(history[::7], self.messages[::7])
+        self.assertEqual(list(history), self.messages)
+        self.assertEqual(list(reversed(history)), self.messages[::-1])
+
+    def test_appends_and_snapshot_sync_to_the_store(self) -> None:
+        history = LazyHistory(self.store, page_size=5)
+        sync = HistorySync(self.store)
+        sync.reset_to(len(history))
+        history.append(_msg(23))
+        snapshot = history.snapshot()
+        history.append(_msg(24))
+        self.assertEqual(len(snapshot), 24)
+        sync.sync(snapshot, 0)
+        self.assertEqual(self.store.load(), self.messages + [_msg(23)])
+        sync.sync(history.snapshot(), 1)  # a reset rewrites from the lazy view itself
+        self.assertEqual(self.store.load(), self.messages + [_msg(23), _msg(24)])
+
+
+class FtsQueryTests(unittest.TestCase):
+    def test_terms_are_quoted_prefixes(self) -> None:
+        self.assertEqual(fts_query('hei "maailma'), '"hei"* """maailma"*')
+
+    def test_empty_input_gives_empty_query(self) -> None:
+        self.assertEqual(fts_query('  "" '), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""Unit tests for the append-only history journal."""
+
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from history_journal import HistoryJournal, atomic_write_bytes
+from persistence import HistorySync
+
+
+def _msg(i: int) -> dict:
+    return {"role": "user" if i % 2 == 0 else "assistant", "content": f"viesti {i}", "timestamp": str(i)}
+
+
+class HistoryJournalTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.snapshot = os.path.join(self.tmp.name, "history.json")
+        self.journal_path = os.path.join(self.tmp.name, "history.jsonl")
+
+    def _journal(self, **kwargs) -> HistoryJournal:
+        return HistoryJournal(self.snapshot, self.journal_path, **kwargs)
+
+    def test_legacy_json_file_is_loaded_transparently(self) -> None:
+        legacy = [_msg(0), _msg(1)]
+        with open(self.snapshot, "w", encoding="utf-8") as fh:
+            json.dump(legacy, fh, ensure_ascii=False, indent=2)
+        self.assertEqual(self._journal().load(), legacy)
+
+    def test_appends_are_replayed_on_load(self) -> None:
+        journal = self._journal()
+        for i in range(3):
+            journal.append(i, _msg(i))
+        self.assertFalse(os.path.exists(self.snapshot))
+        self.assertEqual(self._journal().load(), [_msg(0), _msg(1), _msg(2)])
+
+    def test_each_append_is_one_line(self) -> None:
+        journal = self._journal()
+        journal.append(0, {"role": "user", "content": "rivi1\nrivi2"})
+        with open(self.journal_path, "rb") as fh:
+            self.assertEqual(fh.read().count(b"\n"), 1)
+
+    def test_extend_writes_one_line_per_message(self) -> None:
+        journal = self._journal()
+        journal.extend(0, [_msg(0), _msg(1), _msg(2)])
+        with open(self.journal_path, "rb") as fh:
+            self.assertEqual(fh.read().count(b"\n"), 3)
+        self.assertEqual(list(self._journal().iter_messages()), [_msg(0), _msg(1), _msg(2)])
+
+    def test_iter_messages_streams_snapshot_then_journal(self) -> None:
+        journal = self._journal()
+        journal.extend(0, [_msg(0), _msg(1)])
+        journal.rewrite([_msg(0), _msg(1)])
+        journal.extend(2, [_msg(2), _msg(3)])
+        with open(self.journal_path, "ab") as fh:
+            fh.write(b'{"i": 4, "m": {"ro')  # torn append
+        messages = journal.iter_messages()
+        self.assertNotIsInstance(messages, list)
+        self.assertEqual(list(messages), [_msg(0), _msg(1), _msg(2), _msg(3)])
+        self.assertEqual(list(self._journal().iter_messages()), self._journal().load())
+
+    def test_strict_iteration_raises_on_unreadable_snapshot(self) -> None:
+        with open(self.snapshot, "wb") as fh:
+            fh.write(b'[{"role": "user", "con')
+        self.assertEqual(list(self._journal().iter_messages()), [])
+        with self.assertRaises(ValueError):
+            list(self._journal().iter_messages(strict=True))
+
+    def test_corrupt_snapshot_is_moved_aside_not_compacted_over(self) -> None:
+        with open(self.snapshot, "wb") as fh:
+            fh.write(b'[{"role": "user", "con')
+        with open(self.journal_path, "wb") as fh:
+            fh.write(b'{"i": 5, "m": {"role": "user", "content": "x"}}\n')
+        journal = self._journal()
+        self.assertEqual(journal.load(), [])
+        self.assertEqual(journal.quarantined, [self.snapshot + ".corrupt", self.journal_path + ".corrupt"])
+        self.assertFalse(os.path.exists(self.snapshot))
+        with open(self.snapshot + ".corrupt", "rb") as fh:
+            self.assertEqual(fh.read(), b'[{"role": "user", "con')
+        with open(self.snapshot, "w", encoding="utf-8") as fh:
+            fh.write("{}")  # valid JSON but not a list
+        journal.load()
+        self.assertEqual(journal.quarantined, [self.snapshot + ".corrupt.1"])
+        journal.load()
+        self.assertEqual(journal.quarantined, [])
+
+    def test_torn_trailing_line_is_dropped_and_truncated(self) -> None:
+        journal = self._journal()
+        journal.append(0, _msg(0))
+        with open(self.journal_path, "ab") as fh:
+            fh.write(b'{"i": 1, "m": {"role": "ass')
+        history = self._journal().load()
+        self.assertEqual(history, [_msg(0)])
+        with open(self.journal_path, "rb") as fh:
+            self.assertTrue(fh.read().endswith(b"}\n"))
+
+    def test_records_covered_by_snapshot_are_not_duplicated(self) -> None:
+        journal = self._journal()
+        for i in range(3):
+            journal.append(i, _msg(i))
+        # Simulate a crash after the snapshot was written but before the journal was trimmed.
+        atomic_write_bytes(self.snapshot, json.dumps([_msg(0), _msg(1), _msg(2)]).encode("utf-8"))
+        self.assertEqual(len(self._journal().load()), 3)
+
+    def test_compaction_moves_records_into_snapshot(self) -> None:
+        journal = self._journal(compact_records=3)
+        history = []
+        for i in range(3):
+            history.append(_msg(i))
+            journal.append(i, history[-1])
+        self.assertTrue(journal.needs_compaction())
+        # The writer thread compacts through HistorySync once the journal is full.
+        sync = HistorySync(journal)
+        sync.reset_to(len(history))
+        history.append(_msg(3))
+        sync.sync(history, epoch=0)
+        self.assertFalse(os.path.exists(self.journal_path))
+        with open(self.snapshot, "r", encoding="utf-8") as fh:
+            self.assertEqual(json.load(fh), history)
+        self.assertFalse(journal.needs_compaction())
+
+    def test_compaction_keeps_records_appended_after_snapshot(self) -> None:
+        journal = self._journal()
+        for i in range(3):
+            journal.append(i, _msg(i))
+        journal.rewrite([_msg(0), _msg(1)])
+        self.assertEqual(self._journal().load(), [_msg(0), _msg(1), _msg(2)])
+
+    def test_reset_discards_journal(self) -> None:
+        journal = self._journal()
+        for i in range(2):
+            journal.append(i, _msg(i))
+        journal.rewrite([], reset=True)
+        journal.append(0, _msg(5))
+        self.assertEqual(self._journal().load(), [_msg(5)])
+
+
+if __name__ == "__main__":
+    unittest.main()
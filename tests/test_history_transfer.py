@@ -0,0 +1,131 @@
+"""Unit tests for streaming history export and import."""
+
+import io
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from history_transfer import (  # noqa: E402
+    chatgpt_messages,
+    export_format_for_path,
+    iter_import,
+    iter_json_array,
+    normalize_message,
+    write_export,
+)
+
+
+def _message(i: int, role: str = "user") -> dict:
+    return {"role": role, "content": f"viesti {i} äö <b>", "attachments": [], "timestamp": "01.01.2024 12:00:00"}
+
+
+def _chatgpt_conversation(title: str, texts: list) -> dict:
+    mapping = {"root": {"id": "root", "message": None, "parent": None, "children": ["n0"]}}
+    for i, text in enumerate(texts):
+        mapping[f"n{i}"] = {
+            "id": f"n{i}",
+            "parent": "root" if i == 0 else f"n{i - 1}",
+            "children": [f"n{i + 1}"] if i + 1 < len(texts) else [],
+            "message": {
+                "author": {"role": "user" if i % 2 == 0 else "assistant"},
+                "content": {"content_type": "text", "parts": [text]},
+                "create_time": 1_700_000_000 + i,
+            },
+        }
+    return {"title": title, "mapping": mapping, "current_node": f"n{len(texts) - 1}"}
+
+
+class JsonArrayStreamTests(unittest.TestCase):
+    def test_elements_split_across_tiny_chunks(self) -> None:
+        items = [{"a": "ä" * 50, "n": i} for i in range(20)] + [123, "x", None]
+        data = ("\ufeff[ \n" + ",\n ".join(json.dumps(item, ensure_ascii=False) for item in items) + " ]").encode("utf-8")
+        read = []
+        parsed = list(iter_json_array(io.BytesIO(data), chunk_size=7, on_read=read.append))
+        self.assertEqual(parsed, items)
+        self.assertEqual(sum(read), len(data))
+
+    def test_empty_array_and_errors(self) -> None:
+        self.assertEqual(list(iter_json_array(io.BytesIO(b"  [ ] "))), [])
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.BytesIO(b'{"a": 1}')))
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.BytesIO(b'[{"a": 1}, {"b": ')))
+
+
+class ImportTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _write(self, name: str, payload: str) -> str:
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(payload)
+        return path
+
+    def test_chatgpt_export_follows_current_branch(self) -> None:
+        conversation = _chatgpt_conversation("Otsikko", ["kysymys", "vastaus", "jatko"])
+        # A sibling branch that is not on the current path.
+        conversation["mapping"]["alt"] = {
+            "id": "alt",
+            "parent": "n0",
+            "children": [],
+            "message": {"author": {"role": "assistant"}, "content": {"parts": ["hylätty"]}},
+        }
+        messages = chatgpt_messages(conversation)
+        self.assertEqual([m["content"] for m in messages], ["kysymys", "vastaus", "jatko"])
+        self.assertEqual([m["role"] for m in messages], ["user", "assistant", "user"])
+        self.assertTrue(messages[0]["timestamp"])
+
+    def test_import_batches_conversations(self) -> None:
+        conversations = [_chatgpt_conversation(f"K{c}", [f"t{c}-{i}" for i in range(5)]) for c in range(3)]
+        path = self._write("conversations.json", json.dumps(conversations))
+        batches = list(iter_import(path, batch_size=2))
+        self.assertEqual([b[0] for b in batches], [0, 0, 0, 1, 1, 1, 2, 2, 2])
+        self.assertEqual(batches[3][1], "K1")
+        self.assertEqual(sum(len(b[2]) for b in batches), 15)
+
+    def test_export_jsonl_round_trips_through_import(self) -> None:
+        messages = [_message(i, "user" if i % 2 == 0 else "assistant") for i in range(7)]
+        path = os.path.join(self.tmp.name, "vienti.jsonl")
+        result = write_export(iter(messages), path)
+        self.assertEqual(result["messages"], 7)
+        batches = list(iter_import(path, batch_size=3))
+        self.assertEqual({b[1] for b in batches}, {"vienti"})
+        self.assertEqual([m for b in batches for m in b[2]], messages)
+
+    def test_markdown_and_html_exports(self) -> None:
+        messages = [_message(0), {**_message(1, "assistant"), "attachments": [{"name": "kuva.png"}]}]
+        md_path = os.path.join(self.tmp.name, "out.md")
+        html_path = os.path.join(self.tmp.name, "out.html")
+        write_export(messages, md_path, title="Otsikko")
+        write_export(messages, html_path, title="Otsikko")
+        with open(md_path, encoding="utf-8") as fh:
+            markdown = fh.read()
+        with open(html_path, encoding="utf-8") as fh:
+            page = fh.read()
+        self.assertTrue(markdown.startswith("# Otsikko"))
+        self.assertIn("📎 kuva.png", markdown)
+        self.assertIn("&lt;b&gt;", page)
+        self.assertTrue(page.rstrip().endswith("</html>"))
+
+    def test_format_from_extension_and_message_normalisation(self) -> None:
+        self.assertEqual(export_format_for_path("a.HTM"), "html")
+        self.assertEqual(export_format_for_path("a.txt"), "jsonl")
+        self.assertIsNone(normalize_message({"role": "tool", "content": "x"}))
+        self.assertIsNone(normalize_message({"role": "user", "content": "  "}))
+        block = normalize_message({"role": "user", "content": [{"type": "text", "text": "hei"}]})
+        self.assertEqual(block["content"], "hei")
+
+
+if __name__ == "__main__":
+    unittest.main()
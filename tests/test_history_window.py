@@ -0,0 +1,87 @@
+"""Unit tests for windowed transcript rendering bookkeeping."""
+
+import pathlib
+import sys
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from history_window import (
+    DEFAULT_RENDER_WINDOW,
+    MIN_RENDER_WINDOW,
+    HistoryRenderWindow,
+    normalize_render_window,
+    normalize_scrollback,
+)
+
+
+class HistoryRenderWindowTests(unittest.TestCase):
+    def test_initial_window_is_newest_page(self) -> None:
+        window = HistoryRenderWindow(10)
+        self.assertEqual(window.reset(35), (25, 35))
+        self.assertTrue(window.has_older)
+
+    def test_short_history_is_rendered_fully(self) -> None:
+        window = HistoryRenderWindow(10)
+        self.assertEqual(window.reset(4), (0, 4))
+        self.assertFalse(window.has_older)
+
+    def test_older_pages_walk_back_to_start(self) -> None:
+        window = HistoryRenderWindow(10)
+        window.reset(25)
+        self.assertEqual(window.next_older(), (5, 15))
+        self.assertEqual(window.next_older(), (0, 5))
+        self.assertFalse(window.has_older)
+        self.assertEqual(window.next_older(), (0, 0))
+
+
+class ScrollbackTests(unittest.TestCase):
+    def test_appends_page_out_oldest_beyond_capacity(self) -> None:
+        window = HistoryRenderWindow(10, capacity=20)
+        window.reset(0)
+        dropped = []
+        for index in range(1000):
+            self.assertTrue(window.appended(index))
+            start, end = window.trim_front()
+            dropped.extend(range(start, end))
+            self.assertLessEqual(window.size, 20)
+        self.assertEqual(dropped, list(range(980)))
+        self.assertEqual((window.start, window.end), (980, 1000))
+
+    def test_non_adjacent_append_is_rejected(self) -> None:
+        window = HistoryRenderWindow(10)
+        window.reset(30)
+        self.assertFalse(window.appended(35))
+        self.assertEqual(window.end, 30)
+
+    def test_scrolling_back_and_forth_keeps_window_bounded(self) -> None:
+        window = HistoryRenderWindow(10, capacity=20)
+        window.reset(100)
+        window.next_older()
+        self.assertEqual(window.trim_back(), (100, 100))
+        window.next_older()
+        self.assertEqual(window.trim_back(), (90, 100))
+        self.assertTrue(window.has_newer(100))
+        self.assertEqual((window.start, window.end), (70, 90))
+        self.assertEqual(window.next_newer(100), (90, 100))
+        self.assertEqual(window.trim_front(), (70, 80))
+        self.assertFalse(window.has_newer(100))
+        self.assertEqual(window.next_newer(100), (100, 100))
+
+    def test_capacity_is_at_least_two_pages(self) -> None:
+        self.assertEqual(normalize_scrollback(5, 50), 100)
+        self.assertEqual(normalize_scrollback("bad", 50), 200)
+        self.assertEqual(HistoryRenderWindow(10, capacity=300).capacity, 300)
+
+
+class NormalizeRenderWindowTests(unittest.TestCase):
+    def test_invalid_and_small_values(self) -> None:
+        self.assertEqual(normalize_render_window("x"), DEFAULT_RENDER_WINDOW)
+        self.assertEqual(normalize_render_window(1), MIN_RENDER_WINDOW)
+        self.assertEqual(normalize_render_window("80"), 80)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+"""Unit tests for shared image handles."""
+
+import os
+import pathlib
+import sys
+import tempfile
+import threading
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from image_service import PIL_AVAILABLE, ImageDecodeService, SharedImage, image_key
+
+
+class SharedImageTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.logo = os.path.join(self.tmp.name, "logo.png")
+        with open(self.logo, "wb") as fh:
+            fh.write(b"png")
+        self.decoded = []
+        self.installed = []
+        self.image = SharedImage(self._decode, self._install)
+
+    def _decode(self, path, size):
+        self.decoded.append((path, size))
+        return ("pixels", size)
+
+    def _install(self, decoded):
+        self.installed.append(decoded)
+        return "shared-image"
+
+    def test_long_history_decodes_once(self) -> None:
+        for _ in range(1000):
+            self.assertEqual(self.image.get(self.logo, 24), "shared-image")
+        self.assertEqual(self.decoded, [(self.logo, 24)])
+        self.assertEqual(self.image.decodes, 1)
+
+    def test_size_or_file_change_rebuilds(self) -> None:
+        self.image.get(self.logo, 24)
+        self.image.get(self.logo, 32)
+        os.utime(self.logo, (1, 1))
+        self.image.get(self.logo, 32)
+        self.image.get(self.logo, 32)
+        self.assertEqual([size for _path, size in self.decoded], [24, 32, 32])
+        self.assertEqual(len(self.installed), 3)
+
+    def test_failures_are_remembered_per_key(self) -> None:
+        image = SharedImage(lambda path, size: self.decoded.append(size), self._install)
+        for _ in range(10):
+            self.assertIsNone(image.get(self.logo, 24))
+        for _ in range(10):
+            self.assertIsNone(image.get("", 24))
+        self.assertEqual(len(self.decoded), 1)
+        self.assertEqual(self.installed, [])
+
+    def test_deferred_decode_installs_later_and_drops_stale_results(self) -> None:
+        pending = []
+
+        def request(path, size, done):
+            pending.append((size, done))
+            return "placeholder"
+
+        image = SharedImage(request, self._install, deferred=True)
+        self.assertEqual(image.get(self.logo, 24), "placeholder")
+        self.assertEqual(image.get(self.logo, 24), "placeholder")
+        self.assertEqual(image.get(self.logo, 32), "placeholder")
+        pending[0][1](("pixels", 24))  # superseded by the 32 px request
+        self.assertEqual(self.installed, [])
+        pending[1][1](("pixels", 32))
+        self.assertEqual(self.installed, [("pixels", 32)])
+        self.assertEqual(image.get(self.logo, 32), "shared-image")
+        self.assertEqual(len(pending), 2)
+
+    def test_missing_file_key(self) -> None:
+        self.assertEqual(image_key(os.path.join(self.tmp.name, "puuttuu.png"), 5)[1:], (0.0, 5))
+        self.assertTrue(image_key(self.logo, 5)[1] > 0)
+
+
+class ImageDecodeServiceTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.logo = os.path.join(self.tmp.name, "logo.png")
+        with open(self.logo, "wb") as fh:
+            fh.write(b"png")
+        self.errors = []
+        self.decoded = []
+
+    def _service(self, deliver=None, **kwargs):
+        def decode(path):
+            self.decoded.append(path)
+            if path.endswith("rikki.png"):
+                raise OSError("broken")
+            return ("pixels", path)
+
+        service = ImageDecodeService(
+            deliver or (lambda callback, image: callback(image)),
+            on_error=lambda path, exc: self.errors.append(path),
+            decode=decode,
+            **kwargs,
+        )
+        self.addCleanup(service.close)
+        return service
+
+    def test_decodes_are_shared_and_failures_remembered(self) -> None:
+        service = self._service()
+        self.assertEqual(service.load(self.logo), ("pixels", self.logo))
+        self.assertEqual(service.load(self.logo), ("pixels", self.logo))
+        broken = os.path.join(self.tmp.name, "rikki.png")
+        self.assertIsNone(service.load(broken))
+        self.assertIsNone(service.load(broken))
+        self.assertEqual(self.decoded, [self.logo, broken])
+        self.assertEqual(self.errors, [broken])
+        self.assertEqual((service.decodes, service.hits), (2, 2))
+
+    def test_cache_is_bounded(self) -> None:
+        service = self._service(max_entries=2)
+        for name in ("a.png", "b.png", "c.png", "a.png"):
+            service.load(os.path.join(self.tmp.name, name))
+        self.assertEqual(service.decodes, 4)
+
+    def test_request_runs_on_the_worker_and_delivers(self) -> None:
+        delivered = threading.Event()
+        results = []
+
+        def deliver(callback, image):
+            results.append((threading.current_thread().name, callback, image))
+            delivered.set()
+
+        service = self._service(deliver=deliver)
+        callback = object()
+        service.request(self.logo, 0, callback, prepare=lambda image: image[0])
+        self.assertTrue(delivered.wait(5))
+        self.assertEqual(results, [("image-decoder", callback, "pixels")])
+
+
+@unittest.skipUnless(PIL_AVAILABLE, "Pillow not installed")
+class PillowDecodeTests(unittest.TestCase):
+    def test_sizes_derive_from_one_decode(self) -> None:
+        from PIL import Image
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "logo.png")
+            Image.new("RGB", (64, 32), (255, 0, 0)).save(path)
+            service = ImageDecodeService(lambda callback, image: callback(image))
+            full = service.load(path)
+            small = service.load(path, 16)
+            service.load(path, 24)
+            self.assertEqual((full.mode, full.size), ("RGBA", (64, 32)))
+            self.assertEqual(small.size, (16, 8))
+            self.assertEqual(service.decodes, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
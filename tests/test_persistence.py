@@ -0,0 +1,112 @@
+"""Unit tests for the background persistence writer and latency metrics."""
+
+import os
+import pathlib
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from history_journal import HistoryJournal, atomic_write_bytes
+from perf_metrics import LatencyRecorder, percentile
+from persistence import SLOW_SAVE_MS, BackgroundWriter, HistorySync
+
+
+def _msg(i: int) -> dict:
+    return {"role": "user", "content": f"viesti {i}", "timestamp": str(i)}
+
+
+class BackgroundWriterTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.errors = []
+        self.writer = BackgroundWriter(on_error=lambda key, exc: self.errors.append((key, exc)))
+        self.addCleanup(self.writer.close, 5)
+
+    def test_queued_jobs_with_same_key_are_coalesced(self) -> None:
+        gate = threading.Event()
+        written = []
+        self.writer.submit("block", gate.wait, 5)
+        for i in range(5):
+            self.writer.submit("config", written.append, i)
+        self.assertEqual(self.writer.queue_depth(), 2)
+        gate.set()
+        self.assertTrue(self.writer.flush(5))
+        self.assertEqual(written, [4])
+        self.assertEqual(self.writer.coalesced, 4)
+        self.assertEqual(self.writer.stats()["max_queue_depth"], 2)
+
+    def test_flush_writes_file_atomically(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "config.json")
+            self.writer.submit("config", atomic_write_bytes, path, b'{"a": 1}')
+            self.assertTrue(self.writer.flush(5))
+            with open(path, "rb") as fh:
+                self.assertEqual(fh.read(), b'{"a": 1}')
+            self.assertEqual(os.listdir(tmp), ["config.json"])
+
+    def test_errors_are_reported_and_latency_recorded(self) -> None:
+        def _fail() -> None:
+            raise OSError("levy täynnä")
+
+        self.writer.submit("history", _fail)
+        self.assertTrue(self.writer.flush(5))
+        self.assertEqual(self.errors[0][0], "history")
+        self.assertEqual(self.writer.latency["history"].count, 1)
+        self.assertTrue(self.writer.is_idle())
+
+    def test_slow_saves_are_reported_to_the_owner(self) -> None:
+        slow = []
+        writer = BackgroundWriter(on_slow=lambda key, ms, depth: slow.append((key, depth)))
+        self.addCleanup(writer.close, 5)
+        writer.submit("history", time.sleep, SLOW_SAVE_MS / 1000.0 + 0.05)
+        self.assertTrue(writer.flush(5))
+        self.assertEqual(slow, [("history", 0)])
+
+
+class HistorySyncTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.snapshot = os.path.join(self.tmp.name, "history.json")
+
+    def _journal(self) -> HistoryJournal:
+        return HistoryJournal(self.snapshot)
+
+    def test_coalesced_snapshot_appends_all_new_entries(self) -> None:
+        sync = HistorySync(self._journal())
+        sync.sync([_msg(0), _msg(1), _msg(2)], epoch=0)
+        self.assertEqual(sync.synced_count, 3)
+        self.assertEqual(self._journal().load(), [_msg(0), _msg(1), _msg(2)])
+
+    def test_epoch_change_rewrites_even_when_longer(self) -> None:
+        sync = HistorySync(self._journal())
+        sync.sync([_msg(0)], epoch=0)
+        # History cleared and two new messages arrive before the writer runs.
+        sync.sync([_msg(7), _msg(8)], epoch=1)
+        self.assertEqual(self._journal().load(), [_msg(7), _msg(8)])
+
+
+class PercentileTests(unittest.TestCase):
+    def test_nearest_rank(self) -> None:
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertIsNone(percentile([], 50))
+
+    def test_recorder_keeps_window_but_counts_all(self) -> None:
+        rec = LatencyRecorder(maxlen=3)
+        for value in (10, 1, 2, 3):
+            rec.record(value)
+        self.assertEqual(rec.samples(), [1.0, 2.0, 3.0])
+        summary = rec.summary()
+        self.assertEqual(summary["count"], 4)
+        self.assertEqual(summary["max"], 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,7 +10,7 @@ PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
-from playback_utils import MAX_FONT_SIZE, MIN_FONT_SIZE, clamp_font_size, resolve_speed_delay
+from playback_utils import MAX_FONT_SIZE, MIN_FONT_SIZE, clamp_font_size, resolve_speed_delay, resolve_speed_factor
 
 
 class ClampFontSizeTests(unittest.TestCase):
@@ -40,5 +40,13 @@ class ResolveSpeedDelayTests(unittest.TestCase):
         self.assertEqual(resolve_speed_delay("warp"), normal)
 
 
+class ResolveSpeedFactorTests(unittest.TestCase):
+    def test_factors(self) -> None:
+        self.assertEqual(resolve_speed_factor("normal"), 1.0)
+        self.assertGreater(resolve_speed_factor("Slow"), 1.0)
+        self.assertLess(resolve_speed_factor("fast"), 1.0)
+        self.assertEqual(resolve_speed_factor("warp"), 1.0)
+
+
 if __name__ == "__main__":
     unittest.main()
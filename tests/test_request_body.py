@@ -0,0 +1,148 @@
+"""Unit tests for the streaming request body writer and attachment blobs."""
+
+import base64
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import patch
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import attachment_utils
+from attachment_utils import AttachmentBlobStore, attachment_bytes, encode_attachment, message_blob_ids, scan_blob_ids
+from request_body import Base64FilePart, StreamedText, iter_json_body, join_lines, materialize
+
+
+class StreamingJsonTests(unittest.TestCase):
+    def test_plain_payload_round_trips(self) -> None:
+        payload = {
+            "model": "gpt-4o-mini",
+            "messages": [{"role": "user", "content": "Hei \"maailma\"\n– äö"}],
+            "temperature": 0.7,
+            "max_tokens": None,
+            "stream": True,
+        }
+        body = b"".join(iter_json_body(payload, buffer_size=8))
+        self.assertEqual(json.loads(body.decode("utf-8")), payload)
+
+    def test_streamed_text_is_serialized_as_one_string(self) -> None:
+        content = StreamedText(["alku\n", "\"lainaus\"", "\tloppu"])
+        body = b"".join(iter_json_body({"content": content}))
+        self.assertEqual(json.loads(body)["content"], "alku\n\"lainaus\"\tloppu")
+
+    def test_join_lines_stays_plain_without_parts(self) -> None:
+        self.assertEqual(join_lines(["a", "b"]), "a\nb")
+
+    def test_materialize_replaces_lazy_text(self) -> None:
+        obj = {"messages": [{"content": StreamedText(["x", "y"])}]}
+        self.assertEqual(materialize(obj), {"messages": [{"content": "xy"}]})
+
+
+class Base64FilePartTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _write(self, payload: bytes) -> str:
+        path = os.path.join(self.tmp.name, "blob.bin")
+        with open(path, "wb") as fh:
+            fh.write(payload)
+        return path
+
+    def test_incremental_encoding_matches_one_shot(self) -> None:
+        payload = os.urandom(10_001)
+        part = Base64FilePart(self._write(payload), prefix="BASE64:", read_size=1000)
+        self.assertEqual(str(part), "BASE64:" + base64.b64encode(payload).decode("ascii"))
+
+    def test_read_size_is_rounded_to_multiple_of_three(self) -> None:
+        part = Base64FilePart(self._write(b"abc"), read_size=1024)
+        self.assertEqual(part.read_size % 3, 0)
+
+    def test_peak_memory_stays_near_buffer_size(self) -> None:
+        path = self._write(os.urandom(3 * 1024 * 1024))
+        payload = {
+            "messages": [
+                {"role": "user", "content": join_lines(["liite", Base64FilePart(path, prefix="BASE64:")])}
+            ]
+        }
+        tracemalloc.start()
+        try:
+            total = 0
+            for block in iter_json_body(payload):
+                total += len(block)
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertGreater(total, 4 * 1024 * 1024)
+        self.assertLess(peak, 1024 * 1024)
+
+
+class BlobStoreTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = AttachmentBlobStore(os.path.join(self.tmp.name, "attachments"))
+
+    def _source(self, payload: bytes) -> str:
+        path = os.path.join(self.tmp.name, "source.dat")
+        with open(path, "wb") as fh:
+            fh.write(payload)
+        return path
+
+    def test_put_file_is_content_addressed(self) -> None:
+        blob_a, size = self.store.put_file(self._source(b"sama sisalto"))
+        blob_b, _ = self.store.put_file(self._source(b"sama sisalto"))
+        self.assertEqual(blob_a, blob_b)
+        self.assertEqual(size, 12)
+        self.assertEqual(self.store.read(blob_a), b"sama sisalto")
+
+    def test_invalid_blob_id_is_rejected(self) -> None:
+        with self.assertRaises(ValueError):
+            self.store.path_for("../../etc/passwd")
+
+    def test_attachment_bytes_reads_blob_prefix(self) -> None:
+        blob_id, size = self.store.put_file(self._source(b"0123456789"))
+        att = {"name": "a.txt", "blob": blob_id, "size": size}
+        self.assertEqual(attachment_bytes(att, limit=4, store=self.store), b"0123")
+
+    def test_binary_blob_is_encoded_lazily(self) -> None:
+        blob_id, size = self.store.put_file(self._source(b"\x00\x01\x02" * 100))
+        att = {"name": "a.bin", "mime": "application/octet-stream", "blob": blob_id, "size": size}
+        with patch.object(attachment_utils, "default_blob_store", self.store):
+            lines = encode_attachment(att)
+        self.assertIsInstance(lines[-1], Base64FilePart)
+        self.assertEqual(str(lines[-1]), "BASE64:" + base64.b64encode(b"\x00\x01\x02" * 100).decode())
+
+    def test_sweep_removes_only_old_unreferenced_blobs(self) -> None:
+        kept, _ = self.store.put_file(self._source(b"viitattu"))
+        dropped, size = self.store.put_file(self._source(b"unohdettu"))
+        fresh, _ = self.store.put_file(self._source(b"juuri liitetty"))
+        for blob_id in (kept, dropped):
+            os.utime(self.store.path_for(blob_id), (1000, 1000))
+        live = message_blob_ids([{"attachments": [{"blob": kept.upper()}, {"data": "eA=="}]}, {}])
+        self.assertEqual(live, {kept})
+        self.assertEqual(self.store.sweep(live, grace_s=60), (1, size))
+        self.assertTrue(self.store.exists(kept))
+        self.assertFalse(self.store.exists(dropped))
+        self.assertTrue(self.store.exists(fresh))
+
+    def test_scan_blob_ids_reads_unparsable_json(self) -> None:
+        blob_id = "ab" * 32
+        data = b'[{"attachments": [{"blob": "' + blob_id.upper().encode() + b'"}, {"blob" : "xyz"}]}, {"con'
+        self.assertEqual(scan_blob_ids(data), {blob_id})
+
+    def test_reattaching_restarts_the_grace_period(self) -> None:
+        blob_id, _ = self.store.put_file(self._source(b"uudelleen"))
+        os.utime(self.store.path_for(blob_id), (1000, 1000))
+        self.store.put_file(self._source(b"uudelleen"))
+        self.assertEqual(self.store.sweep(set(), grace_s=60), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Unit tests for the incremental inverted history index."""
+
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from search_index import InvertedIndex, make_snippet, normalize_text, tokenize
+
+
+class NormalizationTests(unittest.TestCase):
+    def test_finnish_letters_fold_to_base(self) -> None:
+        self.assertEqual(tokenize("Äänekoski, Åland ja ÖLJY"), ["aanekoski", "aland", "ja", "oljy"])
+
+    def test_normalize_text_keeps_length(self) -> None:
+        text = "Päätös ß Ωmega"
+        self.assertEqual(len(normalize_text(text)), len(text))
+
+
+class InvertedIndexTests(unittest.TestCase):
+    def _index(self, texts) -> InvertedIndex:
+        index = InvertedIndex()
+        index.sync(texts)
+        return index
+
+    def test_query_without_diacritics_matches(self) -> None:
+        index = self._index(["Muutto Äänekoskelle", "Sää on hyvä"])
+        self.assertEqual([hit[0] for hit in index.search("aanekoskelle")], [0])
+        self.assertEqual([hit[0] for hit in index.search("saa")], [1])
+
+    def test_all_terms_must_match_and_prefixes_expand(self) -> None:
+        index = self._index(["tietokanta on hidas", "tietokone on nopea", "hidas juna"])
+        self.assertEqual({hit[0] for hit in index.search("tieto")}, {0, 1})
+        self.assertEqual([hit[0] for hit in index.search("tieto hidas")], [0])
+        self.assertEqual(index.search("tieto juna"), [])
+
+    def test_ranking_prefers_more_occurrences(self) -> None:
+        index = self._index(["python", "python python python", "java"])
+        self.assertEqual(index.search("python")[0][0], 1)
+
+    def test_documents_must_be_added_in_order(self) -> None:
+        index = InvertedIndex()
+        with self.assertRaises(ValueError):
+            index.add(1, "väärä järjestys")
+
+    def test_sync_indexes_only_new_messages(self) -> None:
+        index = self._index(["yksi", "kaksi"])
+        self.assertEqual(index.sync(["yksi", "kaksi", "kolme"]), 1)
+        self.assertEqual(index.doc_count, 3)
+
+    def test_sync_rebuilds_replaced_history(self) -> None:
+        index = self._index(["vanha", "historia"])
+        index.sync(["uusi", "keskustelu"])
+        self.assertEqual(index.search("vanha"), [])
+        self.assertEqual([hit[0] for hit in index.search("uusi")], [0])
+
+    def test_save_and_load_round_trip(self) -> None:
+        index = self._index(["Hyvää huomenta", "Päätettiin siirtää kokous"])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "history.index")
+            index.save(path)
+            loaded = InvertedIndex.load(path)
+        self.assertFalse(loaded.dirty)
+        self.assertEqual(loaded.doc_count, 2)
+        self.assertEqual([hit[0] for hit in loaded.search("paatettiin")], [1])
+        self.assertEqual(loaded.sync(["Hyvää huomenta", "Päätettiin siirtää kokous"]), 0)
+
+    def test_unreadable_file_gives_empty_index(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "history.index")
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write("{rikki")
+            self.assertEqual(InvertedIndex.load(path).doc_count, 0)
+
+
+class SnippetTests(unittest.TestCase):
+    def test_snippet_marks_original_text(self) -> None:
+        text = "alku " * 30 + "Äänekoskella sataa" + " loppu" * 30
+        snippet = make_snippet(text, ["aanekosk"], radius=10)
+        self.assertIn("«Äänekoskella»", snippet)
+        self.assertTrue(snippet.startswith("…") and snippet.endswith("…"))
+
+
+if __name__ == "__main__":
+    unittest.main()
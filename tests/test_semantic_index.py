@@ -0,0 +1,127 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from semantic_index import (  # noqa: E402
+    EMBED_BATCH_SIZE,
+    ERROR_BACKOFF_S,
+    NUMPY_AVAILABLE,
+    EmbeddingIndexer,
+    VectorStore,
+    pool_embedding,
+    prepare_text,
+)
+
+
+def _fake_embed(texts):
+    # Three-dimensional "embedding": counts of a, b and c.
+    return [[t.count("a") + 0.01, t.count("b"), t.count("c")] for t in texts]
+
+
+class PrepareTextTests(unittest.TestCase):
+    def test_collapses_whitespace_and_truncates(self) -> None:
+        self.assertEqual(prepare_text("  hei\n\n maailma  "), "hei maailma")
+        self.assertEqual(prepare_text("x" * 50, limit=10), "x" * 10)
+
+    def test_pool_embedding_mean_pools_token_vectors(self) -> None:
+        self.assertEqual(pool_embedding([1, 2, 3]), [1.0, 2.0, 3.0])
+        self.assertEqual(pool_embedding([[1, 2], [3, 4]]), [2.0, 3.0])
+
+
+@unittest.skipUnless(NUMPY_AVAILABLE, "numpy not installed")
+class VectorStoreTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "vectors.f32")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_search_ranks_by_cosine_similarity(self) -> None:
+        store = VectorStore(self.path, "m")
+        texts = ["aaa", "bbb", "ccc", "aab"]
+        store.append(0, _fake_embed(texts), texts[-1])
+        hits = store.search(_fake_embed(["a"])[0], limit=2)
+        self.assertEqual([row for row, _score in hits], [0, 3])
+        self.assertGreater(hits[0][1], hits[1][1])
+
+    def test_reopen_keeps_rows_and_detects_replaced_history(self) -> None:
+        texts = ["aaa", "bbb"]
+        VectorStore(self.path, "m").append(0, _fake_embed(texts), texts[-1])
+        reopened = VectorStore(self.path, "m")
+        self.assertEqual(reopened.count, 2)
+        self.assertTrue(reopened.matches(texts + ["ccc"]))
+        self.assertFalse(reopened.matches(["aaa", "zzz"]))
+        self.assertEqual(VectorStore(self.path, "other-model").count, 0)
+
+    def test_append_out_of_order_is_ignored(self) -> None:
+        store = VectorStore(self.path, "m")
+        store.append(3, _fake_embed(["a"]), "a")
+        self.assertEqual(store.count, 0)
+
+    def test_indexer_embeds_in_batches_and_skips_stale_work(self) -> None:
+        store = VectorStore(self.path, "m")
+        gate = threading.Event()
+        calls = []
+
+        def embed(texts):
+            gate.wait(5)
+            calls.append(len(texts))
+            return _fake_embed(texts)
+
+        indexer = EmbeddingIndexer(embed)
+        texts = ["ab"] * (EMBED_BATCH_SIZE + 3)
+        indexer.enqueue(store, 0, texts)
+        store.reset()  # queued batches belong to the old generation
+        indexer.enqueue(store, 0, ["ccc"])
+        gate.set()
+        indexer.join()
+        self.assertEqual(store.count, 1)
+        self.assertEqual(store.search([0, 0, 1], limit=1)[0][0], 0)
+
+    def test_lazy_texts_load_on_the_indexer_thread_and_skip_stored_rows(self) -> None:
+        store = VectorStore(self.path, "m")
+        threads = []
+
+        def load():
+            threads.append(threading.current_thread().name)
+            return ["aaa", "bbb", "ccc"]
+
+        indexer = EmbeddingIndexer(_fake_embed)
+        indexer.enqueue(store, 0, ["aaa"])
+        indexer.enqueue_lazy(store, 0, load)  # overlaps the row stored above
+        indexer.join()
+        self.assertEqual(threads, ["embedding-indexer"])
+        self.assertEqual(store.count, 3)
+        self.assertTrue(store.matches_last("ccc"))
+        self.assertFalse(store.matches_last("bbb"))
+
+    def test_failures_back_off_and_are_reported_once(self) -> None:
+        store = VectorStore(self.path, "m")
+        now = [0.0]
+        errors = []
+        calls = []
+
+        def embed(texts):
+            calls.append(texts)
+            raise RuntimeError("malli ei lataudu")
+
+        indexer = EmbeddingIndexer(embed, on_error=errors.append, clock=lambda: now[0])
+        for _ in range(3):
+            indexer.enqueue(store, 0, ["aaa"])
+        indexer.join()
+        self.assertEqual((len(calls), len(errors)), (1, 1))
+        now[0] = ERROR_BACKOFF_S + 1
+        indexer.enqueue(store, 0, ["aaa"])
+        indexer.join()
+        self.assertEqual((len(calls), len(errors)), (2, 1))  # retried, not reported again
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Unit tests for append-only stream rendering."""
+
+import pathlib
+import random
+import sys
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from stream_render import CODE_BLOCK_TAG, MarkdownStream, StreamText, plain_text, render_markdown
+
+
+class StreamTextTests(unittest.TestCase):
+    def _shown(self, chunks) -> str:
+        stream = StreamText()
+        shown = "".join(stream.feed(chunk) for chunk in chunks)
+        self.assertEqual(stream.shown, len(shown))
+        self.assertEqual(stream.text(), "".join(chunks))
+        return shown
+
+    def test_appended_text_equals_stripped_total(self) -> None:
+        rng = random.Random(5)
+        alphabet = ["a", "ö", " ", "\n", "\t", "koodi", "  \n\n"]
+        for _ in range(200):
+            chunks = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 4))) for _ in range(rng.randint(0, 12))]
+            self.assertEqual(self._shown(chunks), "".join(chunks).strip())
+
+    def test_trailing_whitespace_is_held_back(self) -> None:
+        stream = StreamText()
+        self.assertEqual(stream.feed("\n  Hei"), "Hei")
+        self.assertEqual(stream.feed(" \n"), "")
+        self.assertEqual(stream.feed("maailma"), " \nmaailma")
+
+    def test_whitespace_only_reply_shows_nothing(self) -> None:
+        self.assertEqual(self._shown([" ", "\n\n"]), "")
+
+
+SAMPLE = (
+    "# Otsikko\n"
+    "Teksti **lihava** ja `koodi` tässä.\n"
+    "- kohta\n"
+    "* toinen\n"
+    "12. numeroitu\n"
+    "```python\n"
+    "x = 2 ** 3\n"
+    "```\n"
+    "loppu*\n"
+)
+
+
+class MarkdownStreamTests(unittest.TestCase):
+    def _merged(self, segments):
+        merged = []
+        for text, tags in segments:
+            if merged and merged[-1][1] == tags:
+                merged[-1] = (merged[-1][0] + text, tags)
+            else:
+                merged.append((text, tags))
+        return merged
+
+    def test_block_and_inline_markup(self) -> None:
+        segments = render_markdown(SAMPLE)
+        self.assertIn(("Otsikko\n", ("md_h1",)), segments)
+        self.assertIn(("lihava", ("md_bold",)), segments)
+        self.assertIn(("koodi", ("md_code",)), segments)
+        self.assertIn(("• ", ("md_bullet",)), segments)
+        self.assertIn(("12. ", ("md_bullet",)), segments)
+        self.assertIn(("python\n", ("md_code_lang",)), segments)
+        self.assertIn(("x = 2 ** 3\n", (CODE_BLOCK_TAG,)), segments)
+        self.assertTrue(plain_text(segments).endswith("loppu*\n"))
+        self.assertNotIn("```", plain_text(segments))
+
+    def test_any_chunking_matches_one_shot(self) -> None:
+        expected = render_markdown(SAMPLE)
+        rng = random.Random(11)
+        for _ in range(300):
+            stream = MarkdownStream()
+            segments = []
+            pos = 0
+            while pos < len(SAMPLE):
+                size = rng.randint(1, 7)
+                segments += stream.feed(SAMPLE[pos : pos + size])
+                pos += size
+            segments += stream.close()
+            self.assertEqual(self._merged(segments), expected)
+
+    def test_only_ambiguous_prefix_is_held_back(self) -> None:
+        stream = MarkdownStream()
+        self.assertEqual(stream.feed("Hei *"), [("Hei ", ())])
+        self.assertEqual(stream.feed("*x"), [("x", ("md_bold",))])
+        self.assertEqual(stream.feed("\n#"), [("\n", ())])
+        self.assertEqual(stream.feed("# Osa"), [("Osa", ("md_h2",))])
+
+    def test_unclosed_markup_ends_with_the_line(self) -> None:
+        segments = render_markdown("**auki\nnormaali")
+        self.assertEqual(segments, [("auki", ("md_bold",)), ("\nnormaali", ())])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Unit tests for streamed reply timing traces."""
+
+import json
+import pathlib
+import sys
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from stream_trace import StreamTrace, format_timing_stats, playback_schedule, timing_stats
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _trace(model: str = "gpt-4o-mini", gaps_ms=(300, 20, 20, 40)) -> StreamTrace:
+    clock = FakeClock()
+    trace = StreamTrace(model, clock=clock)
+    clock.now += 0.1
+    trace.mark_connect()
+    clock.now += 0.05
+    trace.mark_first_byte()
+    clock.now -= 0.15
+    for gap in gaps_ms:
+        clock.now += gap / 1000.0
+        trace.chunk("abcd")
+    clock.now += 0.01
+    trace.finish()
+    return trace
+
+
+class StreamTraceTests(unittest.TestCase):
+    def test_marks_and_derived_latencies(self) -> None:
+        trace = _trace()
+        self.assertEqual(trace.connect_us, 100_000)
+        self.assertEqual(trace.first_byte_us, 150_000)
+        self.assertAlmostEqual(trace.ttft_ms, 300.0, places=0)
+        self.assertEqual([round(v) for v in trace.inter_token_ms()], [20, 20, 40])
+        self.assertEqual([round(v) for v in trace.offsets_ms()], [300, 320, 340, 380])
+        self.assertEqual(trace.end_us, 390_000)
+
+    def test_round_trip_through_json(self) -> None:
+        trace = _trace()
+        stored = json.loads(json.dumps(trace.to_dict()))
+        restored = StreamTrace.from_dict(stored)
+        self.assertIsNotNone(restored)
+        self.assertEqual(list(restored.gaps), list(trace.gaps))
+        self.assertEqual(list(restored.chars), [4, 4, 4, 4])
+        self.assertEqual(restored.connect_us, trace.connect_us)
+        self.assertEqual(restored.model, "gpt-4o-mini")
+
+    def test_malformed_data_is_ignored(self) -> None:
+        self.assertIsNone(StreamTrace.from_dict(None))
+        self.assertIsNone(StreamTrace.from_dict({"v": 99}))
+        self.assertIsNone(StreamTrace.from_dict({"v": 1, "gaps_us": "!!", "chars": ""}))
+
+
+class PlaybackScheduleTests(unittest.TestCase):
+    def test_close_chunks_are_merged_and_scaled(self) -> None:
+        trace = _trace(gaps_ms=(300, 5, 5, 40))
+        # Arrivals at 300, 305, 310 and 350 ms.
+        self.assertEqual(playback_schedule(trace, 16), [(300, 12), (50, 16)])
+        self.assertEqual(playback_schedule(trace, 16, factor=2.0), [(600, 8), (20, 12), (80, 16)])
+
+    def test_schedule_always_reveals_everything(self) -> None:
+        trace = _trace()
+        self.assertEqual(playback_schedule(trace, 30)[-1][1], 30)
+        self.assertEqual(playback_schedule(trace, 5)[-1][1], 5)
+        self.assertEqual(playback_schedule(StreamTrace(), 7), [(0, 7)])
+
+
+class TimingStatsTests(unittest.TestCase):
+    def test_percentiles_per_model(self) -> None:
+        entries = [
+            {"role": "user", "content": "hei"},
+            {"role": "assistant", "timing": _trace("a").to_dict()},
+            {"role": "assistant", "timing": _trace("a", gaps_ms=(500, 10)).to_dict()},
+            {"role": "assistant", "timing": _trace("b").to_dict()},
+            {"role": "assistant", "timing": "rikki"},
+        ]
+        stats = timing_stats(entries)
+        self.assertEqual(sorted(stats), ["a", "b"])
+        self.assertEqual(stats["a"]["replies"], 2.0)
+        self.assertAlmostEqual(stats["a"]["ttft_p95"], 500.0, places=0)
+        self.assertAlmostEqual(stats["a"]["itl_p50"], 20.0, places=0)
+        self.assertIn("a: 2 vastausta", format_timing_stats(stats))
+        self.assertIn("Ei ajoitustietoja", format_timing_stats({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
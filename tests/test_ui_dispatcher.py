@@ -0,0 +1,88 @@
+"""Unit tests for the frame-budgeted UI dispatcher."""
+
+import pathlib
+import sys
+import threading
+import time
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from ui_dispatcher import UIDispatcher
+
+
+class _FakeScheduler:
+    def __init__(self) -> None:
+        self.calls = []
+
+    def __call__(self, delay, func):
+        self.calls.append((delay, func))
+
+
+class UIDispatcherTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.scheduler = _FakeScheduler()
+        self.errors = []
+        self.ui = UIDispatcher(self.scheduler, on_error=self.errors.append)
+
+    def test_deltas_are_coalesced_without_reordering(self) -> None:
+        log = []
+        for piece in ("Hei", " ", "maailma"):
+            self.ui.post_delta("a", lambda text: log.append(("delta", text)), piece)
+        self.ui.post(log.append, ("done",))
+        self.ui.post_delta("a", lambda text: log.append(("delta", text)), "!")
+        self.ui.run_frame()
+        self.assertEqual(log, [("delta", "Hei maailma"), ("done",), ("delta", "!")])
+        self.assertEqual(self.ui.coalesced, 2)
+
+    def test_frame_budget_leaves_work_for_next_frame(self) -> None:
+        ui = UIDispatcher(self.scheduler, budget_ms=1.0)
+        for _ in range(10):
+            ui.post(time.sleep, 0.002)
+        ui.run_frame()
+        self.assertEqual(ui.pending(), 9)
+        self.assertEqual(ui.over_budget_frames, 1)
+        ui.drain()
+        self.assertEqual(ui.pending(), 0)
+
+    def test_tick_reschedules_at_frame_or_idle_cadence(self) -> None:
+        self.ui.start()
+        self.assertEqual(self.scheduler.calls[-1][0], self.ui.frame_ms)
+        tick = self.scheduler.calls[-1][1]
+        tick()
+        self.assertEqual(self.scheduler.calls[-1][0], self.ui.idle_ms)
+        self.ui.post(lambda: None)
+        self.scheduler.calls[-1][1]()
+        self.assertEqual(self.scheduler.calls[-1][0], self.ui.frame_ms)
+        self.ui.stop()
+        count = len(self.scheduler.calls)
+        self.scheduler.calls[-1][1]()
+        self.assertEqual(len(self.scheduler.calls), count)
+
+    def test_errors_are_reported_and_do_not_stop_the_frame(self) -> None:
+        log = []
+        self.ui.post(lambda: 1 / 0)
+        self.ui.post(log.append, "ok")
+        self.ui.run_frame()
+        self.assertEqual(log, ["ok"])
+        self.assertIsInstance(self.errors[0], ZeroDivisionError)
+
+    def test_posting_from_threads(self) -> None:
+        received = []
+        threads = [
+            threading.Thread(target=lambda: [self.ui.post_delta("s", received.append, "x") for _ in range(500)])
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.ui.drain()
+        self.assertEqual(sum(len(text) for text in received), 2000)
+        self.assertEqual(self.ui.stats()["pending"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
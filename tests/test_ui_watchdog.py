@@ -0,0 +1,67 @@
+"""Unit tests for the Tk event-loop stall watchdog."""
+
+import pathlib
+import sys
+import threading
+import time
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from ui_watchdog import LAG_BUCKETS_MS, MIN_STALL_THRESHOLD_MS, StallWatchdog, format_histogram, normalize_threshold
+
+
+class StallWatchdogTests(unittest.TestCase):
+    def _watchdog(self, reports):
+        return StallWatchdog(lambda ms, func: None, reports.append, interval_ms=50, threshold_ms=200)
+
+    def test_lag_goes_into_histogram(self) -> None:
+        watchdog = self._watchdog([])
+        watchdog._due = 10.0
+        self.assertAlmostEqual(watchdog.beat(10.003), 3.0, places=3)
+        watchdog._due = 20.0
+        watchdog.beat(20.3)
+        counts = watchdog.histogram()
+        self.assertEqual(sum(counts), 2)
+        self.assertEqual(counts[0], 1)
+        self.assertEqual(counts[LAG_BUCKETS_MS.index(500)], 1)
+        self.assertEqual(format_histogram(counts), "<5ms:1 <500ms:1")
+
+    def test_stall_dumps_main_thread_stack_once(self) -> None:
+        reports = []
+        watchdog = self._watchdog(reports)
+        watchdog._last_beat = 100.0
+        self.assertFalse(watchdog.check(100.1))
+        self.assertTrue(watchdog.check(100.3))
+        self.assertFalse(watchdog.check(100.6))
+        self.assertEqual(watchdog.stalls, 1)
+        self.assertIn("test_stall_dumps_main_thread_stack_once", reports[0])
+        watchdog._due = 100.0
+        watchdog.beat(100.7)
+        self.assertIn("vapautui", reports[-1])
+        self.assertTrue(watchdog.check(101.0))
+        self.assertEqual(watchdog.stalls, 2)
+
+    def test_monitor_thread_catches_blocking_call(self) -> None:
+        reports = []
+        watchdog = StallWatchdog(lambda ms, func: None, reports.append, interval_ms=10, threshold_ms=50)
+        watchdog.start()
+        try:
+            deadline = time.monotonic() + 2.0
+            while not reports and time.monotonic() < deadline:
+                time.sleep(0.02)  # the "blocking call" on the main thread
+        finally:
+            watchdog.stop()
+        self.assertTrue(reports)
+        self.assertIn("time.sleep", reports[0])
+
+    def test_threshold_is_clamped(self) -> None:
+        self.assertEqual(normalize_threshold("x"), 250)
+        self.assertEqual(normalize_threshold(1), MIN_STALL_THRESHOLD_MS)
+        self.assertEqual(threading.main_thread().ident, StallWatchdog(lambda ms, f: None, print)._main_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
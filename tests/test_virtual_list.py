@@ -0,0 +1,74 @@
+"""Unit tests for the virtualised listbox row window."""
+
+import pathlib
+import sys
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from virtual_list import SNIPPET_CHARS, VirtualRows, format_history_row
+
+
+class VirtualRowsTests(unittest.TestCase):
+    def test_reset_loads_the_tail_only(self) -> None:
+        rows = VirtualRows(window_rows=100, margin_rows=10)
+        self.assertEqual(rows.reset(50_000), (49_900, 50_000))
+        self.assertEqual(rows.reset(30), (0, 30))
+
+    def test_growth_appends_only_new_rows_and_trims_front(self) -> None:
+        rows = VirtualRows(window_rows=100, margin_rows=10)
+        rows.reset(1000)
+        self.assertEqual(rows.grow(1001), (1000, 1001))
+        self.assertEqual(rows.trim(), 1)
+        self.assertEqual((rows.first, rows.end), (901, 1001))
+        self.assertEqual(rows.grow(1005), (1001, 1005))
+        self.assertEqual(rows.trim(), 4)
+        self.assertEqual(rows.loaded, 100)
+
+    def test_growth_away_from_tail_only_counts(self) -> None:
+        rows = VirtualRows(window_rows=100, margin_rows=10)
+        rows.reset(1000, top=0)
+        self.assertEqual(rows.grow(1010), (100, 100))
+        self.assertEqual(rows.total, 1010)
+        self.assertEqual(rows.trim(), 0)
+
+    def test_shift_and_mapping(self) -> None:
+        rows = VirtualRows(window_rows=100, margin_rows=20)
+        rows.reset(1000, top=500, visible=20)
+        self.assertEqual((rows.first, rows.end), (460, 560))
+        self.assertFalse(rows.needs_shift(500, 520))
+        self.assertTrue(rows.needs_shift(462, 482))
+        self.assertTrue(rows.needs_shift(530, 552))
+        self.assertEqual(rows.to_local(470), 10)
+        self.assertIsNone(rows.to_local(600))
+        self.assertEqual(rows.to_global(10), 470)
+        low, high = rows.fractions(0.0, 1.0)
+        self.assertAlmostEqual(low, 0.46)
+        self.assertAlmostEqual(high, 0.56)
+        self.assertEqual(rows.row_at(0.25), 250)
+        self.assertEqual(rows.row_at(1.0), 999)
+
+    def test_empty_list(self) -> None:
+        rows = VirtualRows()
+        self.assertEqual(rows.reset(0), (0, 0))
+        self.assertEqual(rows.fractions(0.0, 1.0), (0.0, 1.0))
+        self.assertFalse(rows.needs_shift(0, 0))
+
+
+class FormatHistoryRowTests(unittest.TestCase):
+    def test_label(self) -> None:
+        label = format_history_row(2, "01.01.2025 10:00:00", "assistant", "Hei\nmaailma")
+        self.assertEqual(label, "03. 01.01.2025 10:00:00 · Assistant – Hei maailma")
+
+    def test_snippet_truncation(self) -> None:
+        label = format_history_row(0, None, None, "x" * 100)
+        self.assertTrue(label.startswith("01. 01 · ? – "))
+        self.assertTrue(label.endswith("…"))
+        self.assertEqual(len(label.split(" – ", 1)[1]), SNIPPET_CHARS - 2)
+        self.assertIn("x" * 100, format_history_row(0, None, "user", "x" * 100, truncate=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""Unit tests for watermark bitmap processing."""
+
+import os
+import pathlib
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from watermark import (
+    PIL_AVAILABLE,
+    OpacityLadder,
+    WatermarkCache,
+    blend_hex_rows,
+    clamp_opacity,
+    clamp_subsample,
+    parse_hex_color,
+    variant_key,
+)
+
+
+class HelperTests(unittest.TestCase):
+    def test_clamp_opacity(self) -> None:
+        self.assertEqual(clamp_opacity(0.25), 0.25)
+        self.assertEqual(clamp_opacity(50), 0.5)
+        self.assertEqual(clamp_opacity("40%"), 0.4)
+        self.assertEqual(clamp_opacity(-1), 0.0)
+        self.assertEqual(clamp_opacity("x"), 1.0)
+
+    def test_clamp_subsample(self) -> None:
+        self.assertEqual(clamp_subsample(0), 1)
+        self.assertEqual(clamp_subsample(20), 8)
+        self.assertEqual(clamp_subsample("x"), 2)
+
+    def test_parse_hex_color(self) -> None:
+        self.assertEqual(parse_hex_color("#0b1220"), (11, 18, 32))
+        self.assertEqual(parse_hex_color("fff"), (255, 255, 255))
+        self.assertIsNone(parse_hex_color("blue"))
+
+    def test_blend_hex_rows(self) -> None:
+        data = blend_hex_rows([["#ffffff", ""], ["#000000", "#ffffff"]], 0.5, (0, 0, 0))
+        self.assertEqual(data, "{#7f7f7f #000000} {#000000 #7f7f7f}")
+
+
+class WatermarkCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.logo = os.path.join(self.tmp.name, "logo.png")
+        with open(self.logo, "wb") as fh:
+            fh.write(b"logo")
+        self.cache = WatermarkCache(os.path.join(self.tmp.name, "cache"), max_bytes=100, max_entries=3)
+
+    @staticmethod
+    def _writer(payload: bytes):
+        def write(path: str) -> None:
+            with open(path, "wb") as fh:
+                fh.write(payload)
+
+        return write
+
+    def test_key_covers_everything_that_changes_pixels(self) -> None:
+        base = variant_key(self.logo, 2, 0.18, (11, 18, 32))
+        self.assertIsNotNone(base)
+        self.assertEqual(base, variant_key(self.logo, 2, 0.18, (11, 18, 32)))
+        self.assertNotEqual(base, variant_key(self.logo, 3, 0.18, (11, 18, 32)))
+        self.assertNotEqual(base, variant_key(self.logo, 2, 0.2, (11, 18, 32)))
+        self.assertNotEqual(base, variant_key(self.logo, 2, 0.18, (0, 0, 0)))
+        with open(self.logo, "ab") as fh:
+            fh.write(b"!")
+        self.assertNotEqual(base, variant_key(self.logo, 2, 0.18, (11, 18, 32)))
+        self.assertIsNone(variant_key(os.path.join(self.tmp.name, "missing.png"), 2, 0.18, (0, 0, 0)))
+
+    def test_store_and_lookup(self) -> None:
+        key = variant_key(self.logo, 2, 0.18, (0, 0, 0))
+        self.assertIsNone(self.cache.lookup(key))
+        path = self.cache.store(key, self._writer(b"png"))
+        self.assertEqual(self.cache.lookup(key), path)
+        with open(path, "rb") as fh:
+            self.assertEqual(fh.read(), b"png")
+        self.assertIsNone(self.cache.lookup(None))
+
+    def test_failed_write_leaves_nothing_behind(self) -> None:
+        def broken(path: str) -> None:
+            with open(path, "wb") as fh:
+                fh.write(b"half")
+            raise OSError("disk full")
+
+        with self.assertRaises(OSError):
+            self.cache.store("abc", broken)
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+    def test_prune_drops_least_recently_used(self) -> None:
+        paths = []
+        for index in range(3):
+            paths.append(self.cache.store(f"k{index}", self._writer(b"x" * 30)))
+            os.utime(paths[-1], (1000 + index, 1000 + index))
+        os.utime(paths[0], (2000, 2000))  # k0 was used most recently
+        self.cache.store("k3", self._writer(b"x" * 30))
+        left = sorted(os.path.basename(path) for _used, _size, path in self.cache.entries())
+        self.assertEqual(left, ["wm-k0.png", "wm-k2.png", "wm-k3.png"])
+        self.cache.clear()
+        self.assertEqual(self.cache.entries(), [])
+
+
+@unittest.skipUnless(PIL_AVAILABLE, "Pillow not installed")
+class PillowPipelineTests(unittest.TestCase):
+    def setUp(self) -> None:
+        from PIL import Image
+
+        self.Image = Image
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "logo.png")
+        img = Image.new("RGBA", (8, 8), (255, 255, 255, 255))
+        img.putpixel((0, 0), (0, 0, 0, 0))  # fully transparent corner
+        img.save(self.path)
+
+    def test_load_reduces_and_blends_against_background(self) -> None:
+        from watermark import blend_image, load_watermark_source
+
+        source = load_watermark_source(self.path, 2)
+        self.assertEqual(source.size, (4, 4))
+        out = blend_image(source, 0.5, (0, 0, 0))
+        self.assertEqual(out.mode, "RGB")
+        self.assertEqual(out.getpixel((3, 3)), (127, 127, 127))
+        # The transparent pixel is averaged with three white ones, then blended.
+        self.assertLess(out.getpixel((0, 0))[0], 127)
+
+    def test_full_opacity_keeps_colours(self) -> None:
+        from watermark import blend_image, load_watermark_source
+
+        out = blend_image(load_watermark_source(self.path, 1), 1.0, (11, 18, 32))
+        self.assertEqual(out.getpixel((0, 0)), (11, 18, 32))
+        self.assertEqual(out.getpixel((5, 5)), (255, 255, 255))
+
+    def test_ladder_matches_direct_blend(self) -> None:
+        from watermark import blend_image, load_watermark_source
+
+        source = load_watermark_source(self.path, 2)
+        ladder = OpacityLadder(source, (11, 18, 32), steps=11)
+        self.assertIsNone(ladder.get(0.5))
+        self.assertEqual(ladder.build(around=0.5), 11)
+        self.assertEqual(ladder.ready, 11)
+        self.assertEqual(ladder.get(0.52).tobytes(), blend_image(source, 0.5, (11, 18, 32)).tobytes())
+        self.assertEqual(ladder.build(), 0)
+
+    def test_cancelled_ladder_stops(self) -> None:
+        from watermark import load_watermark_source
+
+        ladder = OpacityLadder(load_watermark_source(self.path, 1))
+        ladder.cancel()
+        self.assertEqual(ladder.build(), 0)
+        self.assertTrue(ladder.cancelled)
+
+
+class OpacityLadderLevelTests(unittest.TestCase):
+    def test_levels_and_build_order(self) -> None:
+        ladder = OpacityLadder(None, steps=5)
+        self.assertEqual(ladder.level(0.0), 0)
+        self.assertEqual(ladder.level(0.6), 2)
+        self.assertEqual(ladder.level("80%"), 3)
+        self.assertEqual(ladder.opacity_at(2), 0.5)
+        self.assertEqual(ladder.build_order(0.3), [1, 0, 2, 3, 4])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+"""Frame-budgeted hand-off of work from background threads to the Tk thread.
+
+Tk is not thread-safe, and one ``after(0, ...)`` per streamed token floods
+the event loop at high token rates. Worker threads instead :meth:`post`
+callbacks into a ``collections.deque`` (appends are atomic, no lock needed),
+and the Tk thread drains it on a fixed cadence from a single ``after`` loop.
+Each frame runs events for at most ``budget_ms``; whatever is left waits for
+the next frame so input and redraws are never starved.
+
+Stream deltas posted with :meth:`post_delta` are coalesced: all deltas for
+the same key that are queued when a frame runs are joined into one call.
+Ordering relative to other events is preserved.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Final, List, Optional, Tuple
+
+from perf_metrics import LatencyRecorder
+
+
+DEFAULT_FRAME_MS: Final[int] = 16
+IDLE_FRAME_MS: Final[int] = 33
+DEFAULT_BUDGET_MS: Final[float] = 8.0
+
+_CALL: Final[int] = 0
+_DELTA: Final[int] = 1
+
+Scheduler = Callable[[int, Callable[[], None]], Any]
+ErrorHandler = Callable[[BaseException], None]
+
+
+class UIDispatcher:
+    """Queue drained on the Tk thread every ``frame_ms`` (``idle_ms`` when quiet)."""
+
+    def __init__(
+        self,
+        schedule: Scheduler,
+        frame_ms: int = DEFAULT_FRAME_MS,
+        idle_ms: int = IDLE_FRAME_MS,
+        budget_ms: float = DEFAULT_BUDGET_MS,
+        on_error: Optional[ErrorHandler] = None,
+    ) -> None:
+        self._schedule = schedule
+        self.frame_ms = frame_ms
+        self.idle_ms = idle_ms
+        self.budget_ms = budget_ms
+        self.on_error = on_error
+        self._events: Deque[Tuple[int, Any, Callable[..., Any], Tuple[Any, ...]]] = deque()
+        self._running = False
+        self.frame_work = LatencyRecorder()  # ms of callbacks per non-empty frame
+        self.queue_depth = LatencyRecorder()  # events waiting when a frame starts
+        self.events_run = 0
+        self.coalesced = 0
+        self.over_budget_frames = 0
+
+    # --- Any thread ---
+    def post(self, func: Callable[..., Any], *args: Any) -> None:
+        """Run ``func(*args)`` on the Tk thread in an upcoming frame."""
+
+        self._events.append((_CALL, None, func, args))
+
+    def post_delta(self, key: str, func: Callable[[str], Any], text: str) -> None:
+        """Queue a text delta; deltas of ``key`` in one frame become one ``func`` call."""
+
+        self._events.append((_DELTA, key, func, (text,)))
+
+    def pending(self) -> int:
+        return len(self._events)
+
+    # --- Tk thread ---
+    def start(self) -> None:
+        if not self._running:
+            self._running = True
+            self._schedule(self.frame_ms, self._tick)
+
+    def stop(self) -> None:
+        self._running = False
+
+    def _tick(self) -> None:
+        if not self._running:
+            return
+        busy = bool(self._events)
+        if busy:
+            self.run_frame()
+        self._schedule(self.frame_ms if busy else self.idle_ms, self._tick)
+
+    def run_frame(self) -> int:
+        """Run queued events until the budget is used; returns the number run."""
+
+        events = self._events
+        self.queue_depth.record(float(len(events)))
+        started = time.perf_counter()
+        deadline = started + self.budget_ms / 1000.0
+        deltas: Dict[str, Tuple[Callable[[str], Any], List[str]]] = {}
+        ran = 0
+        while events:
+            kind, key, func, args = events.popleft()
+            ran += 1
+            if kind == _DELTA:
+                entry = deltas.get(key)
+                if entry is None:
+                    deltas[key] = (func, [args[0]])
+                else:
+                    entry[1].append(args[0])
+                    self.coalesced += 1
+                continue
+            # Flush deltas first so ordinary events never overtake earlier text.
+            self._flush_deltas(deltas)
+            self._call(func, args)
+            if time.perf_counter() >= deadline:
+                break
+        self._flush_deltas(deltas)
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        self.events_run += ran
+        if ran:
+            self.frame_work.record(elapsed_ms)
+            if elapsed_ms > self.budget_ms:
+                self.over_budget_frames += 1
+        return ran
+
+    def drain(self) -> None:
+        """Run everything queued right now, ignoring the budget (used on exit)."""
+
+        while self._events:
+            budget, self.budget_ms = self.budget_ms, float("inf")
+            try:
+                self.run_frame()
+            finally:
+                self.budget_ms = budget
+
+    def _flush_deltas(self, deltas: Dict[str, Tuple[Callable[[str], Any], List[str]]]) -> None:
+        for func, parts in deltas.values():
+            self._call(func, ("".join(parts),))
+        deltas.clear()
+
+    def _call(self, func: Callable[..., Any], args: Tuple[Any, ...]) -> None:
+        try:
+            func(*args)
+        except Exception as exc:
+            if self.on_error is not None:
+                self.on_error(exc)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending(),
+            "events": self.events_run,
+            "coalesced": self.coalesced,
+            "over_budget_frames": self.over_budget_frames,
+            "frame_ms": self.frame_work.summary(),
+            "queue_depth": self.queue_depth.summary(),
+        }
+
+
+__all__ = ["DEFAULT_BUDGET_MS", "DEFAULT_FRAME_MS", "IDLE_FRAME_MS", "UIDispatcher"]
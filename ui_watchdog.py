@@ -0,0 +1,150 @@
+"""Detects Tk event-loop stalls and records UI scheduling lag.
+
+The Tk thread re-arms a short ``after()`` heartbeat; the difference between
+when a beat was due and when it actually ran is the lag every other event
+saw at that moment, and goes into a histogram. A separate monitor thread
+watches the last beat: once the loop has been silent for longer than
+``threshold_ms`` it captures the main thread's stack via
+``sys._current_frames()`` (once per stall) and hands it to ``report``, so
+the blocking call shows up in the log while it is still running.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_right
+from typing import Any, Callable, Dict, Final, List, Optional, Tuple
+
+from perf_metrics import LatencyRecorder
+
+
+DEFAULT_INTERVAL_MS: Final[int] = 50
+DEFAULT_STALL_THRESHOLD_MS: Final[int] = 250
+MIN_STALL_THRESHOLD_MS: Final[int] = 50
+# Upper bounds (ms) of the lag histogram buckets; the last bucket is open-ended.
+LAG_BUCKETS_MS: Final[Tuple[int, ...]] = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+Scheduler = Callable[[int, Callable[[], None]], Any]
+Reporter = Callable[[str], None]
+
+
+def normalize_threshold(value: object) -> int:
+    try:
+        threshold = int(value)  # type: ignore[arg-type]
+    except Exception:
+        return DEFAULT_STALL_THRESHOLD_MS
+    return max(MIN_STALL_THRESHOLD_MS, threshold)
+
+
+def format_histogram(counts: List[int]) -> str:
+    """``"<5ms:120 <10ms:4 ... ≥2500ms:0"``, skipping empty buckets."""
+
+    labels = [f"<{bound}ms" for bound in LAG_BUCKETS_MS] + [f"≥{LAG_BUCKETS_MS[-1]}ms"]
+    parts = [f"{label}:{count}" for label, count in zip(labels, counts) if count]
+    return " ".join(parts) or "(ei näytteitä)"
+
+
+class StallWatchdog:
+    """Heartbeat on the Tk thread plus a monitor thread that dumps stalls."""
+
+    def __init__(
+        self,
+        schedule: Scheduler,
+        report: Reporter,
+        interval_ms: int = DEFAULT_INTERVAL_MS,
+        threshold_ms: int = DEFAULT_STALL_THRESHOLD_MS,
+        main_thread_id: Optional[int] = None,
+    ) -> None:
+        self._schedule = schedule
+        self._report = report
+        self.interval_ms = max(1, int(interval_ms))
+        self.threshold_ms = normalize_threshold(threshold_ms)
+        self._main_id = main_thread_id if main_thread_id is not None else threading.main_thread().ident
+        self.lag = LatencyRecorder()
+        self._buckets = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self._lock = threading.Lock()
+        self._last_beat = time.perf_counter()
+        self._due = self._last_beat
+        self._dumped = False  # one dump per stall
+        self.stalls = 0
+        self._running = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Tk thread ---
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._stop.clear()
+        self._last_beat = time.perf_counter()
+        self._due = self._last_beat + self.interval_ms / 1000.0
+        self._schedule(self.interval_ms, self._beat)
+        self._thread = threading.Thread(target=self._monitor, name="ui-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        self._stop.set()
+
+    def _beat(self) -> None:
+        if not self._running:
+            return
+        now = time.perf_counter()
+        self.beat(now)
+        self._due = now + self.interval_ms / 1000.0
+        self._schedule(self.interval_ms, self._beat)
+
+    def beat(self, now: float) -> float:
+        """Record one heartbeat at ``now``; returns its lag in ms."""
+
+        lag_ms = max(0.0, (now - self._due) * 1000.0)
+        self.lag.record(lag_ms)
+        with self._lock:
+            self._buckets[bisect_right(LAG_BUCKETS_MS, lag_ms)] += 1
+            self._last_beat = now
+            recovered, self._dumped = self._dumped, False
+        if recovered:
+            self._report(f"UI-säie vapautui {lag_ms:.0f} ms jälkeen")
+        return lag_ms
+
+    # --- Monitor thread ---
+    def _monitor(self) -> None:
+        poll = min(self.threshold_ms, 100) / 1000.0
+        while not self._stop.wait(poll):
+            self.check(time.perf_counter())
+
+    def check(self, now: float) -> bool:
+        """Dump the main thread's stack if it has been silent too long; ``True`` if dumped."""
+
+        with self._lock:
+            silent_ms = (now - self._last_beat) * 1000.0
+            if self._dumped or silent_ms < self.threshold_ms + self.interval_ms:
+                return False
+            self._dumped = True
+            self.stalls += 1
+        frame = sys._current_frames().get(self._main_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "(pino ei saatavilla)\n"
+        self._report(f"UI-säie jumissa {silent_ms:.0f} ms, pääsäikeen pino:\n{stack.rstrip()}")
+        return True
+
+    def histogram(self) -> List[int]:
+        with self._lock:
+            return list(self._buckets)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"lag_ms": self.lag.summary(), "histogram": self.histogram(), "stalls": self.stalls}
+
+
+__all__ = [
+    "DEFAULT_INTERVAL_MS",
+    "DEFAULT_STALL_THRESHOLD_MS",
+    "LAG_BUCKETS_MS",
+    "MIN_STALL_THRESHOLD_MS",
+    "StallWatchdog",
+    "format_histogram",
+    "normalize_threshold",
+]
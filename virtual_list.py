@@ -0,0 +1,113 @@
+"""Virtualised row window for long ``tk.Listbox`` lists.
+
+A Listbox with tens of thousands of rows is slow to fill and every refresh
+that deletes and reinserts it is O(n). :class:`VirtualRows` keeps only a
+window of ``window_rows`` rows loaded (``first`` .. ``end - 1`` of
+``total``) and maps between those local rows and the global list, so the
+scrollbar can still represent the whole list. New rows at the tail are
+appended one by one when the tail is loaded; otherwise only the total
+changes.
+"""
+
+from __future__ import annotations
+
+from typing import Final, Optional, Tuple
+
+
+DEFAULT_WINDOW_ROWS: Final[int] = 300
+DEFAULT_MARGIN_ROWS: Final[int] = 60
+SNIPPET_CHARS: Final[int] = 48
+
+
+def format_history_row(index: int, timestamp: Optional[str], role: Optional[str], snippet: str, truncate: bool = True) -> str:
+    """Listbox label of one history entry: ``"03. <aika> · Rooli – alku…"``."""
+
+    snippet = (snippet or "").strip().replace("\n", " ")
+    if truncate and len(snippet) > SNIPPET_CHARS:
+        snippet = snippet[: SNIPPET_CHARS - 3] + "…"
+    return f"{index + 1:02d}. {timestamp or f'{index + 1:02d}'} · {(role or '?').capitalize()} – {snippet}"
+
+
+class VirtualRows:
+    """Which slice of a long list is loaded into the widget."""
+
+    def __init__(self, window_rows: int = DEFAULT_WINDOW_ROWS, margin_rows: int = DEFAULT_MARGIN_ROWS) -> None:
+        self.margin = max(1, int(margin_rows))
+        self.window_rows = max(int(window_rows), 4 * self.margin)
+        self.total = 0
+        self.first = 0
+        self.end = 0
+
+    @property
+    def loaded(self) -> int:
+        return self.end - self.first
+
+    def reset(self, total: int, top: Optional[int] = None, visible: int = 0) -> Tuple[int, int]:
+        """New list of ``total`` rows; load around ``top`` (default: the tail)."""
+
+        self.total = max(0, int(total))
+        if top is None:
+            top = self.total
+        return self.place(top, visible)
+
+    def place(self, top: int, visible: int = 0) -> Tuple[int, int]:
+        """Load a window that keeps ``top`` .. ``top + visible`` away from its edges."""
+
+        slack = max(0, self.window_rows - max(0, visible))
+        first = min(max(0, int(top) - slack // 2), max(0, self.total - self.window_rows))
+        self.first = first
+        self.end = min(self.total, first + self.window_rows)
+        return self.first, self.end
+
+    def grow(self, total: int) -> Tuple[int, int]:
+        """The list grew to ``total``; returns the rows to append (empty if the tail is not loaded)."""
+
+        total = int(total)
+        tail_loaded = self.end == self.total
+        self.total = max(self.total, total)
+        if not tail_loaded:
+            return self.end, self.end
+        start = self.end
+        self.end = self.total
+        return start, self.end
+
+    def trim(self) -> int:
+        """Rows to drop from the front after :meth:`grow` overfilled the window."""
+
+        drop = max(0, self.loaded - self.window_rows)
+        self.first += drop
+        return drop
+
+    def needs_shift(self, top: int, bottom: int) -> bool:
+        """Whether the visible global rows ``top`` .. ``bottom`` came too close to an unloaded edge."""
+
+        near_start = self.first > 0 and top < self.first + self.margin // 2
+        near_end = self.end < self.total and bottom > self.end - self.margin // 2
+        return near_start or near_end
+
+    def to_global(self, local: int) -> int:
+        return self.first + local
+
+    def to_local(self, row: int) -> Optional[int]:
+        return row - self.first if self.first <= row < self.end else None
+
+    def fractions(self, local_first: float, local_last: float) -> Tuple[float, float]:
+        """Translate the widget's own yview fractions into fractions of the whole list."""
+
+        if not self.total:
+            return 0.0, 1.0
+        top = self.first + local_first * self.loaded
+        bottom = self.first + local_last * self.loaded
+        return top / self.total, bottom / self.total
+
+    def row_at(self, fraction: float) -> int:
+        return min(max(0, int(float(fraction) * self.total)), max(0, self.total - 1))
+
+
+__all__ = [
+    "DEFAULT_MARGIN_ROWS",
+    "DEFAULT_WINDOW_ROWS",
+    "SNIPPET_CHARS",
+    "VirtualRows",
+    "format_history_row",
+]
@@ -0,0 +1,334 @@
+"""Watermark bitmap processing.
+
+The chat watermark is the logo blended against the chat background at a
+configurable opacity. With Pillow the whole pipeline (decode, reduce,
+alpha-composite, blend) runs as a few vectorised passes in C instead of one
+Tcl ``get`` per pixel. Without Pillow, :func:`blend_hex_rows` blends a
+``PhotoImage``'s pixels that were read in one ``data`` call, so only two
+Tcl round-trips are needed.
+
+:class:`WatermarkCache` keeps processed variants on disk as PNG, keyed by
+everything that affects the pixels, so a normal start reads the finished
+bitmap with a single ``PhotoImage(file=...)`` and does no processing.
+
+:class:`OpacityLadder` precomputes blends at fixed opacity steps on a worker
+thread, so the settings slider only swaps finished images while it is dragged.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Dict, Final, List, Optional, Sequence, Tuple
+
+try:  # Optional: Pillow makes watermark processing vectorised
+    from PIL import Image
+
+    PIL_AVAILABLE = True
+except Exception:  # pragma: no cover - depends on the environment
+    Image = None  # type: ignore[assignment]
+    PIL_AVAILABLE = False
+
+
+RGB = Tuple[int, int, int]
+
+DEFAULT_BACKGROUND: Final[RGB] = (11, 18, 32)
+MAX_SUBSAMPLE: Final[int] = 8
+DEFAULT_CACHE_MAX_BYTES: Final[int] = 8 * 1024 * 1024
+DEFAULT_CACHE_MAX_ENTRIES: Final[int] = 24
+DEFAULT_LADDER_STEPS: Final[int] = 21  # 0.00, 0.05, ..., 1.00
+
+
+def clamp_opacity(value: Any) -> float:
+    """Opacity as 0..1; accepts fractions, percentages (``50``) and ``"50%"``."""
+
+    try:
+        opacity = float(value)
+    except Exception:
+        try:
+            opacity = float(str(value).strip().rstrip("%")) / 100.0
+        except Exception:
+            return 1.0
+    if opacity > 1.0:
+        opacity = min(100.0, opacity) / 100.0
+    return max(0.0, min(1.0, opacity))
+
+
+def clamp_subsample(value: Any) -> int:
+    try:
+        return max(1, min(MAX_SUBSAMPLE, int(value)))
+    except Exception:
+        return 2
+
+
+def parse_hex_color(value: Any) -> Optional[RGB]:
+    """``"#rgb"``/``"#rrggbb"`` (``#`` optional) to a tuple; ``None`` for anything else."""
+
+    text = str(value or "").strip().lstrip("#")
+    if len(text) == 3:
+        text = "".join(ch * 2 for ch in text)
+    if len(text) != 6:
+        return None
+    try:
+        return (int(text[0:2], 16), int(text[2:4], 16), int(text[4:6], 16))
+    except ValueError:
+        return None
+
+
+def load_watermark_source(path: str, subsample: int) -> Any:
+    """Decode ``path`` as RGBA and shrink it by ``subsample`` (box filter) — needs Pillow."""
+
+    with Image.open(path) as img:
+        return prepare_watermark_source(img, subsample)
+
+
+def prepare_watermark_source(image: Any, subsample: int) -> Any:
+    """RGBA copy of an already decoded ``image`` shrunk by ``subsample``."""
+
+    source = image.convert("RGBA")
+    factor = clamp_subsample(subsample)
+    if factor > 1:
+        source = source.reduce(factor)
+    return source
+
+
+def _compose(source: Any, background: RGB) -> Tuple[Any, Any]:
+    rgba = source if source.mode == "RGBA" else source.convert("RGBA")
+    base = Image.new("RGBA", rgba.size, tuple(background) + (255,))
+    return base, Image.alpha_composite(base, rgba)
+
+
+def _blend_composed(base: Any, composed: Any, opacity: float) -> Any:
+    opacity = clamp_opacity(opacity)
+    if opacity < 0.999:
+        composed = Image.blend(base, composed, opacity)
+    return composed.convert("RGB")
+
+
+def blend_image(source: Any, opacity: float, background: RGB = DEFAULT_BACKGROUND) -> Any:
+    """Composite ``source`` over ``background`` and blend at ``opacity``; returns an RGB image."""
+
+    base, composed = _compose(source, background)
+    return _blend_composed(base, composed, opacity)
+
+
+def blend_hex_rows(rows: Sequence[Sequence[str]], opacity: float, background: RGB = DEFAULT_BACKGROUND) -> str:
+    """Blend rows of ``#rrggbb`` pixels; returns data for one ``PhotoImage.put`` call.
+
+    Logos use few distinct colours, so each colour is blended once.
+    """
+
+    opacity = clamp_opacity(opacity)
+    keep = 1.0 - opacity
+    bg_hex = "#%02x%02x%02x" % background
+    cache: Dict[str, str] = {"": bg_hex}
+    out: List[str] = []
+    for row in rows:
+        blended = []
+        for pixel in row:
+            color = cache.get(pixel)
+            if color is None:
+                rgb = parse_hex_color(pixel)
+                if rgb is None:
+                    color = bg_hex
+                else:
+                    color = "#%02x%02x%02x" % tuple(
+                        int(c * opacity + b * keep) for c, b in zip(rgb, background)
+                    )
+                cache[pixel] = color
+            blended.append(color)
+        out.append("{" + " ".join(blended) + "}")
+    return " ".join(out)
+
+
+def variant_key(path: str, subsample: int, opacity: float, background: RGB) -> Optional[str]:
+    """Cache key of one processed variant; ``None`` if ``path`` cannot be read.
+
+    The source's mtime and size are part of the key, so editing or replacing
+    the logo simply stops matching the old entries.
+    """
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    parts = (
+        os.path.abspath(path),
+        stat.st_mtime_ns,
+        stat.st_size,
+        clamp_subsample(subsample),
+        round(clamp_opacity(opacity), 3),
+        tuple(background),
+    )
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:24]
+
+
+class OpacityLadder:
+    """Blends of one source at ``steps`` evenly spaced opacities — needs Pillow.
+
+    :meth:`build` runs on a worker thread and composites the source once, then
+    only blends per step; :meth:`get` may be called from the Tk thread at any
+    time and returns ``None`` for steps that are not ready yet.
+    """
+
+    def __init__(self, source: Any, background: RGB = DEFAULT_BACKGROUND, steps: int = DEFAULT_LADDER_STEPS) -> None:
+        self.source = source
+        self.background = tuple(background)
+        self.steps = max(2, int(steps))
+        self._images: Dict[int, Any] = {}
+        self._cancelled = threading.Event()
+
+    def level(self, opacity: Any) -> int:
+        """Index of the step nearest to ``opacity``."""
+
+        return int(round(clamp_opacity(opacity) * (self.steps - 1)))
+
+    def opacity_at(self, level: int) -> float:
+        return level / (self.steps - 1)
+
+    def build_order(self, around: Any) -> List[int]:
+        """All steps, nearest to ``around`` first, so the first previews are ready soonest."""
+
+        centre = self.level(around)
+        return sorted(range(self.steps), key=lambda level: (abs(level - centre), level))
+
+    def build(self, around: Any = 0.5) -> int:
+        """Blend every missing step until done or cancelled; returns how many were built."""
+
+        base, composed = _compose(self.source, self.background)
+        built = 0
+        for level in self.build_order(around):
+            if self._cancelled.is_set():
+                break
+            if level in self._images:
+                continue
+            self._images[level] = _blend_composed(base, composed, self.opacity_at(level))
+            built += 1
+        return built
+
+    def get(self, opacity: Any) -> Optional[Any]:
+        return self._images.get(self.level(opacity))
+
+    @property
+    def ready(self) -> int:
+        return len(self._images)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+
+class WatermarkCache:
+    """Directory of processed watermark PNGs, pruned least-recently-used first."""
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+        max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"wm-{key}.png")
+
+    def lookup(self, key: Optional[str]) -> Optional[str]:
+        """Path of the cached variant, or ``None``; a hit refreshes its LRU time."""
+
+        if not key:
+            return None
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def store(self, key: Optional[str], write: Callable[[str], None]) -> Optional[str]:
+        """Write a variant through ``write(tmp_path)`` atomically, then prune."""
+
+        if not key:
+            return None
+        path = self.path_for(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write(tmp)
+            os.replace(tmp, path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self.prune()
+        return path
+
+    def entries(self) -> List[Tuple[float, int, str]]:
+        """``(last_used, size, path)`` of every cached variant, least recently used first."""
+
+        found: List[Tuple[float, int, str]] = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return found
+        for name in names:
+            if not (name.startswith("wm-") and name.endswith(".png")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            found.append((stat.st_mtime, stat.st_size, path))
+        found.sort()
+        return found
+
+    def prune(self) -> int:
+        """Drop the least recently used variants beyond the size limits; returns how many."""
+
+        entries = self.entries()
+        total = sum(size for _used, size, _path in entries)
+        removed = 0
+        while entries and (total > self.max_bytes or len(entries) > self.max_entries):
+            _used, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        for _used, _size, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+__all__ = [
+    "DEFAULT_BACKGROUND",
+    "DEFAULT_CACHE_MAX_BYTES",
+    "DEFAULT_CACHE_MAX_ENTRIES",
+    "DEFAULT_LADDER_STEPS",
+    "MAX_SUBSAMPLE",
+    "OpacityLadder",
+    "PIL_AVAILABLE",
+    "WatermarkCache",
+    "blend_hex_rows",
+    "blend_image",
+    "clamp_opacity",
+    "clamp_subsample",
+    "load_watermark_source",
+    "parse_hex_color",
+    "prepare_watermark_source",
+    "variant_key",
+]